@@ -1,7 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     verbose_name = 'Core'
+
+    def ready(self):
+        # Map shared-memory caches now, before gunicorn's preloaded master
+        # forks its workers, so that they all inherit the same segment
+        from django.core.cache import caches
+
+        for alias, config in settings.CACHES.items():
+            if config['BACKEND'] == 'apps.core.cache.SharedMemoryCache':
+                caches[alias]
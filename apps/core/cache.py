@@ -0,0 +1,462 @@
+"""
+Cache backends whose token bucket step (`take_tokens`, used by
+apps.throttling) is atomic across every process sharing them.
+
+SharedMemoryCache: shared by every worker process on a single host. Entries
+live in an anonymous shared memory map created by the first backend
+instance. With gunicorn's `preload_app` that is the master (CoreConfig.ready
+instantiates it), so every forked worker inherits the same segment: throttle
+buckets and hot cache entries are host wide instead of per process, without a
+network hop. A process that creates the backend after the fork gets a private
+segment and behaves like LocMemCache.
+
+The segment is a set-associative table: a key hashes to one group of WAYS
+fixed-size slots, and a group is guarded by one of LOCK_STRIPES process-shared
+locks. A full group evicts its entry closest to expiry. Values that pickle to
+more than a slot holds are not stored. A lock not taken within LOCK_TIMEOUT
+seconds makes the operation a miss (and a throttle check an allow); one held
+by a process that died, e.g. a worker killed by gunicorn's timeout, is freed
+along with the slots it guards. OPTIONS: MAX_ENTRIES (slots), SLOT_SIZE
+(bytes per slot), WAYS, LOCK_STRIPES, LOCK_TIMEOUT.
+
+RedisCache: Django's Redis backend for several nodes sharing one Redis; the
+bucket step runs as one Lua script, a single round trip for all the buckets
+of a request.
+
+Both also offer `set_if_newer`, an atomic compare-and-set on a revision kept
+next to the value (used by WalletBalanceCache).
+"""
+import contextlib
+import hashlib
+import math
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Slot header: key digest, expiry (0 = empty, inf = never), payload length
+SLOT_HEADER = struct.Struct('<16sdI')
+
+# KEYS: bucket hashes (tokens, updated_at). ARGV: now, then capacity and
+# refill rate per key. Takes a token from every bucket or from none; returns
+# {taken, tokens...} with tokens as strings (Lua numbers would be truncated)
+TAKE_TOKENS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local taken = 1
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local tokens = capacity
+    if state[1] then
+        tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    levels[i] = tokens
+    if tokens < 1 then
+        taken = 0
+    end
+end
+if taken == 1 then
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local rate = tonumber(ARGV[i * 2 + 1])
+        levels[i] = levels[i] - 1
+        redis.call('HSET', key, 'tokens', tostring(levels[i]), 'updated_at', ARGV[1])
+        redis.call('PEXPIRE', key, math.ceil((capacity - levels[i]) / rate * 1000))
+    end
+end
+local result = {taken}
+for i, tokens in ipairs(levels) do
+    result[i + 1] = tostring(tokens)
+end
+return result
+"""
+
+# KEYS: value, revision. ARGV: revision, serialized value, milliseconds to live
+# ('' for none). Sets both unless the stored revision is as new already
+SET_IF_NEWER_SCRIPT = """
+local current = redis.call('GET', KEYS[2])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('SET', KEYS[1], ARGV[2])
+    redis.call('SET', KEYS[2], ARGV[1])
+else
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[3])
+end
+return 1
+"""
+
+# Segments by cache name, created once per process tree
+_segments = {}
+_segments_lock = threading.Lock()
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class SharedSegment:
+    def __init__(self, slots, slot_size, ways, stripes, lock_timeout):
+        self.ways = ways
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT_HEADER.size
+        self.groups = max(1, math.ceil(slots / ways))
+        self.lock_timeout = lock_timeout
+        # Anonymous maps are MAP_SHARED: forked children see the same pages
+        self.buffer = mmap.mmap(-1, self.groups * ways * slot_size)
+        self.locks = [multiprocessing.Lock() for _ in range(stripes)]
+        # Pid holding each stripe (0 = none), to recover from a killed holder
+        self.owners = multiprocessing.Array('q', stripes, lock=False)
+        self.repair_lock = multiprocessing.Lock()
+
+    def group(self, digest):
+        return int.from_bytes(digest[:8], 'little') % self.groups
+
+    def stripe(self, group):
+        return group % len(self.locks)
+
+    def stripe_offsets(self, stripe):
+        """Offsets of every slot in the groups guarded by `stripe`."""
+        group_size = self.ways * self.slot_size
+        for group in range(stripe, self.groups, len(self.locks)):
+            yield from range(group * group_size, (group + 1) * group_size, self.slot_size)
+
+    def acquire(self, stripe):
+        """
+        Take a stripe lock within `lock_timeout`. A stripe still held by a
+        process that died (a worker killed mid-operation) is repaired once;
+        otherwise raise LockTimeout.
+        """
+        for _ in range(2):
+            if self.locks[stripe].acquire(timeout=self.lock_timeout):
+                self.owners[stripe] = os.getpid()
+                return
+            owner = self.owners[stripe]
+            if not owner or _is_alive(owner) or not self.repair(stripe, owner):
+                break
+        raise LockTimeout(stripe)
+
+    def release(self, stripe):
+        self.owners[stripe] = 0
+        self.locks[stripe].release()
+
+    def repair(self, stripe, owner):
+        """
+        Free the stripe `owner` died holding, and its slots, which it may have
+        left half written.
+        """
+        if not self.repair_lock.acquire(timeout=self.lock_timeout):
+            return False
+        try:
+            # Compared again under the repair lock: only one process releases it
+            if self.owners[stripe] == owner:
+                for offset in self.stripe_offsets(stripe):
+                    self.free(offset)
+                self.owners[stripe] = 0
+                self.locks[stripe].release()
+            return True
+        finally:
+            self.repair_lock.release()
+
+    @contextlib.contextmanager
+    def locked(self, groups):
+        """
+        Hold the locks of `groups`, taken in stripe order so that concurrent
+        callers cannot deadlock. Raises LockTimeout.
+        """
+        held = []
+        try:
+            for stripe in sorted({self.stripe(group) for group in groups}):
+                self.acquire(stripe)
+                held.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(held):
+                self.release(stripe)
+
+    def find(self, group, digest, now):
+        """Return (offset of the live entry for `digest` or None, offset to write it to)."""
+        victim = victim_expires = None
+        start = group * self.ways * self.slot_size
+        for offset in range(start, start + self.ways * self.slot_size, self.slot_size):
+            slot_digest, expires, _ = SLOT_HEADER.unpack_from(self.buffer, offset)
+            if slot_digest == digest:
+                return (offset if expires > now else None), offset
+            if victim_expires is None or expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return None, victim
+
+    def read(self, offset):
+        _, expires, length = SLOT_HEADER.unpack_from(self.buffer, offset)
+        start = offset + SLOT_HEADER.size
+        return expires, self.buffer[start:start + length]
+
+    def write(self, offset, digest, expires, payload):
+        SLOT_HEADER.pack_into(self.buffer, offset, digest, expires, len(payload))
+        start = offset + SLOT_HEADER.size
+        self.buffer[start:start + len(payload)] = payload
+
+    def free(self, offset):
+        SLOT_HEADER.pack_into(self.buffer, offset, bytes(16), 0.0, 0)
+
+    def clear(self):
+        """Free every slot; a stripe whose lock times out keeps its entries."""
+        for stripe in range(len(self.locks)):
+            try:
+                self.acquire(stripe)
+            except LockTimeout:
+                continue
+            try:
+                for offset in self.stripe_offsets(stripe):
+                    self.free(offset)
+            finally:
+                self.release(stripe)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        with _segments_lock:
+            if name not in _segments:
+                _segments[name] = SharedSegment(
+                    slots=self._max_entries,
+                    slot_size=int(options.get('SLOT_SIZE', 512)),
+                    ways=int(options.get('WAYS', 8)),
+                    stripes=int(options.get('LOCK_STRIPES', 64)),
+                    lock_timeout=float(options.get('LOCK_TIMEOUT', 0.1)),
+                )
+            self._segment = _segments[name]
+
+    def _locate(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return key, digest, self._segment.group(digest)
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return math.inf if expires is None else expires
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        _, digest, group = self._locate(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self._segment.capacity:
+            return False
+        try:
+            with self._segment.locked([group]):
+                live, offset = self._segment.find(group, digest, time.time())
+                if live is not None:
+                    return False
+                self._segment.write(offset, digest, self._expiry(timeout), pickled)
+                return True
+        except LockTimeout:
+            return False
+
+    def get(self, key, default=None, version=None):
+        _, digest, group = self._locate(key, version)
+        try:
+            with self._segment.locked([group]):
+                live, _ = self._segment.find(group, digest, time.time())
+                if live is None:
+                    return default
+                _, pickled = self._segment.read(live)
+        except LockTimeout:
+            return default
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        _, digest, group = self._locate(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        try:
+            with self._segment.locked([group]):
+                live, offset = self._segment.find(group, digest, time.time())
+                if len(pickled) <= self._segment.capacity:
+                    self._segment.write(offset, digest, self._expiry(timeout), pickled)
+                elif live is not None:
+                    # Too big to keep: at least do not serve the old value
+                    self._segment.free(live)
+        except LockTimeout:
+            pass
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        _, digest, group = self._locate(key, version)
+        try:
+            with self._segment.locked([group]):
+                live, _ = self._segment.find(group, digest, time.time())
+                if live is None:
+                    return False
+                _, pickled = self._segment.read(live)
+                self._segment.write(live, digest, self._expiry(timeout), pickled)
+                return True
+        except LockTimeout:
+            return False
+
+    def incr(self, key, delta=1, version=None):
+        key, digest, group = self._locate(key, version)
+        try:
+            with self._segment.locked([group]):
+                live, _ = self._segment.find(group, digest, time.time())
+                if live is None:
+                    raise ValueError("Key '%s' not found" % key)
+                expires, pickled = self._segment.read(live)
+                new_value = pickle.loads(pickled) + delta
+                pickled = pickle.dumps(new_value, self.pickle_protocol)
+                if len(pickled) <= self._segment.capacity:
+                    self._segment.write(live, digest, expires, pickled)
+                else:
+                    # Outgrew its slot: dropped, as set() drops oversized values
+                    self._segment.free(live)
+        except LockTimeout:
+            raise ValueError("Key '%s' not found" % key)
+        return new_value
+
+    def take_tokens(self, buckets, now, version=None):
+        """
+        Token bucket step for TokenBucketThrottle, atomic across workers.
+        `buckets` are (key, capacity, refill_rate per second) whose
+        (tokens, updated_at) entries are refilled to `now`; one token is taken
+        from each only if every bucket has one. Return [(taken, tokens)].
+        """
+        located = [(self._locate(key, version), capacity, rate) for key, capacity, rate in buckets]
+        try:
+            return self._take_tokens(located, now)
+        except LockTimeout:
+            # Fail open: a stuck stripe must not refuse every request
+            return [(True, capacity - 1) for _, capacity, _ in located]
+
+    def _take_tokens(self, located, now):
+        with self._segment.locked(group for (_, _, group), _, _ in located):
+            levels = []
+            for (_, digest, group), capacity, rate in located:
+                live, _ = self._segment.find(group, digest, time.time())
+                tokens = capacity
+                if live is not None:
+                    tokens, updated_at = pickle.loads(self._segment.read(live)[1])
+                    tokens = min(capacity, tokens + max(0, now - updated_at) * rate)
+                levels.append(tokens)
+            if any(tokens < 1 for tokens in levels):
+                return [(False, tokens) for tokens in levels]
+
+            for ((_, digest, group), capacity, rate), tokens in zip(located, levels):
+                _, offset = self._segment.find(group, digest, time.time())
+                expires = time.time() + (capacity - tokens + 1) / rate
+                self._segment.write(offset, digest, expires, pickle.dumps((tokens - 1, now), self.pickle_protocol))
+            return [(True, tokens - 1) for tokens in levels]
+
+    def set_if_newer(self, key, value, revision, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Set `key` to `value` at `revision` (a number, kept under
+        `<key>:revision`) unless the stored revision is at least as new.
+        Returns whether it was set.
+        """
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self._segment.capacity:
+            return False
+        entries = [(self._locate(key, version), pickled), (self._locate(f'{key}:revision', version), revision)]
+        try:
+            with self._segment.locked(group for (_, _, group), _ in entries):
+                (_, digest, group), _ = entries[1]
+                live, _ = self._segment.find(group, digest, time.time())
+                if live is not None and pickle.loads(self._segment.read(live)[1]) >= revision:
+                    return False
+
+                expires = self._expiry(timeout)
+                for (_, digest, group), payload in entries:
+                    if not isinstance(payload, bytes):
+                        payload = pickle.dumps(payload, self.pickle_protocol)
+                    _, offset = self._segment.find(group, digest, time.time())
+                    self._segment.write(offset, digest, expires, payload)
+                return True
+        except LockTimeout:
+            return False
+
+    def has_key(self, key, version=None):
+        _, digest, group = self._locate(key, version)
+        try:
+            with self._segment.locked([group]):
+                return self._segment.find(group, digest, time.time())[0] is not None
+        except LockTimeout:
+            return False
+
+    def delete(self, key, version=None):
+        _, digest, group = self._locate(key, version)
+        try:
+            with self._segment.locked([group]):
+                live, _ = self._segment.find(group, digest, time.time())
+                if live is None:
+                    return False
+                self._segment.free(live)
+                return True
+        except LockTimeout:
+            return False
+
+    def clear(self):
+        self._segment.clear()
+
+
+class RedisCache(redis.RedisCache):
+    _take_tokens_script = None
+    _set_if_newer_script = None
+
+    def take_tokens(self, buckets, now, version=None):
+        """
+        Token bucket step for TokenBucketThrottle in one atomic script on the
+        primary: `buckets` are (key, capacity, refill_rate per second); one
+        token is taken from each only if every bucket has one. Return
+        [(taken, tokens)]. Bucket hashes are not readable through get().
+        """
+        keys = [self.make_and_validate_key(key, version=version) for key, _, _ in buckets]
+        args = [repr(now)]
+        for _, capacity, rate in buckets:
+            args += [capacity, repr(rate)]
+        client = self._cache.get_client(write=True)
+        if self._take_tokens_script is None:
+            # Sent by SHA, loaded again only if the server lost it
+            self._take_tokens_script = client.register_script(TAKE_TOKENS_SCRIPT)
+        taken, *levels = self._take_tokens_script(keys=keys, args=args, client=client)
+        return [(bool(taken), float(tokens)) for tokens in levels]
+
+    def set_if_newer(self, key, value, revision, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Set `key` to `value` at `revision` (a number, kept under
+        `<key>:revision`) unless the stored revision is at least as new, in
+        one script call. Returns whether it was set.
+        """
+        keys = [
+            self.make_and_validate_key(key, version=version),
+            self.make_and_validate_key(f'{key}:revision', version=version),
+        ]
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            return False
+        args = [
+            repr(revision),
+            self._cache._serializer.dumps(value),
+            '' if timeout is None else math.ceil(timeout * 1000),
+        ]
+        client = self._cache.get_client(write=True)
+        if self._set_if_newer_script is None:
+            self._set_if_newer_script = client.register_script(SET_IF_NEWER_SCRIPT)
+        return bool(self._set_if_newer_script(keys=keys, args=args, client=client))
@@ -1,3 +1,16 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from apps.core.exceptions import QueryBudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
 def status_decorator(cls):
     def get_status(self, *args, **kwargs):
         try:
@@ -11,3 +24,41 @@ def status_decorator(cls):
 
     setattr(cls, "get_status", get_status)
     return cls
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a (sync) view handler may run, not counting
+    authentication, throttling and savepoints. Overruns are logged as warnings, and raise
+    QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is set (tests).
+    The budget is kept on the handler as `query_budget`.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                # Savepoints only appear when the handler runs nested in an
+                # outer transaction (tests), so they are not held against it
+                if not sql.lstrip().upper().startswith(SAVEPOINT_STATEMENTS):
+                    queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                result = handler(view, request, *args, **kwargs)
+
+            if len(queries) > max_queries:
+                message = (
+                    f'{view.__class__.__name__}.{handler.__name__} ran {len(queries)} queries, '
+                    f'over its budget of {max_queries}'
+                )
+                if settings.QUERY_BUDGET_STRICT:
+                    raise QueryBudgetExceeded(message + ':\n' + '\n'.join(queries))
+                logger.warning(message)
+            return result
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
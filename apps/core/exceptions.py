@@ -1,9 +1,31 @@
+from rest_framework import exceptions, status
 from rest_framework.views import exception_handler as drf_exception_handler
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class Conflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The request conflicts with another request in progress.'
+    default_code = 'conflict'
+
+
+class ServiceBusy(exceptions.APIException):
+    """Load shedding: the request was not started; the client retries after `wait` seconds."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is busy, please retry shortly.'
+    default_code = 'service_busy'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view handler ran more SQL queries than its `query_budget` allows."""
+
+
 def custom_exception_handler(exc, context):
     response = drf_exception_handler(exc, context)
 
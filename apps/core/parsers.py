@@ -0,0 +1,29 @@
+import io
+
+import orjson
+from django.conf import settings
+from rest_framework import parsers
+
+from apps.core.renderers import ORJSONRenderer
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    JSONParser on orjson for UTF-8 bodies. A body orjson rejects is handed to
+    the stdlib parser, so malformed JSON gets the same ParseError message.
+    Unlike the stdlib, integers wider than 64 bits are not read exactly; no
+    API field takes one.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,137 @@
+import multiprocessing
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from apps.core.cache import SharedMemoryCache
+from apps.throttling import throttles
+from apps.users import models as users_models
+
+
+class SharedMemoryCacheTestCase(TestCase):
+    """
+    - SharedMemoryCache behaves like a Django cache within a process
+    - Forked workers share entries, counters and throttle buckets, and
+      concurrent updates from them are not lost
+    - A stripe lock held too long is a miss (an allow for throttles), and
+      one left held by a killed worker is freed with its slots
+    - incr never writes a value past its slot
+    """
+
+    def setUp(self):
+        self.cache = SharedMemoryCache('tests', {'OPTIONS': {'MAX_ENTRIES': 64, 'SLOT_SIZE': 128, 'WAYS': 4}})
+        self.cache.clear()
+
+    def run_workers(self, target, count=4):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=target) for _ in range(count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+    def test_cache_api(self):
+        self.cache.set('a', {'balance': Decimal('1.50')})
+        self.assertEqual(self.cache.get('a'), {'balance': Decimal('1.50')})
+        self.assertFalse(self.cache.add('a', 1))
+        self.assertTrue(self.cache.add('b', 1))
+        self.assertEqual(self.cache.incr('b', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertTrue(self.cache.delete('a'))
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.set('expired', 1, timeout=0)
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+        self.cache.set('forever', 1, timeout=None)
+        self.assertTrue(self.cache.touch('forever', timeout=60))
+
+        self.cache.set('b', 'x' * 1000)
+        self.assertIsNone(self.cache.get('b'))
+
+        for index in range(500):
+            self.cache.set(f'key-{index}', index)
+        self.assertEqual(self.cache.get('key-499'), 499)
+
+    def test_shared_across_forked_workers(self):
+        self.cache.set('counter', 0, timeout=None)
+
+        def work():
+            for _ in range(200):
+                self.cache.incr('counter')
+
+        self.run_workers(work)
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_shared_token_bucket(self):
+        self.cache.set('taken', 0, timeout=None)
+
+        def work():
+            for _ in range(50):
+                [(taken, _)] = self.cache.take_tokens([('bucket', 100, 0.001)], 0.0)
+                if taken:
+                    self.cache.incr('taken')
+
+        self.run_workers(work)
+        self.assertEqual(self.cache.get('taken'), 100)
+        self.assertEqual(self.cache.take_tokens([('bucket', 100, 0.001)], 0.0), [(False, 0.0)])
+        self.assertTrue(self.cache.take_tokens([('bucket', 100, 0.001)], 1000.0)[0][0])
+
+    def test_stripe_held_by_live_process_times_out(self):
+        self.cache.set('held', 1)
+        _, _, group = self.cache._locate('held', None)
+        segment = self.cache._segment
+        with segment.locked([group]):
+            self.assertEqual(self.cache.get('held', 'miss'), 'miss')
+            self.assertFalse(self.cache.delete('held'))
+            self.assertEqual(self.cache.take_tokens([('held', 5, 1.0)], 0.0), [(True, 4)])
+        self.assertEqual(self.cache.get('held'), 1)
+
+    def test_stripe_held_by_killed_process_is_recovered(self):
+        import os
+
+        self.cache.set('held', 1)
+        _, _, group = self.cache._locate('held', None)
+        segment = self.cache._segment
+
+        def die_holding_lock():
+            segment.acquire(segment.stripe(group))
+            os._exit(0)
+
+        self.run_workers(die_holding_lock, count=1)
+        self.assertIsNone(self.cache.get('held'))
+        self.cache.set('held', 2)
+        self.assertEqual(self.cache.get('held'), 2)
+
+    def test_incr_past_slot_capacity_drops_key(self):
+        self.cache.set('counter', 0)
+        _, _, group = self.cache._locate('counter', None)
+        neighbours = [
+            f'key-{index}' for index in range(200) if self.cache._locate(f'key-{index}', None)[2] == group
+        ][:self.cache._segment.ways - 1]
+        for key in neighbours:
+            self.cache.set(key, key)
+
+        self.cache.incr('counter', 10 ** 400)
+        self.assertIsNone(self.cache.get('counter'))
+        self.assertEqual(self.cache.get_many(neighbours), {key: key for key in neighbours})
+
+    def test_throttle_uses_shared_buckets(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'apps.core.cache.SharedMemoryCache', 'LOCATION': 'tests-throttle'},
+        }, THROTTLE_CACHE='shared'):
+            def allow():
+                request = APIRequestFactory().get('/')
+                request.user = users_models.User(id=1)
+                throttle = throttles.TransactionCreateThrottle()
+                throttle.rate = '2/min'
+                throttle.num_requests, throttle.duration = throttle.parse_rate(throttle.rate)
+                self.assertIsInstance(throttle.cache, SharedMemoryCache)
+                return throttle.allow_request(request, None)
+
+            self.assertTrue(allow())
+            self.assertTrue(allow())
+            self.assertFalse(allow())
@@ -0,0 +1,165 @@
+import threading
+import fakeredis
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from apps.core.cache import RedisCache
+from apps.throttling import throttles
+from apps.users import models as users_models, consts as users_consts
+
+
+class TokenBucketThrottleTestCase(TestCase):
+    """
+    - A full period's allowance can be spent at once, then requests wait for
+      the bucket to refill at the configured rate
+    - The cache entry stays two numbers however many requests were made
+    - Scopes and users have separate buckets
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.other = users_models.User.objects.create(
+            username='other',
+            email='other@test.com',
+            password='other123',
+            role=users_consts.UserRole.SELLER
+        )
+
+    def allow(self, throttle_class, user, rate='3/min'):
+        throttle = throttle_class()
+        throttle.timer = lambda: self.now
+        throttle.rate = rate
+        throttle.num_requests, throttle.duration = throttle.parse_rate(rate)
+        request = APIRequestFactory().get('/')
+        request.user = user
+        return throttle.allow_request(request, None), throttle
+
+    def test_burst_then_refill(self):
+        for _ in range(3):
+            self.assertTrue(self.allow(throttles.TransactionCreateThrottle, self.seller)[0])
+        allowed, throttle = self.allow(throttles.TransactionCreateThrottle, self.seller)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(throttle.wait(), 20)
+
+        self.now += 19
+        self.assertFalse(self.allow(throttles.TransactionCreateThrottle, self.seller)[0])
+        self.now += 1
+        self.assertTrue(self.allow(throttles.TransactionCreateThrottle, self.seller)[0])
+        self.assertFalse(self.allow(throttles.TransactionCreateThrottle, self.seller)[0])
+
+    def test_constant_size_state(self):
+        for _ in range(1000):
+            self.now += 0.01
+            self.allow(throttles.TransactionCreateThrottle, self.seller, rate='50000/hour')
+        throttle = throttles.TransactionCreateThrottle()
+        request = APIRequestFactory().get('/')
+        request.user = self.seller
+        tokens, updated_at = cache.get(throttle.get_cache_key(request, None))
+        self.assertAlmostEqual(tokens, 50000 - 1000 + 999 * 0.01 * 50000 / 3600)
+        self.assertEqual(updated_at, self.now)
+
+    def test_separate_buckets(self):
+        for _ in range(3):
+            self.allow(throttles.TransactionCreateThrottle, self.seller)
+        self.assertFalse(self.allow(throttles.TransactionCreateThrottle, self.seller)[0])
+        self.assertTrue(self.allow(throttles.TransactionListThrottle, self.seller)[0])
+        self.assertTrue(self.allow(throttles.TransactionCreateThrottle, self.other)[0])
+
+    def test_rates_from_throttling_settings(self):
+        throttle = throttles.TransactionCreateThrottle()
+        self.assertEqual((throttle.num_requests, throttle.duration), (50000, 3600))
+        login = throttles.LoginRateThrottle()
+        self.assertEqual(login.rate, '3000/hour')
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'throttle': {
+            'BACKEND': 'apps.core.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/15',
+            'OPTIONS': {'connection_class': fakeredis.FakeConnection},
+        },
+    },
+    THROTTLE_CACHE='throttle',
+)
+class RedisThrottleTestCase(TestCase):
+    """
+    - The token bucket step runs as one script call per request, however
+      many token bucket throttles the view has
+    - A token is taken from every bucket or from none
+    - Concurrent checks do not over-admit
+    """
+
+    class View:
+        def __init__(self, throttle_classes):
+            self.throttle_classes = throttle_classes
+
+        def get_throttles(self):
+            return [throttle() for throttle in self.throttle_classes]
+
+    def setUp(self):
+        self.cache = caches['throttle']
+        self.cache.clear()
+        self.user = users_models.User(id=1)
+
+    def throttle_class(self, scope, rate):
+        return type(scope, (throttles.TransactionCreateThrottle,), {
+            'scope': scope,
+            'THROTTLE_RATES': {scope: rate},
+        })
+
+    def check(self, view):
+        """Run the view's throttles the way APIView.check_throttles does; return the refusals' waits."""
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        return [
+            throttle.wait() for throttle in view.get_throttles()
+            if not throttle.allow_request(request, view)
+        ]
+
+    def test_one_script_call_per_request(self):
+        from unittest import mock
+
+        view = self.View([self.throttle_class('user_all', '5/min'), self.throttle_class('endpoint', '2/min')])
+        with mock.patch.object(
+            type(self.cache), 'take_tokens', autospec=True, side_effect=RedisCache.take_tokens
+        ) as take_tokens:
+            self.assertEqual(self.check(view), [])
+            self.assertEqual(take_tokens.call_count, 1)
+            self.assertEqual(len(take_tokens.call_args.args[1]), 2)
+
+        self.assertEqual(self.check(view), [])
+        waits = self.check(view)
+        self.assertEqual(len(waits), 2)
+        self.assertAlmostEqual(max(waits), 30, places=0)
+
+        # The refused request took nothing from the user-wide bucket
+        other_endpoint = self.View([self.throttle_class('user_all', '5/min')])
+        for _ in range(3):
+            self.assertEqual(self.check(other_endpoint), [])
+        self.assertEqual(len(self.check(other_endpoint)), 1)
+
+    def test_concurrent_checks(self):
+        view = self.View([self.throttle_class('endpoint', '50/hour')])
+        admitted = []
+
+        def work():
+            for _ in range(10):
+                if not self.check(view):
+                    admitted.append(1)
+
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), 50)
@@ -1,21 +1,116 @@
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework import throttling
 
+from apps.throttling import settings as throttling_settings
 
-class LoginRateThrottle(throttling.AnonRateThrottle):
+
+def take_tokens(cache, buckets, now):
+    """
+    Token bucket step on a cache without an atomic `take_tokens`: one
+    get_many and one set_many, so concurrent requests may both read the
+    same bucket (as with DRF's throttles).
+    """
+    states = cache.get_many([key for key, _, _ in buckets])
+    levels = []
+    for key, capacity, rate in buckets:
+        tokens, updated_at = states.get(key, (capacity, now))
+        levels.append(min(capacity, tokens + max(0, now - updated_at) * rate))
+    if any(tokens < 1 for tokens in levels):
+        return [(False, tokens) for tokens in levels]
+
+    for (key, capacity, rate), tokens in zip(buckets, levels):
+        cache.set(key, (tokens - 1, now), (capacity - tokens + 1) / rate)
+    return [(True, tokens - 1) for tokens in levels]
+
+
+class TokenBucketThrottle(throttling.SimpleRateThrottle):
+    """
+    SimpleRateThrottle with a token bucket instead of a list of request
+    timestamps: the cache holds (tokens, updated_at) whatever the rate.
+
+    A rate of N/period is a bucket of N tokens refilled at N per period, so a
+    client can still burst a full period's allowance and is then held to the
+    average rate. A full bucket is the same as no entry, which is when the
+    cache entry expires. Subclasses mix in the cache key of the DRF throttle
+    they replace (user id, or client IP for anonymous scopes).
+
+    State lives in the THROTTLE_CACHE cache. The first of a view's token
+    bucket throttles checks all of them in one `take_tokens` call (taking a
+    token from each or none) and leaves the results on the request for the
+    others. Backends in apps.core.cache do that atomically (a Lua script on
+    Redis, striped locks in shared memory); on other caches it is a
+    get_many/set_many.
+    """
+    THROTTLE_RATES = throttling_settings.THROTTLE_RATES
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        results = getattr(request, 'token_buckets', None)
+        if results is None or self.key not in results:
+            results = self.take_tokens(self.batch(request, view))
+            request.token_buckets = results
+        taken, self.tokens = results[self.key]
+        return self.throttle_success() if taken else self.throttle_failure()
+
+    def batch(self, request, view):
+        """This throttle and the view's other token bucket throttles that apply to the request."""
+        batch = {self.key: self}
+        for throttle in view.get_throttles() if view is not None else []:
+            if not isinstance(throttle, TokenBucketThrottle) or throttle.rate is None:
+                continue
+            key = throttle.get_cache_key(request, view)
+            if key is not None and key not in batch:
+                throttle.key = key
+                batch[key] = throttle
+        return list(batch.values())
+
+    def take_tokens(self, throttles):
+        buckets = [
+            (throttle.key, throttle.num_requests, throttle.num_requests / throttle.duration)
+            for throttle in throttles
+        ]
+        cache = self.cache
+        if hasattr(cache, 'take_tokens'):
+            results = cache.take_tokens(buckets, self.now)
+        else:
+            results = take_tokens(cache, buckets, self.now)
+        return {key: result for (key, _, _), result in zip(buckets, results)}
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        return max(0, (1 - self.tokens) * self.duration / self.num_requests)
+
+
+class LoginRateThrottle(TokenBucketThrottle, throttling.AnonRateThrottle):
     scope = 'login'
 
 
-class RegistrationRateThrottle(throttling.AnonRateThrottle):
+class RegistrationRateThrottle(TokenBucketThrottle, throttling.AnonRateThrottle):
     scope = 'registration'
 
 
-class UserProfileThrottle(throttling.UserRateThrottle):
+class UserProfileThrottle(TokenBucketThrottle, throttling.UserRateThrottle):
     scope = 'user_profile'
 
 
-class TransactionCreateThrottle(throttling.UserRateThrottle):
+class TransactionCreateThrottle(TokenBucketThrottle, throttling.UserRateThrottle):
     scope = 'transaction_create'
 
 
-class TransactionListThrottle(throttling.UserRateThrottle):
+class TransactionListThrottle(TokenBucketThrottle, throttling.UserRateThrottle):
     scope = 'transaction_list'
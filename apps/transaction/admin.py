@@ -4,9 +4,9 @@ from apps.transaction import models
 
 @admin.register(models.Wallet)
 class WalletAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'balance']
+    list_display = ['id', 'user', 'balance', 'shard_count']
     search_fields = ['user__username', 'user__email']
-    readonly_fields = ['balance']
+    readonly_fields = ['balance', 'shard_count', 'version']
     raw_id_fields = ['user']
 
 
@@ -18,6 +18,10 @@ class TransactionAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     raw_id_fields = ['from_wallet', 'from_user', 'to_wallet', 'to_phone', 'updated_by']
     ordering = ['-created_at']
+    # Date drill-down lets the partitioned table prune by created_at; skip the
+    # COUNT(*) over every partition on each changelist page
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
 
     fieldsets = (
         ('Transaction Details', {
@@ -1,6 +1,62 @@
 from apps.core.decorators import status_decorator
 
 
+class TransactionConsts:
+    MAX_BATCH_SIZE = 1000
+    MAX_BULK_STATUS_SIZE = 10000
+    DEFAULT_WALLET_SHARDS = 8
+    LEDGER_LOCK_NAMESPACE = 3100
+    LEDGER_COMPACTION_LOCK_NAMESPACE = 3101
+    IDEMPOTENCY_HEADER = 'Idempotency-Key'
+    IDEMPOTENCY_REPLAYED_HEADER = 'Idempotent-Replayed'
+    IDEMPOTENCY_KEY_MAX_LENGTH = 255
+    IDEMPOTENCY_POLL_INTERVAL = 0.05
+    HISTORY_PAGE_SIZE = 20
+    HISTORY_MAX_PAGE_SIZE = 100
+    EXPORT_CHUNK_SIZE = 2000
+    ARCHIVE_LOCK_NAMESPACE = 3102
+    ARCHIVE_CHUNK_SIZE = 100000
+    ARCHIVE_DELETE_BATCH_SIZE = 5000
+    RECONCILE_RANGE_SIZE = 10000
+    ROLLUP_DEFAULT_DAYS = 30
+    ROLLUP_MAX_DAYS = 366
+    QUEUE_BATCH_SIZE = 20
+    QUEUE_MAX_BATCH_SIZE = 100
+    BALANCE_CACHE_KEY = 'wallet_balance:{}'
+    BALANCE_CACHE_LOCK_KEY = 'wallet_balance_lock:{}'
+    BALANCE_CACHE_LOCK_TIMEOUT = 1
+
+
+class BatchMode:
+    ALL_OR_NOTHING = 'all_or_nothing'
+    BEST_EFFORT = 'best_effort'
+
+    CHOICES = [ALL_OR_NOTHING, BEST_EFFORT]
+
+
+class ExportFormat:
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+    CHOICES = [NDJSON, CSV]
+    CONTENT_TYPES = {
+        NDJSON: 'application/x-ndjson',
+        CSV: 'text/csv',
+    }
+
+
+class AccountType:
+    WALLET = 'wallet'
+    PHONE = 'phone'
+
+
+class HistoryType:
+    CREDIT = 'credit'
+    SALE = 'sale'
+
+    CHOICES = [CREDIT, SALE]
+
+
 class TransactionErrorConsts:
     @status_decorator
     class InsufficientBalance:
@@ -41,3 +97,53 @@ class TransactionErrorConsts:
     class InvalidTransactionStatus:
         code = 3008
         message = 'Invalid transaction status for this operation.'
+
+    @status_decorator
+    class BatchFailed:
+        code = 3009
+        message = 'One or more items in the batch could not be processed.'
+
+    @status_decorator
+    class BulkFilterRequired:
+        code = 3010
+        message = 'Provide transaction ids or a creation date range.'
+
+    @status_decorator
+    class InvalidIdempotencyKey:
+        code = 3011
+        message = 'Idempotency key must be 1 to 255 characters long.'
+
+    @status_decorator
+    class IdempotencyKeyReused:
+        code = 3012
+        message = 'Idempotency key was already used with a different request.'
+
+    @status_decorator
+    class IdempotentRequestInProgress:
+        code = 3013
+        message = 'A request with this idempotency key is still being processed.'
+
+    @status_decorator
+    class InvalidCursor:
+        code = 3014
+        message = 'Invalid pagination cursor.'
+
+    @status_decorator
+    class ArchiveInProgress:
+        code = 3015
+        message = 'Another archival run is in progress.'
+
+    @status_decorator
+    class ArchiveVerificationFailed:
+        code = 3016
+        message = 'Archive file {} does not match the archived rows.'
+
+    @status_decorator
+    class InvalidDateRange:
+        code = 3017
+        message = 'Date range must start before it ends and span at most {} days.'
+
+    @status_decorator
+    class BulkStatusTooLarge:
+        code = 3018
+        message = 'At most {} transactions can be processed at once.'
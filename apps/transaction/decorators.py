@@ -0,0 +1,91 @@
+import functools
+import inspect
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import transaction
+from rest_framework import response
+
+from apps.transaction import services, consts
+
+
+def idempotent(scope):
+    """
+    Make a view handler honour the Idempotency-Key header: the first request
+    with a key runs the handler, retries get its stored response back without
+    re-running it, and concurrent duplicates wait for the first one.
+    Works on sync and async handlers alike.
+
+    The handler runs in one database transaction with the write of its
+    outcome, so a request either commits both or leaves nothing behind for a
+    retry to duplicate. Async handlers are driven from a sync thread for that,
+    as Django only runs transactions synchronously.
+    """
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(view, request, *args, **kwargs):
+                key = request.headers.get(consts.TransactionConsts.IDEMPOTENCY_HEADER)
+                if key is None:
+                    return await handler(view, request, *args, **kwargs)
+
+                claim, replay = await sync_to_async(services.IdempotencyService.claim)(
+                    user=request.user,
+                    scope=scope,
+                    key=key,
+                    payload=request.data
+                )
+                if replay is not None:
+                    return _replay_response(replay)
+
+                run = async_to_sync(functools.partial(handler, view, request, *args, **kwargs))
+                return await sync_to_async(_run_claimed)(claim, run)
+
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(consts.TransactionConsts.IDEMPOTENCY_HEADER)
+            if key is None:
+                return handler(view, request, *args, **kwargs)
+
+            claim, replay = services.IdempotencyService.claim(
+                user=request.user,
+                scope=scope,
+                key=key,
+                payload=request.data
+            )
+            if replay is not None:
+                return _replay_response(replay)
+
+            return _run_claimed(claim, functools.partial(handler, view, request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def _replay_response(replay):
+    return response.Response(
+        replay.response_body,
+        status=replay.status_code,
+        headers={consts.TransactionConsts.IDEMPOTENCY_REPLAYED_HEADER: 'true'}
+    )
+
+
+def _run_claimed(claim, run):
+    try:
+        with transaction.atomic():
+            services.IdempotencyService.hold(claim)
+            result = run()
+            _record_outcome(claim, result)
+    except Exception:
+        services.IdempotencyService.release(claim)
+        raise
+    return result
+
+
+def _record_outcome(claim, result):
+    if result.status_code >= 500:
+        services.IdempotencyService.release(claim)
+    else:
+        services.IdempotencyService.complete(claim, result.status_code, result.data)
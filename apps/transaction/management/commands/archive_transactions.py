@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from apps.transaction import services, consts
+
+
+class Command(BaseCommand):
+    help = 'Move settled transactions older than the retention window to archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            help='Archive transactions created more than this many days ago '
+                 '(defaults to TRANSACTION_ARCHIVE_RETENTION_DAYS).'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=consts.TransactionConsts.ARCHIVE_CHUNK_SIZE,
+            help='Transactions per archive file.'
+        )
+        parser.add_argument(
+            '--delete-batch-size',
+            type=int,
+            default=consts.TransactionConsts.ARCHIVE_DELETE_BATCH_SIZE,
+            help='Archived transactions deleted per database transaction.'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = None
+        if options['older_than_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+
+        try:
+            batches = services.TransactionArchiveService.archive(
+                cutoff=cutoff,
+                chunk_size=options['chunk_size'],
+                delete_batch_size=options['delete_batch_size']
+            )
+        except APIException as e:
+            raise CommandError(e.detail)
+
+        for batch in batches:
+            self.stdout.write(f'Archived {batch.row_count} transaction(s) to {batch.file_name}.')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.transaction import services
+
+
+class Command(BaseCommand):
+    help = 'Roll ledger entries into balance snapshots (ledger mode).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bootstrap',
+            action='store_true',
+            help='Seed snapshots from the current balance columns before compacting.'
+        )
+        parser.add_argument(
+            '--lag',
+            type=int,
+            help='Only compact entries older than this many seconds '
+                 '(defaults to TRANSACTION_LEDGER_COMPACTION_LAG).'
+        )
+
+    def handle(self, *args, **options):
+        if options['bootstrap']:
+            seeded = services.LedgerService.bootstrap()
+            self.stdout.write(f'Seeded {seeded} snapshot(s) from balance columns.')
+
+        written = services.LedgerService.compact(lag=options['lag'])
+        self.stdout.write(f'Wrote {written} snapshot(s).')
@@ -0,0 +1,77 @@
+import argparse
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.transaction import services, consts
+
+
+def datetime_argument(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f'invalid ISO 8601 datetime: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Stream transactions as NDJSON or CSV for reconciliation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=consts.ExportFormat.CHOICES,
+            default=consts.ExportFormat.NDJSON
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output with gzip.'
+        )
+        parser.add_argument(
+            '--status',
+            type=int,
+            help='Only export transactions with this status.'
+        )
+        parser.add_argument(
+            '--after',
+            type=datetime_argument,
+            help='Only export transactions created at or after this ISO 8601 datetime.'
+        )
+        parser.add_argument(
+            '--before',
+            type=datetime_argument,
+            help='Only export transactions created before this ISO 8601 datetime.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=consts.TransactionConsts.EXPORT_CHUNK_SIZE,
+            help='Rows fetched from the server-side cursor per round trip.'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to (defaults to stdout).'
+        )
+
+    def handle(self, *args, **options):
+        chunks = services.TransactionExportService.export(
+            export_format=options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+            status=options['status'],
+            created_after=options['after'],
+            created_before=options['before'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,43 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.transaction import services
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly transaction partitions and detach old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            help='Months to create partitions for after the current one '
+                 '(defaults to TRANSACTION_PARTITION_MONTHS_AHEAD).'
+        )
+        parser.add_argument(
+            '--detach-before',
+            type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+            help='Detach the emptied partitions of months ending by this date (YYYY-MM-DD, '
+                 'in the database time zone). Archive their settled rows first.'
+        )
+
+    def handle(self, *args, **options):
+        for name in services.TransactionPartitionService.create_partitions(
+            months_ahead=options['months_ahead']
+        ):
+            self.stdout.write(f'Created partition {name}.')
+
+        if options['detach_before']:
+            # Partition bounds are months in the session time zone (migration 0006)
+            before = timezone.make_aware(datetime.combine(options['detach_before'], time.min), connection.timezone)
+            detached, kept = services.TransactionPartitionService.detach_partitions(before)
+            for name in detached:
+                self.stdout.write(f'Detached partition {name}.')
+            for name, pending in kept:
+                if pending:
+                    self.stdout.write(f'Kept partition {name}: it has pending transaction(s).')
+                else:
+                    self.stdout.write(f'Kept partition {name}: its settled transaction(s) are not archived yet.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.transaction import services
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys.'
+
+    def handle(self, *args, **options):
+        deleted = services.IdempotencyService.purge_expired()
+        self.stdout.write(f'Deleted {deleted} expired idempotency key(s).')
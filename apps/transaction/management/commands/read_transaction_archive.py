@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.transaction import services
+from apps.transaction.management.commands.export_transactions import datetime_argument
+
+
+class Command(BaseCommand):
+    help = 'Print archived transactions as NDJSON, filtered by wallet and creation date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wallet',
+            type=int,
+            help='Only transactions sent from or received by this wallet id.'
+        )
+        parser.add_argument(
+            '--after',
+            type=datetime_argument,
+            help='Only transactions created at or after this ISO 8601 datetime.'
+        )
+        parser.add_argument(
+            '--before',
+            type=datetime_argument,
+            help='Only transactions created before this ISO 8601 datetime.'
+        )
+
+    def handle(self, *args, **options):
+        for row in services.TransactionArchiveService.read(
+            wallet_id=options['wallet'],
+            created_after=options['after'],
+            created_before=options['before'],
+        ):
+            self.stdout.write(json.dumps(row, separators=(',', ':')))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.transaction import models, services, consts
+
+
+class Command(BaseCommand):
+    help = 'Enable, resize or rebalance sharded wallet balances.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wallet-id',
+            type=int,
+            action='append',
+            dest='wallet_ids',
+            help='Wallet to process (repeatable). Defaults to every sharded wallet.'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            help=(
+                'Set the shard count before rebalancing (0 disables sharding). '
+                f'Use {consts.TransactionConsts.DEFAULT_WALLET_SHARDS} for a typical hot seller.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards is not None and shards < 0:
+            raise CommandError('--shards must not be negative.')
+
+        wallets = models.Wallet.objects.order_by('id')
+        if options['wallet_ids']:
+            wallets = wallets.filter(id__in=options['wallet_ids'])
+        elif shards is None:
+            wallets = wallets.filter(shard_count__gt=0)
+        else:
+            raise CommandError('--shards requires at least one --wallet-id.')
+
+        for wallet in wallets.iterator():
+            if shards is not None:
+                wallet = services.WalletShardService.configure_sharding(wallet, shards)
+            else:
+                wallet = services.WalletShardService.rebalance(wallet)
+            self.stdout.write(
+                f'Wallet {wallet.id}: {wallet.shard_count} shard(s), balance {wallet.available_balance}'
+            )
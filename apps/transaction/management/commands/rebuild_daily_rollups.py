@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.transaction import services, models
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily sales/approval rollups from the live transactions. '
+            'Sales and approvals wait while it runs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+            help='First day to rebuild (YYYY-MM-DD); defaults to the oldest live transaction.'
+        )
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since is None:
+            oldest = models.Transaction.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            if oldest is None:
+                self.stdout.write('No transactions to roll up.')
+                return
+            since = timezone.localdate(oldest)
+
+        services.RollupService.rebuild(since)
+        self.stdout.write(f'Rebuilt daily rollups since {since}.')
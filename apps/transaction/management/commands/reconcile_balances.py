@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from apps.transaction import services, consts
+
+
+class Command(BaseCommand):
+    help = 'Check wallet and phone number balances against their approved transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Check every account, not only those touched since the last run.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker processes (1 runs in this process).'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=consts.TransactionConsts.RECONCILE_RANGE_SIZE,
+            help='Accounts checked per query.'
+        )
+        parser.add_argument(
+            '--report',
+            help='Path of the JSON discrepancy report (defaults to reconciliation-<run id>.json '
+                 'in TRANSACTION_RECONCILE_REPORT_DIR).'
+        )
+
+    def handle(self, *args, **options):
+        run = services.ReconciliationService.run(
+            full=options['full'],
+            workers=options['workers'],
+            range_size=options['range_size'],
+            report_path=options['report']
+        )
+        self.stdout.write(
+            f'Checked {run.accounts_checked} account(s) ({"full" if run.full else "incremental"}), '
+            f'found {run.discrepancies} discrepancy(ies). Report: {run.report_path}'
+        )
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0002_wallet_shards'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('phone', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='balance_snapshots', to='users.phonenumber')),
+                ('wallet', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='balance_snapshots', to='transaction.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'last_entry_id'], name='snapshot_wallet_entry_idx'), models.Index(fields=['phone', 'last_entry_id'], name='snapshot_phone_entry_idx'), models.Index(fields=['last_entry_id'], name='snapshot_last_entry_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('phone__isnull', True), ('wallet__isnull', False)), models.Q(('phone__isnull', False), ('wallet__isnull', True)), _connector='OR'), name='balance_snapshot_single_account')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('phone', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='users.phonenumber')),
+                ('wallet', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='transaction.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'id'], name='ledger_wallet_id_idx'), models.Index(fields=['phone', 'id'], name='ledger_phone_id_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('phone__isnull', True), ('wallet__isnull', False)), models.Q(('phone__isnull', False), ('wallet__isnull', True)), _connector='OR'), name='ledger_entry_single_account')],
+            },
+        ),
+    ]
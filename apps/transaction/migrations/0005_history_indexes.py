@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:02
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('transaction', '0004_idempotency_keys'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['from_wallet', 'created_at', 'id'], name='tx_from_wallet_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['to_wallet', 'created_at', 'id'], name='tx_to_wallet_created_idx'),
+        ),
+    ]
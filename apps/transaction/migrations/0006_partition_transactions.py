@@ -0,0 +1,123 @@
+"""
+Convert transaction_transaction into a table partitioned by range of created_at.
+
+The existing table is not copied: it is attached as the first partition
+(transaction_transaction_p_legacy, every row before the start of next month).
+Everything that would need a scan of the old rows (the (id, created_at) unique
+index backing the new primary key, the partition bound check) is prepared
+concurrently first, so the conversion itself only holds its lock for catalog
+changes. Later months get their own partitions from
+`manage.py manage_transaction_partitions`; rows outside every partition land
+in transaction_transaction_default.
+
+Nothing references the transaction table with a foreign key, which a
+partitioned table with a composite primary key could not serve.
+"""
+from django.db import migrations
+
+
+PREPARE_UNIQUE_INDEX = '''
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS tx_legacy_id_created_uniq
+    ON transaction_transaction (id, created_at);
+'''
+
+PREPARE_BOUND_CHECK = '''
+DO $$
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE transaction_transaction ADD CONSTRAINT tx_legacy_bound '
+        'CHECK (created_at < %L) NOT VALID',
+        date_trunc('month', now()) + interval '1 month'
+    );
+END $$;
+'''
+
+VALIDATE_BOUND_CHECK = '''
+ALTER TABLE transaction_transaction VALIDATE CONSTRAINT tx_legacy_bound;
+'''
+
+CONVERT = """
+DO $$
+DECLARE
+    legacy regclass;
+    pk_name text;
+    boundary timestamptz;
+    next_id bigint;
+    idx record;
+    fk record;
+BEGIN
+    SELECT conname INTO pk_name FROM pg_constraint
+    WHERE conrelid = 'transaction_transaction'::regclass AND contype = 'p';
+    SELECT substring(pg_get_constraintdef(oid) FROM '''([^'']+)''')::timestamptz INTO boundary
+    FROM pg_constraint
+    WHERE conrelid = 'transaction_transaction'::regclass AND conname = 'tx_legacy_bound';
+    next_id := nextval(pg_get_serial_sequence('transaction_transaction', 'id'));
+
+    ALTER TABLE transaction_transaction RENAME TO transaction_transaction_p_legacy;
+    legacy := 'transaction_transaction_p_legacy'::regclass;
+
+    EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', legacy, pk_name);
+    ALTER TABLE transaction_transaction_p_legacy
+        ADD CONSTRAINT transaction_transaction_p_legacy_pkey PRIMARY KEY USING INDEX tx_legacy_id_created_uniq;
+    ALTER TABLE transaction_transaction_p_legacy ALTER COLUMN id DROP IDENTITY;
+
+    CREATE TABLE transaction_transaction (
+        LIKE transaction_transaction_p_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (created_at);
+    ALTER TABLE transaction_transaction DROP CONSTRAINT tx_legacy_bound;
+    ALTER TABLE transaction_transaction ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+    PERFORM setval(pg_get_serial_sequence('transaction_transaction', 'id'), next_id, false);
+    EXECUTE format(
+        'ALTER TABLE transaction_transaction ADD CONSTRAINT %I PRIMARY KEY (id, created_at)',
+        pk_name
+    );
+
+    -- Index names are schema wide: hand them over to the parent, whose
+    -- indexes adopt the legacy ones on attach instead of rebuilding them
+    FOR idx IN
+        SELECT c.relname AS name, i.indisunique AS is_unique,
+               split_part(pg_get_indexdef(i.indexrelid), ' USING ', 2) AS method
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = legacy AND NOT i.indisprimary
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.name, left('legacy_' || idx.name, 63));
+        EXECUTE format(
+            'CREATE %sINDEX %I ON transaction_transaction USING %s',
+            CASE WHEN idx.is_unique THEN 'UNIQUE ' ELSE '' END, idx.name, idx.method
+        );
+    END LOOP;
+
+    FOR fk IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint WHERE conrelid = legacy AND contype = 'f'
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE transaction_transaction ADD CONSTRAINT %I %s',
+            fk.conname, fk.definition
+        );
+    END LOOP;
+
+    EXECUTE format(
+        'ALTER TABLE transaction_transaction ATTACH PARTITION %s FOR VALUES FROM (MINVALUE) TO (%L)',
+        legacy, boundary
+    );
+    ALTER TABLE transaction_transaction_p_legacy DROP CONSTRAINT tx_legacy_bound;
+    CREATE TABLE transaction_transaction_default PARTITION OF transaction_transaction DEFAULT;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('transaction', '0005_history_indexes'),
+    ]
+
+    # Not reversible in place: the ORM works the same on the partitioned table
+    operations = [
+        migrations.RunSQL(PREPARE_UNIQUE_INDEX, migrations.RunSQL.noop),
+        migrations.RunSQL(PREPARE_BOUND_CHECK, migrations.RunSQL.noop),
+        migrations.RunSQL(VALIDATE_BOUND_CHECK, migrations.RunSQL.noop),
+        migrations.RunSQL(CONVERT, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0006_partition_transactions'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('status', models.SmallIntegerField(choices=[(1, 'Pending'), (2, 'Written'), (3, 'Deleted')], default=1)),
+                ('cutoff', models.DateTimeField()),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('min_created_at', models.DateTimeField(null=True)),
+                ('max_created_at', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['min_created_at', 'max_created_at'], name='archive_created_range_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('phone', models.OneToOneField(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_balance', to='users.phonenumber')),
+                ('wallet', models.OneToOneField(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_balance', to='transaction.wallet')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('phone__isnull', True), ('wallet__isnull', False)), models.Q(('phone__isnull', False), ('wallet__isnull', True)), _connector='OR'), name='archived_balance_single_account')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0008_reconciliation_runs'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('charge_count', models.PositiveIntegerField(db_default=0, default=0)),
+                ('charge_amount', models.DecimalField(db_default=0, decimal_places=2, default=0, max_digits=20)),
+                ('phone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='users.phonenumber')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('phone', 'day'), name='phone_rollup_unique_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sales_count', models.PositiveIntegerField(db_default=0, default=0)),
+                ('sales_amount', models.DecimalField(db_default=0, decimal_places=2, default=0, max_digits=20)),
+                ('credit_count', models.PositiveIntegerField(db_default=0, default=0)),
+                ('credit_amount', models.DecimalField(db_default=0, decimal_places=2, default=0, max_digits=20)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='transaction.wallet')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'day'), name='wallet_rollup_unique_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_pending_queue_index(apps, schema_editor):
+    """
+    CREATE INDEX CONCURRENTLY is not supported on a partitioned table: build
+    the index concurrently on every partition, then attach them all to an
+    index created on the parent only.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS tx_pending_queue_idx ON ONLY transaction_transaction '
+            '(created_at, id) WHERE status = 1'
+        )
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = 'transaction_transaction'::regclass"
+        )
+        for (partition,) in cursor.fetchall():
+            index = schema_editor.connection.ops.quote_name(f'{partition}_pending_queue_idx'[:63])
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {partition} '
+                f'(created_at, id) WHERE status = 1'
+            )
+            cursor.execute(f'ALTER INDEX tx_pending_queue_idx ATTACH PARTITION {index}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('transaction', '0009_daily_rollups'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='claimed_by',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='transaction',
+                    index=models.Index(condition=models.Q(('status', 1)), fields=['created_at', 'id'], name='tx_pending_queue_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    create_pending_queue_index,
+                    migrations.RunPython.noop,
+                ),
+            ],
+        ),
+    ]
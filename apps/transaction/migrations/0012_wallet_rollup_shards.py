@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0011_wallet_version'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='walletdailyrollup',
+            name='wallet_rollup_unique_day',
+        ),
+        migrations.AddField(
+            model_name='walletdailyrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='walletdailyrollup',
+            constraint=models.UniqueConstraint(fields=('wallet', 'shard', 'day'), name='wallet_rollup_unique_shard_day'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from apps.users import models as users_models
@@ -13,6 +14,14 @@ class Wallet(models.Model):
         decimal_places=2,
         default=0
     )
+    shard_count = models.PositiveSmallIntegerField(
+        default=0
+    )
+    # Bumped by every UPDATE of the balance; orders the cached balances and
+    # backs the ETag of the balance endpoint
+    version = models.BigIntegerField(
+        default=0
+    )
 
     class Meta:
         constraints = [
@@ -22,6 +31,43 @@ class Wallet(models.Model):
             ),
         ]
 
+    @property
+    def available_balance(self):
+        if not self.shard_count:
+            return self.balance
+        shard_total = self.shards.aggregate(total=models.Sum('balance'))['total']
+        return self.balance + (shard_total or 0)
+
+
+class WalletShard(models.Model):
+    """
+    Sub-balance of a sharded wallet. Debits are spread over the shards so that
+    concurrent sales of one seller do not serialize on the wallet row.
+    """
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='shards',
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(balance__gte=0),
+                name='wallet_shard_balance_non_negative'
+            ),
+            models.UniqueConstraint(
+                fields=['wallet', 'index'],
+                name='wallet_shard_unique_index'
+            ),
+        ]
+
 
 class SourceType(models.IntegerChoices):
     WALLET = 1
@@ -40,6 +86,11 @@ class TransactionStatus(models.IntegerChoices):
 
 
 class Transaction(models.Model):
+    """
+    Stored in a table range-partitioned by created_at (migration 0006), whose
+    real primary key is (id, created_at): other tables must reference
+    transactions by plain id, not with a foreign key.
+    """
     amount = models.DecimalField(
         max_digits=12,
         decimal_places=2,
@@ -95,6 +146,19 @@ class Transaction(models.Model):
         related_name='received_transactions',
     )
 
+    # Review lease of a pending credit request handed out by the admin queue
+    claimed_by = models.ForeignKey(
+        users_models.User,
+        null=True,
+        on_delete=models.SET_NULL,
+        db_index=False,
+        related_name='claimed_transactions'
+    )
+    claimed_until = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -138,4 +202,327 @@ class Transaction(models.Model):
             models.Index(fields=['to_wallet', 'status'], name='tx_to_wallet_status_idx'),
             models.Index(fields=['to_phone', 'status'], name='tx_to_phone_status_idx'),
             models.Index(fields=['status', 'updated_at'], name='tx_status_updated_idx'),
+            # Keyset pagination of a seller's history on (created_at, id)
+            models.Index(fields=['from_wallet', 'created_at', 'id'], name='tx_from_wallet_created_idx'),
+            models.Index(fields=['to_wallet', 'created_at', 'id'], name='tx_to_wallet_created_idx'),
+            # Admin credit queue: only pending rows, however large the history
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status=TransactionStatus.PENDING),
+                name='tx_pending_queue_idx'
+            ),
+        ]
+
+
+class LedgerEntry(models.Model):
+    """
+    Immutable balance movement of a wallet or a phone number (ledger mode).
+    Debits are stored as negative amounts.
+    """
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='ledger_entries',
+    )
+    phone = models.ForeignKey(
+        users_models.PhoneNumber,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='ledger_entries',
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                        models.Q(wallet__isnull=False, phone__isnull=True) |
+                        models.Q(wallet__isnull=True, phone__isnull=False)
+                ),
+                name='ledger_entry_single_account'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['wallet', 'id'], name='ledger_wallet_id_idx'),
+            models.Index(fields=['phone', 'id'], name='ledger_phone_id_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Balance of an account including every ledger entry up to `last_entry_id`.
+    """
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='balance_snapshots',
+    )
+    phone = models.ForeignKey(
+        users_models.PhoneNumber,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='balance_snapshots',
+    )
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+    )
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                        models.Q(wallet__isnull=False, phone__isnull=True) |
+                        models.Q(wallet__isnull=True, phone__isnull=False)
+                ),
+                name='balance_snapshot_single_account'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['wallet', 'last_entry_id'], name='snapshot_wallet_entry_idx'),
+            models.Index(fields=['phone', 'last_entry_id'], name='snapshot_phone_entry_idx'),
+            models.Index(fields=['last_entry_id'], name='snapshot_last_entry_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a request sent with an Idempotency-Key header. Keys and
+    payloads are kept as SHA-256 digests; rows expire after IDEMPOTENCY_KEY_TTL.
+    A row without `status_code` belongs to a request that is still running.
+    """
+    user = models.ForeignKey(
+        users_models.User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+    )
+    key_hash = models.BinaryField(
+        max_length=32,
+    )
+    request_hash = models.BinaryField(
+        max_length=32,
+    )
+    status_code = models.SmallIntegerField(
+        null=True,
+    )
+    response_body = models.JSONField(
+        null=True,
+        encoder=DjangoJSONEncoder,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key_hash'],
+                name='idempotency_key_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+
+class ArchiveBatchStatus(models.IntegerChoices):
+    PENDING = 1
+    WRITTEN = 2
+    DELETED = 3
+
+
+class ArchiveBatch(models.Model):
+    """
+    One gzipped NDJSON file of settled transactions moved out of the hot table.
+    The file is written and verified (WRITTEN) before its rows are deleted
+    (DELETED); the created_at range lets readers skip files.
+    """
+    file_name = models.CharField(
+        max_length=255,
+    )
+    status = models.SmallIntegerField(
+        choices=ArchiveBatchStatus.choices,
+        default=ArchiveBatchStatus.PENDING.value,
+    )
+    cutoff = models.DateTimeField()
+    row_count = models.PositiveIntegerField(
+        default=0,
+    )
+    amount_sum = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+    )
+    min_created_at = models.DateTimeField(
+        null=True,
+    )
+    max_created_at = models.DateTimeField(
+        null=True,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['min_created_at', 'max_created_at'], name='archive_created_range_idx'),
+        ]
+
+
+class ArchivedBalance(models.Model):
+    """
+    Net of the approved transactions of an account that have been archived, so
+    that its balance still equals this amount plus its live transactions.
+    """
+    wallet = models.OneToOneField(
+        Wallet,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='archived_balance',
+    )
+    phone = models.OneToOneField(
+        users_models.PhoneNumber,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='archived_balance',
+    )
+    amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                        models.Q(wallet__isnull=False, phone__isnull=True) |
+                        models.Q(wallet__isnull=True, phone__isnull=False)
+                ),
+                name='archived_balance_single_account'
+            ),
+        ]
+
+
+class ReconciliationRun(models.Model):
+    """
+    One balance reconciliation pass. `high_water_id` (newest transaction id at
+    start) and `started_at` (less TRANSACTION_RECONCILE_OVERLAP) of the last
+    finished run bound the transactions an incremental run looks at to find
+    the accounts touched since.
+    """
+    full = models.BooleanField(
+        default=False,
+    )
+    high_water_id = models.BigIntegerField(
+        default=0,
+    )
+    accounts_checked = models.PositiveIntegerField(
+        default=0,
+    )
+    discrepancies = models.PositiveIntegerField(
+        default=0,
+    )
+    report_path = models.CharField(
+        max_length=255,
+        blank=True,
+    )
+    started_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+    )
+
+
+class WalletDailyRollup(models.Model):
+    """
+    Per wallet and day: sales made (by transaction creation) and credit
+    requests approved (by approval time).
+
+    A sale from a sharded wallet is counted on the row of the WalletShard it
+    was debited from (`shard`), so concurrent sales do not queue on one
+    rollup row; everything else is counted on shard 0. A day's totals are
+    the sum of its rows.
+    """
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+    )
+    shard = models.PositiveSmallIntegerField(
+        default=0,
+        db_default=0,
+    )
+    day = models.DateField()
+    sales_count = models.PositiveIntegerField(
+        default=0,
+        db_default=0,
+    )
+    sales_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+        db_default=0,
+    )
+    credit_count = models.PositiveIntegerField(
+        default=0,
+        db_default=0,
+    )
+    credit_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+        db_default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['wallet', 'shard', 'day'],
+                name='wallet_rollup_unique_shard_day'
+            ),
+        ]
+
+
+class PhoneDailyRollup(models.Model):
+    """
+    Per phone number and day: charges received.
+    """
+    phone = models.ForeignKey(
+        users_models.PhoneNumber,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+    )
+    day = models.DateField()
+    charge_count = models.PositiveIntegerField(
+        default=0,
+        db_default=0,
+    )
+    charge_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+        db_default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['phone', 'day'],
+                name='phone_rollup_unique_day'
+            ),
         ]
@@ -1,17 +1,94 @@
+import decimal
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from phonenumber_field.serializerfields import PhoneNumberField
 
-from apps.transaction import models
+from apps.transaction import models, consts, services
+
+
+def decimal_formatter(max_digits, decimal_places):
+    """
+    DecimalField(max_digits, decimal_places).to_representation without the
+    field: quantize with the same precision and rounding, plain notation.
+    """
+    quantum = decimal.Decimal('.1') ** decimal_places
+    context = decimal.Context(prec=max_digits)
+
+    def format_decimal(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(quantum, context=context):f}'
+    return format_decimal
+
+
+def format_datetime(value, tz):
+    """
+    DateTimeField().to_representation with USE_TZ: `tz` is the current time
+    zone, looked up once by the caller; UTC renders as 'Z'.
+    """
+    value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+format_money = decimal_formatter(max_digits=12, decimal_places=2)
+STATUS_VALUES = {str(value): value for value, _ in models.TransactionStatus.choices}
+STATUS_LABELS = dict(models.TransactionStatus.choices)
+SOURCE_TYPE_VALUES = {str(value): value for value, _ in models.SourceType.choices}
+DEST_TYPE_VALUES = {str(value): value for value, _ in models.DestType.choices}
+
+
+class WalletBalanceField(serializers.DecimalField):
+    """
+    Wallet balance as the active balance mode sees it (shards, ledger). Views
+    that resolve it up front (balance cache, async ORM) pass it in the
+    `balance` context key.
+    """
+
+    def get_attribute(self, instance):
+        if 'balance' in self.context:
+            return self.context['balance']
+        return services.BalanceService.get_wallet_balance(instance)
+
+
+class PhoneBalanceField(serializers.DecimalField):
+    """Phone number balance as the active balance mode sees it (ledger)."""
+
+    def get_attribute(self, instance):
+        return services.BalanceService.get_phone_balance(instance)
 
 
 class WalletSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    balance = WalletBalanceField(
+        max_digits=12,
+        decimal_places=2,
+        read_only=True
+    )
 
     class Meta:
         model = models.Wallet
         fields = ['user_email', 'balance']
         read_only_fields = fields
 
+    def to_representation(self, instance):
+        if not settings.PRECOMPILED_SERIALIZERS or type(self) is not WalletSerializer:
+            return super().to_representation(instance)
+        if 'balance' in self.context:
+            balance = self.context['balance']
+        else:
+            balance = services.BalanceService.get_wallet_balance(instance)
+        email = instance.user.email
+        return {
+            'user_email': None if email is None else str(email),
+            'balance': None if balance is None else format_money(balance),
+        }
+
 
 class CreateCreditRequestSerializer(serializers.Serializer):
     amount = serializers.DecimalField(
@@ -22,18 +99,19 @@ class CreateCreditRequestSerializer(serializers.Serializer):
 
 
 class TransactionSerializer(serializers.ModelSerializer):
+    """
+    Renders from the *_id columns; the only related object it reads is
+    `to_phone`, which every sale path already holds (and queries select).
+    """
     from_user_id = serializers.IntegerField(
-        source='from_user.id',
         read_only=True,
         allow_null=True
     )
     from_wallet_id = serializers.IntegerField(
-        source='from_wallet.id',
         read_only=True,
         allow_null=True
     )
     to_wallet_id = serializers.IntegerField(
-        source='to_wallet.id',
         read_only=True,
         allow_null=True
     )
@@ -43,7 +121,6 @@ class TransactionSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     updated_by_id = serializers.IntegerField(
-        source='updated_by.id',
         read_only=True,
         allow_null=True
     )
@@ -71,6 +148,155 @@ class TransactionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+    def to_representation(self, instance):
+        # Subclasses add fields of their own and keep the generic path
+        if not settings.PRECOMPILED_SERIALIZERS or type(self) is not TransactionSerializer:
+            return super().to_representation(instance)
+        to_phone = instance.to_phone
+        tz = timezone.get_current_timezone()
+        return {
+            'id': instance.id,
+            'amount': format_money(instance.amount),
+            'status': STATUS_VALUES.get(str(instance.status), instance.status),
+            'status_display': str(STATUS_LABELS.get(instance.status, instance.status)),
+            'created_at': None if instance.created_at is None else format_datetime(instance.created_at, tz),
+            'updated_at': None if instance.updated_at is None else format_datetime(instance.updated_at, tz),
+            'updated_by_id': instance.updated_by_id,
+            'from_type': SOURCE_TYPE_VALUES.get(str(instance.from_type), instance.from_type),
+            'from_user_id': instance.from_user_id,
+            'from_wallet_id': instance.from_wallet_id,
+            'to_type': DEST_TYPE_VALUES.get(str(instance.to_type), instance.to_type),
+            'to_wallet_id': instance.to_wallet_id,
+            'to_phone_number': None if to_phone is None else str(to_phone.phone_number),
+        }
+
+
+class TransactionHistoryQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(
+        required=False
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=consts.TransactionConsts.HISTORY_MAX_PAGE_SIZE,
+        default=consts.TransactionConsts.HISTORY_PAGE_SIZE
+    )
+    status = serializers.ChoiceField(
+        choices=models.TransactionStatus.choices,
+        required=False
+    )
+    type = serializers.ChoiceField(
+        choices=consts.HistoryType.CHOICES,
+        required=False
+    )
+    created_after = serializers.DateTimeField(
+        required=False
+    )
+    created_before = serializers.DateTimeField(
+        required=False
+    )
+
+
+class TransactionExportQuerySerializer(serializers.Serializer):
+    # Not `format`, which DRF reserves for renderer selection
+    output = serializers.ChoiceField(
+        choices=consts.ExportFormat.CHOICES,
+        default=consts.ExportFormat.NDJSON
+    )
+    gzip = serializers.BooleanField(
+        default=False
+    )
+    status = serializers.ChoiceField(
+        choices=models.TransactionStatus.choices,
+        required=False
+    )
+    created_after = serializers.DateTimeField(
+        required=False
+    )
+    created_before = serializers.DateTimeField(
+        required=False
+    )
+
+
+class DailyRollupQuerySerializer(serializers.Serializer):
+    account = serializers.ChoiceField(
+        choices=[consts.AccountType.WALLET, consts.AccountType.PHONE],
+        default=consts.AccountType.WALLET
+    )
+    start = serializers.DateField(
+        required=False
+    )
+    end = serializers.DateField(
+        required=False
+    )
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - timedelta(days=consts.TransactionConsts.ROLLUP_DEFAULT_DAYS - 1)
+        if start > end or (end - start).days >= consts.TransactionConsts.ROLLUP_MAX_DAYS:
+            raise serializers.ValidationError(
+                consts.TransactionErrorConsts.InvalidDateRange().get_status(
+                    consts.TransactionConsts.ROLLUP_MAX_DAYS
+                )
+            )
+        attrs['start'], attrs['end'] = start, end
+        return attrs
+
+
+class WalletDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.WalletDailyRollup
+        fields = ['day', 'sales_count', 'sales_amount', 'credit_count', 'credit_amount']
+        read_only_fields = fields
+
+
+class PhoneDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.PhoneDailyRollup
+        fields = ['day', 'charge_count', 'charge_amount']
+        read_only_fields = fields
+
+
+class CreditQueueItemSerializer(TransactionSerializer):
+    claimed_by_id = serializers.IntegerField(
+        read_only=True,
+        allow_null=True
+    )
+    claimed_until = serializers.DateTimeField(
+        read_only=True,
+        allow_null=True
+    )
+
+    class Meta(TransactionSerializer.Meta):
+        fields = TransactionSerializer.Meta.fields + ['claimed_by_id', 'claimed_until']
+        read_only_fields = fields
+
+
+class CreditQueueClaimSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=consts.TransactionConsts.QUEUE_MAX_BATCH_SIZE,
+        default=consts.TransactionConsts.QUEUE_BATCH_SIZE
+    )
+
+
+class CreditQueueReleaseSerializer(serializers.Serializer):
+    transaction_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=consts.TransactionConsts.QUEUE_MAX_BATCH_SIZE
+    )
+
+
+class CreditQueueQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(
+        required=False
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=consts.TransactionConsts.HISTORY_MAX_PAGE_SIZE,
+        default=consts.TransactionConsts.HISTORY_PAGE_SIZE
+    )
+
 
 class ProcessTransactionSerializer(serializers.Serializer):
     transaction_id = serializers.IntegerField()
@@ -79,6 +305,31 @@ class ProcessTransactionSerializer(serializers.Serializer):
     )
 
 
+class BulkProcessTransactionSerializer(serializers.Serializer):
+    transaction_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+        max_length=consts.TransactionConsts.MAX_BULK_STATUS_SIZE
+    )
+    created_after = serializers.DateTimeField(
+        required=False
+    )
+    created_before = serializers.DateTimeField(
+        required=False
+    )
+    status = serializers.ChoiceField(
+        choices=[models.TransactionStatus.APPROVED, models.TransactionStatus.REJECTED,]
+    )
+
+    def validate(self, attrs):
+        if not any(key in attrs for key in ('transaction_ids', 'created_after', 'created_before')):
+            raise serializers.ValidationError(
+                consts.TransactionErrorConsts.BulkFilterRequired().get_status()
+            )
+        return attrs
+
+
 class SellChargeSerializer(serializers.Serializer):
     phone_number = PhoneNumberField(
         required=True
@@ -88,3 +339,25 @@ class SellChargeSerializer(serializers.Serializer):
         decimal_places=2,
         min_value=0.01
     )
+
+
+class SellChargeBatchSerializer(serializers.Serializer):
+    items = SellChargeSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=consts.TransactionConsts.MAX_BATCH_SIZE
+    )
+    mode = serializers.ChoiceField(
+        choices=consts.BatchMode.CHOICES,
+        default=consts.BatchMode.ALL_OR_NOTHING
+    )
+
+
+class SellChargeBatchResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField(read_only=True)
+    success = serializers.SerializerMethodField()
+    transaction = TransactionSerializer(read_only=True, allow_null=True)
+    error = serializers.DictField(read_only=True, allow_null=True)
+
+    def get_success(self, obj):
+        return obj['error'] is None
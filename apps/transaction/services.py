@@ -1,13 +1,761 @@
-from django.db import transaction, IntegrityError
-from django.db.models import F
+import asyncio
+import base64
+import binascii
+import csv
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_DOWN
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, connections, transaction, IntegrityError
+from django.db.models import F, Max, Min, Q, Sum
 from django.utils import timezone
 
 from rest_framework import exceptions
 
+from apps.core.exceptions import Conflict
 from apps.transaction import models, consts
 from apps.users import consts as user_consts, models as users_models
 
 
+def _increment_balances(model, amounts):
+    """
+    Apply per-row balance increments with a single UPDATE ... FROM (VALUES ...).
+    `amounts` maps primary keys to the (signed) amount to add. Wallet rows also
+    get their version bumped and the new balances published to the cache.
+    """
+    if not amounts:
+        return 0
+
+    rows = sorted(amounts.items())
+    values = ', '.join(['(%s, %s::numeric)'] * len(rows))
+    params = [value for row in rows for value in row]
+    table = connection.ops.quote_name(model._meta.db_table)
+
+    if model is models.Wallet:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS t SET balance = t.balance + v.amount, version = t.version + 1 '
+                f'FROM (VALUES {values}) AS v(id, amount) '
+                f'WHERE t.id = v.id '
+                f'RETURNING {WalletBalanceCache.RETURNING}',
+                params
+            )
+            updated = cursor.fetchall()
+        WalletBalanceCache.publish_on_commit(updated)
+        return len(updated)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} AS t SET balance = t.balance + v.amount '
+            f'FROM (VALUES {values}) AS v(id, amount) '
+            f'WHERE t.id = v.id',
+            params
+        )
+        return cursor.rowcount
+
+
+class WalletBalanceCache:
+    """
+    Wallet balances in the Django cache for the balance endpoint, keyed by user
+    id (settings.WALLET_BALANCE_CACHE; the cache must be shared by all workers).
+
+    Every UPDATE of a wallet row bumps Wallet.version and returns the new
+    (user_id, version, balance, shard_count), which is published once the
+    transaction commits. A cached entry is only ever replaced by a newer
+    version, so neither a late publish nor a fill from a read that raced a
+    write can bring an older balance back.
+
+    Only unsharded wallets in in-place mode are served from the cache: a
+    sharded wallet is published as a tombstone (balance None) that sends
+    readers to the database, and ledger mode bypasses the cache entirely.
+    """
+
+    RETURNING = 't.user_id, t.version, t.balance, t.shard_count'
+
+    @staticmethod
+    def enabled():
+        return settings.WALLET_BALANCE_CACHE and not settings.TRANSACTION_LEDGER_MODE
+
+    @staticmethod
+    def get(user_id):
+        """The cached (version, balance) of the user's wallet, or None."""
+        if not WalletBalanceCache.enabled():
+            return None
+        entry = cache.get(consts.TransactionConsts.BALANCE_CACHE_KEY.format(user_id))
+        return entry if entry is not None and entry[1] is not None else None
+
+    @staticmethod
+    async def aget(user_id):
+        if not WalletBalanceCache.enabled():
+            return None
+        entry = await cache.aget(consts.TransactionConsts.BALANCE_CACHE_KEY.format(user_id))
+        return entry if entry is not None and entry[1] is not None else None
+
+    @staticmethod
+    def store(user_id, version, balance):
+        """
+        Cache `balance` as of `version` unless the entry is newer already. On
+        the apps.core.cache backends that is one atomic compare-and-set; on
+        other caches a write that finds another one in progress is skipped.
+        """
+        key = consts.TransactionConsts.BALANCE_CACHE_KEY.format(user_id)
+        timeout = settings.WALLET_BALANCE_CACHE_TIMEOUT
+        if hasattr(cache, 'set_if_newer'):
+            # Equal versions only ever differ by a tombstone being filled in
+            cache.set_if_newer(key, (version, balance), version * 2 + (balance is not None), timeout=timeout)
+            return
+
+        # The lock only covers a get and a set; past its timeout the holder is
+        # presumed dead and the key expires by itself
+        lock_key = consts.TransactionConsts.BALANCE_CACHE_LOCK_KEY.format(user_id)
+        if not cache.add(lock_key, 1, timeout=consts.TransactionConsts.BALANCE_CACHE_LOCK_TIMEOUT):
+            return
+        try:
+            current = cache.get(key)
+            if current is None or current[0] < version or (current[0] == version and current[1] is None):
+                cache.set(key, (version, balance), timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+
+    @staticmethod
+    def publish_on_commit(rows):
+        """Publish (user_id, version, balance, shard_count) rows after the commit."""
+        if not WalletBalanceCache.enabled() or not rows:
+            return
+        entries = [
+            (user_id, version, None if shard_count else balance)
+            for user_id, version, balance, shard_count in rows
+        ]
+
+        def publish():
+            for entry in entries:
+                WalletBalanceCache.store(*entry)
+
+        # A failed publish must not fail the committed movement; the entry
+        # then goes stale for at most WALLET_BALANCE_CACHE_TIMEOUT
+        transaction.on_commit(publish, robust=True)
+
+
+class BalanceService:
+    """
+    Every balance read and mutation goes through here.
+
+    In-place mode: unsharded wallets are debited on the wallet row itself;
+    sharded wallets spread debits over their WalletShard rows, with the wallet
+    row holding whatever has not been rebalanced into the shards yet (credits).
+
+    Ledger mode (settings.TRANSACTION_LEDGER_MODE): movements are inserted as
+    LedgerEntry rows and balance columns are left untouched.
+    """
+
+    @staticmethod
+    def get_wallet_balance(wallet):
+        if settings.TRANSACTION_LEDGER_MODE:
+            return LedgerService.get_balance(wallet_id=wallet.id)
+        return wallet.available_balance
+
+    @staticmethod
+    def tracked_version(wallet):
+        """
+        Wallet.version when it changes with every change of the balance, else
+        None: sharded debits only touch the shard rows and ledger mode only
+        inserts entries, neither bumps the wallet row.
+        """
+        if settings.TRANSACTION_LEDGER_MODE or wallet.shard_count:
+            return None
+        return wallet.version
+
+    @staticmethod
+    def get_user_wallet_balance(user):
+        """
+        (balance, version) of the user's wallet, from WalletBalanceCache when
+        it has it. `version` is None when it does not track the balance.
+        """
+        entry = WalletBalanceCache.get(user.id)
+        if entry is not None:
+            return entry[1], entry[0]
+
+        try:
+            wallet = models.Wallet.objects.get(user=user)
+        except models.Wallet.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+        version = BalanceService.tracked_version(wallet)
+        if version is not None and WalletBalanceCache.enabled():
+            WalletBalanceCache.store(user.id, version, wallet.balance)
+        return BalanceService.get_wallet_balance(wallet), version
+
+    @staticmethod
+    async def aget_user_wallet_balance(user):
+        entry = await WalletBalanceCache.aget(user.id)
+        if entry is not None:
+            return entry[1], entry[0]
+
+        try:
+            wallet = await models.Wallet.objects.aget(user=user)
+        except models.Wallet.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+        version = BalanceService.tracked_version(wallet)
+        if version is not None and WalletBalanceCache.enabled():
+            await sync_to_async(WalletBalanceCache.store)(user.id, version, wallet.balance)
+        return await BalanceService.aget_wallet_balance(wallet), version
+
+    @staticmethod
+    async def aget_wallet_balance(wallet):
+        if settings.TRANSACTION_LEDGER_MODE:
+            return await LedgerService.aget_balance(wallet_id=wallet.id)
+        if not wallet.shard_count:
+            return wallet.balance
+        shard_total = (await wallet.shards.aaggregate(total=Sum('balance')))['total']
+        return wallet.balance + (shard_total or 0)
+
+    @staticmethod
+    def get_phone_balance(phone):
+        if settings.TRANSACTION_LEDGER_MODE:
+            return LedgerService.get_balance(phone_id=phone.id)
+        return phone.balance
+
+    @staticmethod
+    def credit_wallets(amounts):
+        """`amounts` maps wallet ids to the amount to add."""
+        if settings.TRANSACTION_LEDGER_MODE:
+            LedgerService.record(wallet_amounts=amounts)
+            return
+        _increment_balances(models.Wallet, amounts)
+
+    @staticmethod
+    def credit_phones(amounts):
+        """`amounts` maps phone number ids to the amount to add."""
+        if settings.TRANSACTION_LEDGER_MODE:
+            LedgerService.record(phone_amounts=amounts)
+            return
+        if len(amounts) == 1:
+            [(phone_id, amount)] = amounts.items()
+            users_models.PhoneNumber.objects.filter(
+                id=phone_id
+            ).update(
+                balance=F('balance') + amount
+            )
+            return
+        _increment_balances(users_models.PhoneNumber, amounts)
+
+    @staticmethod
+    def debit_wallet(wallet, amount):
+        """
+        Returns the index of the WalletShard the amount was taken from, or 0
+        when it was not taken from a single shard.
+        """
+        if settings.TRANSACTION_LEDGER_MODE:
+            if LedgerService.lock_wallet(wallet.id) < amount:
+                raise exceptions.ValidationError(
+                    consts.TransactionErrorConsts.InsufficientBalance().get_status()
+                )
+            LedgerService.record(wallet_amounts={wallet.id: -amount})
+            return 0
+
+        if wallet.shard_count:
+            return BalanceService._debit_sharded_wallet(wallet, amount)
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {connection.ops.quote_name(models.Wallet._meta.db_table)} AS t '
+                    f'SET balance = t.balance - %s, version = t.version + 1 '
+                    f'WHERE t.id = %s '
+                    f'RETURNING {WalletBalanceCache.RETURNING}',
+                    [amount, wallet.id]
+                )
+                updated = cursor.fetchall()
+
+            if not updated:
+                raise exceptions.NotFound(
+                    consts.TransactionErrorConsts.WalletNotFound().get_status()
+                )
+            WalletBalanceCache.publish_on_commit(updated)
+            return 0
+        except IntegrityError as e:
+            # CHECK constraint violated: balance would be negative
+            if 'wallet_balance_non_negative' in str(e):
+                raise exceptions.ValidationError(
+                    consts.TransactionErrorConsts.InsufficientBalance().get_status()
+                )
+            raise exceptions.ValidationError("Something went wrong!")
+
+    @staticmethod
+    def lock_wallet_balance(wallet):
+        """
+        Lock every row holding the wallet's funds and return their total, so
+        the caller can decide what fits before debiting.
+        """
+        if settings.TRANSACTION_LEDGER_MODE:
+            return LedgerService.lock_wallet(wallet.id)
+
+        # NO KEY UPDATE leaves concurrent transaction inserts (FK key-share
+        # locks on the wallet row) unblocked, so they cannot deadlock with us
+        balance = models.Wallet.objects.select_for_update(no_key=True).values_list(
+            'balance', flat=True
+        ).get(id=wallet.id)
+        if wallet.shard_count:
+            balance += sum(
+                models.WalletShard.objects.select_for_update(no_key=True).filter(
+                    wallet_id=wallet.id
+                ).order_by('index').values_list('balance', flat=True)
+            )
+        return balance
+
+    @staticmethod
+    def lock_wallet_balances(wallets):
+        """
+        `lock_wallet_balance` for several wallets, taken in id order so that
+        concurrent callers cannot deadlock. Returns {wallet id: balance}.
+        """
+        wallets = sorted(wallets, key=lambda wallet: wallet.id)
+        if settings.TRANSACTION_LEDGER_MODE or any(wallet.shard_count for wallet in wallets):
+            return {wallet.id: BalanceService.lock_wallet_balance(wallet) for wallet in wallets}
+        return dict(
+            models.Wallet.objects.select_for_update(no_key=True).filter(
+                id__in=[wallet.id for wallet in wallets]
+            ).order_by('id').values_list('id', 'balance')
+        )
+
+    @staticmethod
+    def debit_wallets(wallets, amounts):
+        """
+        Debit wallets locked with `lock_wallet_balances` after checking that the
+        amounts fit. `amounts` maps wallet ids to the amount to take. Returns
+        {wallet id: shard index} as `debit_wallet` does, for sharded wallets.
+        """
+        if settings.TRANSACTION_LEDGER_MODE:
+            LedgerService.record(wallet_amounts={
+                wallet_id: -amount for wallet_id, amount in amounts.items()
+            })
+            return {}
+
+        shards = {}
+        unsharded = {}
+        for wallet in wallets:
+            if wallet.shard_count:
+                shards[wallet.id] = BalanceService._debit_sharded_wallet(wallet, amounts[wallet.id])
+            else:
+                unsharded[wallet.id] = -amounts[wallet.id]
+        _increment_balances(models.Wallet, unsharded)
+        return shards
+
+    @staticmethod
+    def _debit_sharded_wallet(wallet, amount):
+        # Pick a random shard that can cover the amount, skipping shards other
+        # sales hold right now. Never waiting here keeps a sale from holding one
+        # shard while queueing behind a drain that locks them all in order.
+        shard = models.WalletShard.objects.select_for_update(
+            no_key=True,
+            skip_locked=True
+        ).filter(
+            wallet_id=wallet.id,
+            balance__gte=amount
+        ).order_by('?').values_list('id', 'index').first()
+        if shard is not None:
+            models.WalletShard.objects.filter(
+                id=shard[0]
+            ).update(
+                balance=F('balance') - amount
+            )
+            return shard[1]
+
+        if models.Wallet.objects.filter(
+            id=wallet.id,
+            balance__gte=amount
+        ).update(
+            balance=F('balance') - amount
+        ):
+            return 0
+
+        # No single row covers the amount: drain several under lock
+        if BalanceService.lock_wallet_balance(wallet) < amount:
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InsufficientBalance().get_status()
+            )
+
+        remaining = amount
+        shards = models.WalletShard.objects.filter(wallet_id=wallet.id).order_by('index')
+        for shard in shards:
+            taken = min(shard.balance, remaining)
+            if taken:
+                models.WalletShard.objects.filter(id=shard.id).update(balance=F('balance') - taken)
+                remaining -= taken
+            if not remaining:
+                return 0
+        models.Wallet.objects.filter(id=wallet.id).update(balance=F('balance') - remaining)
+        return 0
+
+
+class LedgerService:
+    """
+    Append-only balances. A balance is the account's latest BalanceSnapshot
+    plus the sum of its entries after `last_entry_id`; `compact` rolls aged
+    entries into new snapshots so reads stay bounded.
+    """
+
+    @staticmethod
+    def record(wallet_amounts=None, phone_amounts=None):
+        entries = [
+            models.LedgerEntry(wallet_id=wallet_id, amount=amount)
+            for wallet_id, amount in sorted((wallet_amounts or {}).items())
+        ] + [
+            models.LedgerEntry(phone_id=phone_id, amount=amount)
+            for phone_id, amount in sorted((phone_amounts or {}).items())
+        ]
+        models.LedgerEntry.objects.bulk_create(entries)
+
+    @staticmethod
+    def get_balance(wallet_id=None, phone_id=None):
+        account = {'wallet_id': wallet_id} if wallet_id is not None else {'phone_id': phone_id}
+        snapshot = models.BalanceSnapshot.objects.filter(
+            **account
+        ).order_by('-last_entry_id').values('balance', 'last_entry_id').first()
+        snapshot = snapshot or {'balance': Decimal('0'), 'last_entry_id': 0}
+
+        pending = models.LedgerEntry.objects.filter(
+            **account,
+            id__gt=snapshot['last_entry_id']
+        ).aggregate(total=Sum('amount'))['total']
+        return snapshot['balance'] + (pending or 0)
+
+    @staticmethod
+    async def aget_balance(wallet_id=None, phone_id=None):
+        account = {'wallet_id': wallet_id} if wallet_id is not None else {'phone_id': phone_id}
+        snapshot = await models.BalanceSnapshot.objects.filter(
+            **account
+        ).order_by('-last_entry_id').values('balance', 'last_entry_id').afirst()
+        snapshot = snapshot or {'balance': Decimal('0'), 'last_entry_id': 0}
+
+        pending = (await models.LedgerEntry.objects.filter(
+            **account,
+            id__gt=snapshot['last_entry_id']
+        ).aaggregate(total=Sum('amount')))['total']
+        return snapshot['balance'] + (pending or 0)
+
+    @staticmethod
+    def lock_wallet(wallet_id):
+        """
+        Serialize debits of one wallet for the rest of the transaction and
+        return its balance. Credits never take this lock.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s, %s)',
+                [consts.TransactionConsts.LEDGER_LOCK_NAMESPACE, wallet_id & 0x7FFFFFFF]
+            )
+        return LedgerService.get_balance(wallet_id=wallet_id)
+
+    @staticmethod
+    def compact(lag=None):
+        """
+        Write a new snapshot for every account with entries since the previous
+        compaction, up to the newest entry older than `lag` seconds.
+        Returns the number of snapshots written.
+        """
+        if lag is None:
+            lag = settings.TRANSACTION_LEDGER_COMPACTION_LAG
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s, 0)',
+                    [consts.TransactionConsts.LEDGER_COMPACTION_LOCK_NAMESPACE]
+                )
+
+            high_water = models.LedgerEntry.objects.filter(
+                created_at__lt=timezone.now() - timedelta(seconds=lag)
+            ).order_by('-id').values_list('id', flat=True).first()
+            previous = models.BalanceSnapshot.objects.aggregate(
+                last=Max('last_entry_id')
+            )['last'] or 0
+            if high_water is None or high_water <= previous:
+                return 0
+
+            entries = connection.ops.quote_name(models.LedgerEntry._meta.db_table)
+            snapshots = connection.ops.quote_name(models.BalanceSnapshot._meta.db_table)
+            written = 0
+            with connection.cursor() as cursor:
+                for column in ('wallet_id', 'phone_id'):
+                    cursor.execute(
+                        f'INSERT INTO {snapshots} ({column}, balance, last_entry_id, created_at) '
+                        f'SELECT d.account_id, COALESCE(s.balance, 0) + d.amount, %s, %s '
+                        f'FROM ('
+                        f'  SELECT {column} AS account_id, SUM(amount) AS amount FROM {entries} '
+                        f'  WHERE {column} IS NOT NULL AND id > %s AND id <= %s '
+                        f'  GROUP BY {column}'
+                        f') d '
+                        f'LEFT JOIN LATERAL ('
+                        f'  SELECT balance FROM {snapshots} '
+                        f'  WHERE {column} = d.account_id '
+                        f'  ORDER BY last_entry_id DESC LIMIT 1'
+                        f') s ON true',
+                        [high_water, timezone.now(), previous, high_water]
+                    )
+                    written += cursor.rowcount
+
+        return written
+
+    @staticmethod
+    def bootstrap():
+        """
+        Seed snapshots from the current balance columns for accounts that have
+        none yet. Run once before switching an existing database to ledger mode.
+        """
+        last_entry_id = models.LedgerEntry.objects.aggregate(last=Max('id'))['last'] or 0
+        now = timezone.now()
+
+        with transaction.atomic():
+            wallets = models.Wallet.objects.exclude(
+                balance_snapshots__isnull=False
+            ).annotate(
+                shard_total=Sum('shards__balance')
+            ).values_list('id', 'balance', 'shard_total')
+            phones = users_models.PhoneNumber.objects.exclude(
+                balance_snapshots__isnull=False
+            ).values_list('id', 'balance')
+
+            created = models.BalanceSnapshot.objects.bulk_create(
+                [
+                    models.BalanceSnapshot(
+                        wallet_id=wallet_id,
+                        balance=balance + (shard_total or 0),
+                        last_entry_id=last_entry_id,
+                        created_at=now
+                    )
+                    for wallet_id, balance, shard_total in wallets.iterator()
+                ] + [
+                    models.BalanceSnapshot(
+                        phone_id=phone_id,
+                        balance=balance,
+                        last_entry_id=last_entry_id,
+                        created_at=now
+                    )
+                    for phone_id, balance in phones.iterator()
+                ],
+                batch_size=1000
+            )
+
+        return len(created)
+
+
+class WalletShardService:
+    @staticmethod
+    def configure_sharding(wallet, shard_count):
+        """
+        Split the wallet's funds over `shard_count` shards, or fold them back
+        into the wallet row when `shard_count` is 0.
+        """
+        with transaction.atomic():
+            wallet = models.Wallet.objects.select_for_update().get(id=wallet.id)
+            models.WalletShard.objects.bulk_create(
+                [
+                    models.WalletShard(wallet=wallet, index=index)
+                    for index in range(shard_count)
+                ],
+                ignore_conflicts=True
+            )
+            wallet.shard_count = shard_count
+            wallet.save(update_fields=['shard_count'])
+
+            wallet = WalletShardService.rebalance(wallet)
+            models.WalletShard.objects.filter(
+                wallet_id=wallet.id,
+                index__gte=shard_count
+            ).delete()
+
+        return wallet
+
+    @staticmethod
+    def rebalance(wallet):
+        """
+        Move all funds of the wallet, including credits accumulated on the
+        wallet row, evenly over its shards.
+        """
+        with transaction.atomic():
+            wallet = models.Wallet.objects.select_for_update().get(id=wallet.id)
+            shards = list(
+                models.WalletShard.objects.select_for_update().filter(
+                    wallet_id=wallet.id
+                ).order_by('index')
+            )
+            total = wallet.balance + sum(shard.balance for shard in shards)
+            active = [shard for shard in shards if shard.index < wallet.shard_count]
+
+            if not active:
+                wallet.balance = total
+                for shard in shards:
+                    shard.balance = 0
+            else:
+                share = (total / len(active)).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+                for shard in shards:
+                    shard.balance = share if shard.index < wallet.shard_count else 0
+                active[0].balance += total - share * len(active)
+                wallet.balance = 0
+
+            models.WalletShard.objects.bulk_update(shards, ['balance'])
+            wallet.version += 1
+            wallet.save(update_fields=['balance', 'version'])
+            WalletBalanceCache.publish_on_commit([
+                (wallet.user_id, wallet.version, wallet.balance, wallet.shard_count)
+            ])
+
+        return wallet
+
+
+class RollupService:
+    """
+    Daily sales and approval totals per wallet and per phone number, upserted
+    in the same database transaction as the movements they count, so reading
+    a date range costs one row per day (per wallet shard sold from).
+    """
+
+    WALLET_SALES = (models.WalletDailyRollup, ('wallet_id', 'shard'), 'sales_count', 'sales_amount')
+    WALLET_CREDITS = (models.WalletDailyRollup, ('wallet_id', 'shard'), 'credit_count', 'credit_amount')
+    PHONE_CHARGES = (models.PhoneDailyRollup, ('phone_id',), 'charge_count', 'charge_amount')
+
+    @staticmethod
+    def upsert_sql(target, source):
+        """
+        INSERT of the (key columns..., day, count, amount) rows produced by
+        the `source` SELECT or VALUES into `target`, adding to existing totals.
+        """
+        model, keys, count, amount = target
+        table = connection.ops.quote_name(model._meta.db_table)
+        key = ', '.join(keys)
+        return (
+            f'INSERT INTO {table} AS r ({key}, day, {count}, {amount}) {source} '
+            f'ON CONFLICT ({key}, day) DO UPDATE SET '
+            f'{count} = r.{count} + EXCLUDED.{count}, {amount} = r.{amount} + EXCLUDED.{amount}'
+        )
+
+    @staticmethod
+    def add(target, day, totals):
+        """
+        Add `totals` ({key: (count, amount)}, keys being tuples of the
+        target's key columns) to the rollups of `day`.
+        """
+        if not totals:
+            return
+        rows = sorted(totals.items())
+        row = ', '.join(['%s'] * len(target[1]))
+        values = ', '.join([f'({row}, %s::date, %s, %s::numeric)'] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RollupService.upsert_sql(target, f'VALUES {values}'),
+                [value for key, (count, amount) in rows for value in (*key, day, count, amount)]
+            )
+
+    @staticmethod
+    def record_sales(day, wallet_id, sales, shard=0):
+        """Count the (phone id, amount) sales of one wallet, debited from `shard`."""
+        phone_totals = {}
+        for phone_id, amount in sales:
+            count, total = phone_totals.get((phone_id,), (0, 0))
+            phone_totals[(phone_id,)] = (count + 1, total + amount)
+        RollupService.add(RollupService.WALLET_SALES, day, {
+            (wallet_id, shard): (len(sales), sum(amount for _, amount in sales))
+        })
+        RollupService.add(RollupService.PHONE_CHARGES, day, phone_totals)
+
+    @staticmethod
+    def get_daily_totals(user, account, start, end):
+        """Daily rollups of the user's wallet or phone number for days in [start, end]."""
+        if account == consts.AccountType.PHONE:
+            return models.PhoneDailyRollup.objects.filter(
+                phone__user=user, day__gte=start, day__lte=end
+            ).order_by('day')
+
+        # Add up the shard rows of each day
+        days = {}
+        for rollup in models.WalletDailyRollup.objects.filter(
+            wallet__user=user, day__gte=start, day__lte=end
+        ).order_by('day', 'shard'):
+            total = days.get(rollup.day)
+            if total is None:
+                days[rollup.day] = rollup
+                continue
+            total.sales_count += rollup.sales_count
+            total.sales_amount += rollup.sales_amount
+            total.credit_count += rollup.credit_count
+            total.credit_amount += rollup.credit_amount
+        return list(days.values())
+
+    @staticmethod
+    def rebuild(since):
+        """
+        Recompute the rollups of every day from `since` on from the live
+        transactions (e.g. to backfill). Writers wait on the table locks while
+        this runs, so no movement is counted twice or lost.
+        """
+        wallet_table = connection.ops.quote_name(models.WalletDailyRollup._meta.db_table)
+        phone_table = connection.ops.quote_name(models.PhoneDailyRollup._meta.db_table)
+        transaction_table = connection.ops.quote_name(models.Transaction._meta.db_table)
+        params = {
+            'since': since,
+            'since_at': timezone.make_aware(datetime.combine(since, datetime.min.time())),
+            'tz': timezone.get_current_timezone_name(),
+            'approved': models.TransactionStatus.APPROVED,
+            'wallet': models.SourceType.WALLET,
+            'phone': models.DestType.PHONE,
+            'user': models.SourceType.USER,
+        }
+        # Days follow the active time zone, like timezone.localdate()
+        created_day = '(created_at AT TIME ZONE %(tz)s)::date'
+        updated_day = '(updated_at AT TIME ZONE %(tz)s)::date'
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {wallet_table}, {phone_table} IN EXCLUSIVE MODE')
+            cursor.execute(f'DELETE FROM {wallet_table} WHERE day >= %(since)s', params)
+            cursor.execute(f'DELETE FROM {phone_table} WHERE day >= %(since)s', params)
+            cursor.execute(
+                RollupService.upsert_sql(
+                    RollupService.WALLET_SALES,
+                    f'SELECT from_wallet_id, 0, {created_day}, COUNT(*), SUM(amount) FROM {transaction_table} '
+                    f'WHERE status = %(approved)s AND from_type = %(wallet)s AND to_type = %(phone)s '
+                    f'AND created_at >= %(since_at)s GROUP BY 1, 3'
+                ),
+                params
+            )
+            cursor.execute(
+                RollupService.upsert_sql(
+                    RollupService.WALLET_CREDITS,
+                    f'SELECT to_wallet_id, 0, {updated_day}, COUNT(*), SUM(amount) FROM {transaction_table} '
+                    f'WHERE status = %(approved)s AND from_type = %(user)s '
+                    f'AND updated_at >= %(since_at)s GROUP BY 1, 3'
+                ),
+                params
+            )
+            cursor.execute(
+                RollupService.upsert_sql(
+                    RollupService.PHONE_CHARGES,
+                    f'SELECT to_phone_id, {created_day}, COUNT(*), SUM(amount) FROM {transaction_table} '
+                    f'WHERE status = %(approved)s AND from_type = %(wallet)s AND to_type = %(phone)s '
+                    f'AND created_at >= %(since_at)s GROUP BY 1, 2'
+                ),
+                params
+            )
+
+
 class CreditRequestService:
     @staticmethod
     def create_credit_request(user, amount):
@@ -36,55 +784,323 @@ class CreditRequestService:
 
         return trc
 
+    @staticmethod
+    async def acreate_credit_request(user, amount):
+        if amount <= 0:
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InvalidAmount().get_status()
+            )
+
+        try:
+            wallet = await models.Wallet.objects.aget(user=user)
+        except models.Wallet.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+
+        return await models.Transaction.objects.acreate(
+            amount=amount,
+            status=models.TransactionStatus.PENDING,
+            from_type=models.SourceType.USER,
+            from_user=user,
+            to_type=models.DestType.WALLET,
+            to_wallet=wallet
+        )
+
     @staticmethod
     def update_status_credit_request(transaction_id, admin_user, status):
-        with transaction.atomic():
-            # Try to update transaction status from PENDING to APPROVED atomically
-            # This ensures only one admin can approve this transaction
-            affected = models.Transaction.objects.filter(
-                id=transaction_id,
-                status=models.TransactionStatus.PENDING
-            ).update(
-                status=status,
-                updated_at=timezone.now(),
-                updated_by=admin_user
+        """
+        Move a PENDING credit request to `status` in a single statement: the
+        conditional UPDATE returns the updated row, approvals credit the wallet
+        (or record the ledger entry) in a chained CTE, and a second CTE tells a
+        missing transaction from an already processed one, all in one round trip.
+        """
+        fields = models.Transaction._meta.concrete_fields
+        quote_name = connection.ops.quote_name
+        transaction_table = quote_name(models.Transaction._meta.db_table)
+        returning = ', '.join(f't.{quote_name(field.column)}' for field in fields)
+        selected = ', '.join(f'updated.{quote_name(field.column)}' for field in fields)
+
+        if settings.TRANSACTION_LEDGER_MODE:
+            credit = (
+                f'INSERT INTO {quote_name(models.LedgerEntry._meta.db_table)} (wallet_id, amount, created_at)'
+                f'  SELECT updated.to_wallet_id, updated.amount, %(now)s FROM updated'
+                f'  WHERE updated.status = %(approved)s'
+                f'  RETURNING id'
             )
+            credited = 'NULL, NULL, NULL, NULL'
+        else:
+            credit = (
+                f'UPDATE {quote_name(models.Wallet._meta.db_table)} AS t'
+                f'  SET balance = t.balance + updated.amount, version = t.version + 1'
+                f'  FROM updated'
+                f'  WHERE updated.status = %(approved)s AND t.id = updated.to_wallet_id'
+                f'  RETURNING {WalletBalanceCache.RETURNING}'
+            )
+            credited = 'credited.user_id, credited.version, credited.balance, credited.shard_count'
 
-            if affected == 0:
-                # Transaction either doesn't exist or is already processed
-                try:
-                    trc = models.Transaction.objects.get(id=transaction_id)
-                    # Transaction exists but not pending
-                    raise exceptions.ValidationError(
-                        consts.TransactionErrorConsts.AlreadyProcessed().get_status()
-                    )
-                except models.Transaction.DoesNotExist:
-                    raise exceptions.NotFound(
-                        consts.TransactionErrorConsts.TransactionNotFound().get_status()
-                    )
+        rollup = RollupService.upsert_sql(
+            RollupService.WALLET_CREDITS,
+            'SELECT updated.to_wallet_id, 0, %(day)s::date, 1, updated.amount FROM updated '
+            'WHERE updated.status = %(approved)s'
+        )
+        now = timezone.now()
 
-            # Get the updated transaction
-            trc = models.Transaction.objects.get(id=transaction_id)
+        # The status guard ensures only one admin can process this transaction:
+        # a concurrent one re-checks it after our commit and matches no row
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH target AS ('
+                f'  SELECT id FROM {transaction_table} WHERE id = %(id)s'
+                f'), updated AS ('
+                f'  UPDATE {transaction_table} AS t'
+                f'  SET status = %(status)s, updated_at = %(now)s, updated_by_id = %(admin_id)s'
+                f'  WHERE t.id = %(id)s AND t.status = %(pending)s'
+                f'  RETURNING {returning}'
+                f'), credited AS ({credit}'
+                f'), rollup AS ({rollup}) '
+                f'SELECT EXISTS (SELECT 1 FROM target), {credited}, {selected} '
+                f'FROM (SELECT 1) AS one LEFT JOIN updated ON true LEFT JOIN credited ON true',
+                {
+                    'id': transaction_id,
+                    'status': status,
+                    'now': now,
+                    'day': timezone.localdate(now),
+                    'admin_id': admin_user.id,
+                    'pending': models.TransactionStatus.PENDING,
+                    'approved': models.TransactionStatus.APPROVED,
+                }
+            )
+            found, *row = cursor.fetchone()
+        wallet_update, values = row[:4], row[4:]
 
-            if status == models.TransactionStatus.APPROVED:
-                # Atomic Update
-                models.Wallet.objects.filter(
-                    id=trc.to_wallet_id
-                ).update(
-                    balance=F('balance') + trc.amount
+        if values[0] is None:
+            if found:
+                # Transaction exists but not pending
+                raise exceptions.ValidationError(
+                    consts.TransactionErrorConsts.AlreadyProcessed().get_status()
                 )
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.TransactionNotFound().get_status()
+            )
+
+        if wallet_update[0] is not None:
+            WalletBalanceCache.publish_on_commit([wallet_update])
+
+        trc = models.Transaction.from_db(
+            connection.alias,
+            [field.attname for field in fields],
+            values
+        )
+        trc.updated_by = admin_user
 
         return trc
 
+    @staticmethod
+    def bulk_update_status_credit_requests(
+            admin_user,
+            status,
+            transaction_ids=None,
+            created_after=None,
+            created_before=None
+    ):
+        """
+        Approve or reject many pending credit requests, selected by ids and/or
+        a creation date range. Statuses flip in one UPDATE ... RETURNING and
+        approved amounts are applied with one increment per wallet.
+
+        At most MAX_BULK_STATUS_SIZE requests are processed per call: a longer
+        id list is rejected, and `has_more` tells a date range selection to be
+        run again. Requested ids that were not processed are reported by their
+        current state: `already_processed` (no longer pending), `skipped`
+        (still pending but outside the date range, or not a credit request)
+        and `not_found`.
+        """
+        if transaction_ids is not None and len(set(transaction_ids)) > consts.TransactionConsts.MAX_BULK_STATUS_SIZE:
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.BulkStatusTooLarge().get_status(
+                    consts.TransactionConsts.MAX_BULK_STATUS_SIZE
+                )
+            )
+
+        pending = models.Transaction.objects.filter(
+            status=models.TransactionStatus.PENDING,
+            from_type=models.SourceType.USER,
+            to_type=models.DestType.WALLET
+        )
+        if transaction_ids is not None:
+            pending = pending.filter(id__in=transaction_ids)
+        if created_after is not None:
+            pending = pending.filter(created_at__gte=created_after)
+        if created_before is not None:
+            pending = pending.filter(created_at__lt=created_before)
+        queryset = pending.order_by('id')[:consts.TransactionConsts.MAX_BULK_STATUS_SIZE]
+
+        subquery_sql, subquery_params = queryset.values('id').query.sql_with_params()
+        table = connection.ops.quote_name(models.Transaction._meta.db_table)
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Re-checking status in the outer WHERE lets concurrent reviewers skip
+            # rows another admin flipped while this statement waited on their locks
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET status = %s, updated_at = %s, updated_by_id = %s '
+                    f'WHERE status = %s AND id IN ({subquery_sql}) '
+                    f'RETURNING id, to_wallet_id, amount',
+                    [
+                        status,
+                        now,
+                        admin_user.id,
+                        models.TransactionStatus.PENDING,
+                        *subquery_params,
+                    ]
+                )
+                rows = cursor.fetchall()
+
+            if status == models.TransactionStatus.APPROVED:
+                wallet_amounts, wallet_totals = {}, {}
+                for _, wallet_id, amount in rows:
+                    wallet_amounts[wallet_id] = wallet_amounts.get(wallet_id, 0) + amount
+                    count, total = wallet_totals.get((wallet_id, 0), (0, 0))
+                    wallet_totals[(wallet_id, 0)] = (count + 1, total + amount)
+                BalanceService.credit_wallets(wallet_amounts)
+                RollupService.add(RollupService.WALLET_CREDITS, timezone.localdate(now), wallet_totals)
+
+        processed = sorted(row[0] for row in rows)
+        already_processed, skipped, not_found = [], [], []
+        leftover = set(transaction_ids or ()) - set(processed)
+        if leftover:
+            statuses = dict(
+                models.Transaction.objects.filter(id__in=leftover).values_list('id', 'status')
+            )
+            for transaction_id in sorted(leftover):
+                if transaction_id not in statuses:
+                    not_found.append(transaction_id)
+                elif statuses[transaction_id] == models.TransactionStatus.PENDING:
+                    skipped.append(transaction_id)
+                else:
+                    already_processed.append(transaction_id)
+
+        # Only a date range selection can match more than the limit
+        has_more = len(rows) == consts.TransactionConsts.MAX_BULK_STATUS_SIZE and pending.exists()
+
+        return {
+            'processed': processed,
+            'already_processed': already_processed,
+            'skipped': skipped,
+            'not_found': not_found,
+            'has_more': has_more,
+        }
+
+
+class CreditQueueService:
+    """
+    Review queue of pending credit requests. Claiming leases the oldest
+    unclaimed requests to an admin for CREDIT_QUEUE_LEASE_SECONDS; the rows are
+    picked with FOR NO KEY UPDATE SKIP LOCKED, so concurrent claims never wait
+    on each other nor hand out the same request. Both claiming and listing walk
+    the partial index on pending rows only.
+    """
+
+    @staticmethod
+    def claim(admin_user, limit=consts.TransactionConsts.QUEUE_BATCH_SIZE):
+        """
+        Lease up to `limit` pending credit requests to the admin, oldest first.
+        Requests the admin already holds count towards the batch and have their
+        lease renewed.
+        """
+        fields = models.Transaction._meta.concrete_fields
+        quote_name = connection.ops.quote_name
+        table = quote_name(models.Transaction._meta.db_table)
+        returning = ', '.join(f't.{quote_name(field.column)}' for field in fields)
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH picked AS ('
+                f'  SELECT id, created_at FROM {table}'
+                f'  WHERE status = %(pending)s AND from_type = %(user)s'
+                f'    AND (claimed_until IS NULL OR claimed_until < %(now)s OR claimed_by_id = %(admin_id)s)'
+                f'  ORDER BY created_at, id LIMIT %(limit)s'
+                f'  FOR NO KEY UPDATE SKIP LOCKED'
+                f') '
+                f'UPDATE {table} AS t SET claimed_by_id = %(admin_id)s, claimed_until = %(until)s '
+                f'FROM picked WHERE t.id = picked.id AND t.created_at = picked.created_at '
+                f'RETURNING {returning}',
+                {
+                    'pending': models.TransactionStatus.PENDING,
+                    'user': models.SourceType.USER,
+                    'now': now,
+                    'until': now + timedelta(seconds=settings.CREDIT_QUEUE_LEASE_SECONDS),
+                    'admin_id': admin_user.id,
+                    'limit': limit,
+                }
+            )
+            rows = cursor.fetchall()
+
+        trcs = [
+            models.Transaction.from_db(connection.alias, [field.attname for field in fields], row)
+            for row in rows
+        ]
+        trcs.sort(key=lambda trc: (trc.created_at, trc.id))
+        return trcs
+
+    @staticmethod
+    def release(admin_user, transaction_ids):
+        """Give the admin's leases on these requests back to the queue."""
+        return models.Transaction.objects.filter(
+            id__in=transaction_ids,
+            status=models.TransactionStatus.PENDING,
+            claimed_by=admin_user
+        ).update(claimed_by=None, claimed_until=None)
+
+    @staticmethod
+    def list_pending(limit, cursor=None):
+        """
+        One page of pending credit requests, oldest first, with their leases.
+        Returns the page and the cursor of the next one.
+        """
+        queryset = models.Transaction.objects.filter(
+            status=models.TransactionStatus.PENDING,
+            from_type=models.SourceType.USER
+        )
+        if cursor is not None:
+            created_at, trc_id = TransactionHistoryService.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=trc_id))
+            )
+        trcs = list(queryset.order_by('created_at', 'id')[:limit + 1])
+
+        page = trcs[:limit]
+        next_cursor = None
+        if len(trcs) > limit:
+            next_cursor = TransactionHistoryService.encode_cursor(page[-1])
+        return page, next_cursor
+
 
 class ChargeService:
     @staticmethod
     def sell_charge(user, phone_number, amount):
         if amount <= 0:
             raise exceptions.ValidationError(
-                consts.TransactionErrorConsts.InvalidAmount
+                consts.TransactionErrorConsts.InvalidAmount().get_status()
             )
 
+        # A sale inside the caller's transaction (idempotent requests) must
+        # commit with it, not on the coalescer's connection
+        if settings.TRANSACTION_SALE_COALESCING and not connection.in_atomic_block:
+            return SaleCoalescer.get().submit(user, phone_number, amount).result()
+
+        return ChargeService._sell_charge(user, phone_number, amount)
+
+    @staticmethod
+    def _sell_charge(user, phone_number, amount):
+        if settings.TRANSACTION_SINGLE_STATEMENT_SALES and not settings.TRANSACTION_LEDGER_MODE:
+            trc = ChargeService._sell_charge_single_statement(user, phone_number, amount)
+            if trc is not None:
+                return trc
+
         try:
             wallet = models.Wallet.objects.get(user=user)
         except models.Wallet.DoesNotExist:
@@ -99,33 +1115,56 @@ class ChargeService:
                 consts.TransactionErrorConsts.PhoneNumberNotFound().get_status()
             )
 
-        with transaction.atomic():
-            try:
-                affected = models.Wallet.objects.filter(
-                    id=wallet.id
-                ).update(
-                    balance=F('balance') - amount
-                )
+        return ChargeService._settle_sale(user, wallet, phone, amount)
 
-                if affected == 0:
-                    raise exceptions.NotFound(
-                        consts.TransactionErrorConsts.WalletNotFound().get_status()
-                    )
-            except IntegrityError as e:
-                # CHECK constraint violated: balance would be negative
-                if 'wallet_balance_non_negative' in str(e):
-                    raise exceptions.ValidationError(
-                        consts.TransactionErrorConsts.InsufficientBalance().get_status()
-                    )
-                raise exceptions.ValidationError("Something went wrong!")
+    @staticmethod
+    async def asell_charge(user, phone_number, amount):
+        """
+        `sell_charge` for async views. The lookups use the async ORM; the
+        settlement itself needs a database transaction, which Django only runs
+        synchronously, so it goes through `sync_to_async`.
+        """
+        if amount <= 0:
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InvalidAmount().get_status()
+            )
 
-            # Atomic Update
-            users_models.PhoneNumber.objects.filter(
-                id=phone.id
-            ).update(
-                balance=F('balance') + amount
+        if settings.TRANSACTION_SALE_COALESCING and not await sync_to_async(ChargeService._in_transaction)():
+            return await asyncio.wrap_future(SaleCoalescer.get().submit(user, phone_number, amount))
+
+        if settings.TRANSACTION_SINGLE_STATEMENT_SALES and not settings.TRANSACTION_LEDGER_MODE:
+            trc = await sync_to_async(ChargeService._sell_charge_single_statement)(user, phone_number, amount)
+            if trc is not None:
+                return trc
+
+        try:
+            wallet = await models.Wallet.objects.aget(user=user)
+        except models.Wallet.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
             )
 
+        try:
+            phone = await users_models.PhoneNumber.objects.aget(phone_number=phone_number)
+        except users_models.PhoneNumber.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.PhoneNumberNotFound().get_status()
+            )
+
+        return await sync_to_async(ChargeService._settle_sale)(user, wallet, phone, amount)
+
+    @staticmethod
+    def _in_transaction():
+        return connection.in_atomic_block
+
+    @staticmethod
+    def _settle_sale(user, wallet, phone, amount):
+        with transaction.atomic():
+            shard = BalanceService.debit_wallet(wallet, amount)
+
+            # Atomic Update
+            BalanceService.credit_phones({phone.id: amount})
+
             # Create transaction log (WALLET -> PHONE)
             trc = models.Transaction.objects.create(
                 amount=amount,
@@ -137,5 +1176,1256 @@ class ChargeService:
                 updated_at=timezone.now(),
                 updated_by=user
             )
+            RollupService.record_sales(timezone.localdate(trc.created_at), wallet.id, [(phone.id, amount)], shard)
 
         return trc
+
+    @staticmethod
+    def _sell_charge_single_statement(user, phone_number, amount):
+        """
+        Run the whole sale in one statement of data-modifying CTEs: resolve the
+        phone, debit the wallet behind a balance guard, credit the phone, insert
+        the transaction log and count it in the daily rollups. Returns None for sharded wallets, which
+        need the multi-statement path.
+        """
+        quote_name = connection.ops.quote_name
+        wallet_table = quote_name(models.Wallet._meta.db_table)
+        phone_table = quote_name(users_models.PhoneNumber._meta.db_table)
+        transaction_table = quote_name(models.Transaction._meta.db_table)
+        wallet_rollup = RollupService.upsert_sql(
+            RollupService.WALLET_SALES,
+            'SELECT debit.id, 0, %(day)s::date, 1, %(amount)s FROM debit, credit'
+        )
+        phone_rollup = RollupService.upsert_sql(
+            RollupService.PHONE_CHARGES,
+            'SELECT credit.id, %(day)s::date, 1, %(amount)s FROM debit, credit'
+        )
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH wallet AS ('
+                f'  SELECT id, shard_count FROM {wallet_table} WHERE user_id = %(user_id)s'
+                f'), phone AS ('
+                f'  SELECT id FROM {phone_table} WHERE phone_number = %(phone_number)s'
+                f'), debit AS ('
+                f'  UPDATE {wallet_table} AS w SET balance = w.balance - %(amount)s, version = w.version + 1'
+                f'  FROM wallet, phone'
+                f'  WHERE w.id = wallet.id AND w.shard_count = 0 AND w.balance >= %(amount)s'
+                f'  RETURNING w.id, w.user_id, w.balance, w.shard_count, w.version'
+                f'), credit AS ('
+                f'  UPDATE {phone_table} AS p SET balance = p.balance + %(amount)s'
+                f'  FROM debit, phone'
+                f'  WHERE p.id = phone.id'
+                f'  RETURNING p.id, p.phone_number, p.user_id, p.balance'
+                f'), trc AS ('
+                f'  INSERT INTO {transaction_table} ('
+                f'    amount, status, created_at, updated_at, updated_by_id,'
+                f'    from_type, from_wallet_id, to_type, to_phone_id'
+                f'  )'
+                f'  SELECT %(amount)s, %(status)s, %(now)s, %(now)s, %(user_id)s,'
+                f'    %(from_type)s, debit.id, %(to_type)s, credit.id'
+                f'  FROM debit, credit'
+                f'  RETURNING id'
+                f'), wallet_rollup AS ({wallet_rollup}'
+                f'), phone_rollup AS ({phone_rollup}'
+                f')'
+                f'SELECT wallet.id, wallet.shard_count, phone.id, trc.id,'
+                f'  debit.id, debit.user_id, debit.balance, debit.shard_count, debit.version,'
+                f'  credit.id, credit.phone_number, credit.user_id, credit.balance '
+                f'FROM (SELECT 1) AS one'
+                f'  LEFT JOIN wallet ON true'
+                f'  LEFT JOIN phone ON true'
+                f'  LEFT JOIN debit ON true'
+                f'  LEFT JOIN credit ON true'
+                f'  LEFT JOIN trc ON true',
+                {
+                    'user_id': user.id,
+                    'phone_number': users_models.PhoneNumber._meta.get_field(
+                        'phone_number'
+                    ).get_prep_value(phone_number),
+                    'amount': amount,
+                    'status': models.TransactionStatus.APPROVED,
+                    'from_type': models.SourceType.WALLET,
+                    'to_type': models.DestType.PHONE,
+                    'now': now,
+                    'day': timezone.localdate(now),
+                }
+            )
+            row = cursor.fetchone()
+
+        wallet_id, shard_count, phone_id, trc_id = row[:4]
+        if wallet_id is None:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+        if phone_id is None:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.PhoneNumberNotFound().get_status()
+            )
+        if shard_count:
+            return None
+        if trc_id is None:
+            # The guard is re-checked on the locked row, which a concurrent
+            # configure_sharding may have sharded since `wallet` read it
+            if models.Wallet.objects.filter(id=wallet_id, shard_count__gt=0).exists():
+                return None
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InsufficientBalance().get_status()
+            )
+
+        wallet = models.Wallet.from_db(
+            connection.alias, ['id', 'user_id', 'balance', 'shard_count', 'version'], row[4:9]
+        )
+        WalletBalanceCache.publish_on_commit([
+            (wallet.user_id, wallet.version, wallet.balance, wallet.shard_count)
+        ])
+
+        return models.Transaction(
+            id=trc_id,
+            amount=amount,
+            status=models.TransactionStatus.APPROVED,
+            created_at=now,
+            updated_at=now,
+            updated_by=user,
+            from_type=models.SourceType.WALLET,
+            from_wallet=wallet,
+            to_type=models.DestType.PHONE,
+            to_phone=users_models.PhoneNumber.from_db(
+                connection.alias, ['id', 'phone_number', 'user_id', 'balance'], row[9:13]
+            ),
+        )
+
+    @staticmethod
+    def sell_charges_bulk(user, items, mode=consts.BatchMode.ALL_OR_NOTHING):
+        """
+        Settle many (phone_number, amount) sales from the user's wallet at once.
+
+        The wallet is debited once for the total, phone balances are credited
+        with a single UPDATE and the transaction logs are bulk inserted.
+        Returns one result per item: {'index', 'transaction', 'error'}.
+
+        ALL_OR_NOTHING: any failing item rejects the whole batch.
+        BEST_EFFORT: failing items are reported and the rest are settled in order
+        while the wallet balance allows.
+        """
+        try:
+            wallet = models.Wallet.objects.get(user=user)
+        except models.Wallet.DoesNotExist:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+
+        phones = {
+            str(phone.phone_number): phone
+            for phone in users_models.PhoneNumber.objects.filter(
+                phone_number__in=[str(phone_number) for phone_number, _ in items]
+            )
+        }
+
+        results = []
+        for index, (phone_number, amount) in enumerate(items):
+            result = {'index': index, 'transaction': None, 'error': None}
+            if amount <= 0:
+                result['error'] = consts.TransactionErrorConsts.InvalidAmount().get_status()
+            elif str(phone_number) not in phones:
+                result['error'] = consts.TransactionErrorConsts.PhoneNumberNotFound().get_status()
+            results.append(result)
+
+        best_effort = mode == consts.BatchMode.BEST_EFFORT
+        if not best_effort:
+            ChargeService._raise_for_failed_items(results)
+
+        with transaction.atomic():
+            accepted = [result for result in results if result['error'] is None]
+
+            if best_effort:
+                # Lock the wallet so the accepted subset is decided against a stable balance
+                remaining = BalanceService.lock_wallet_balance(wallet)
+                fitting = []
+                for result in accepted:
+                    amount = items[result['index']][1]
+                    if amount > remaining:
+                        result['error'] = consts.TransactionErrorConsts.InsufficientBalance().get_status()
+                        continue
+                    remaining -= amount
+                    fitting.append(result)
+                accepted = fitting
+
+            if not accepted:
+                return results
+
+            shard = BalanceService.debit_wallet(
+                wallet,
+                sum(items[result['index']][1] for result in accepted)
+            )
+
+            phone_amounts = {}
+            for result in accepted:
+                phone_number, amount = items[result['index']]
+                phone = phones[str(phone_number)]
+                phone_amounts[phone.id] = phone_amounts.get(phone.id, 0) + amount
+            BalanceService.credit_phones(phone_amounts)
+
+            now = timezone.now()
+            trcs = models.Transaction.objects.bulk_create([
+                models.Transaction(
+                    amount=items[result['index']][1],
+                    status=models.TransactionStatus.APPROVED,
+                    from_type=models.SourceType.WALLET,
+                    from_wallet=wallet,
+                    to_type=models.DestType.PHONE,
+                    to_phone=phones[str(items[result['index']][0])],
+                    updated_at=now,
+                    updated_by=user
+                )
+                for result in accepted
+            ])
+            for result, trc in zip(accepted, trcs):
+                result['transaction'] = trc
+            RollupService.record_sales(timezone.localdate(now), wallet.id, [
+                (trc.to_phone_id, trc.amount) for trc in trcs
+            ], shard)
+
+        return results
+
+    @staticmethod
+    def _settle_sales_batch(sales):
+        """
+        Settle independent (user, phone_number, amount) sales, possibly of
+        different sellers, in one database transaction: each wallet is debited
+        once for the sales that fit its balance, phones are credited with one
+        UPDATE and the transaction logs are bulk inserted.
+
+        Returns one result per sale, either its Transaction or the APIException
+        it failed with; a sale that would overdraw fails alone.
+        """
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in models.Wallet.objects.filter(
+                user_id__in={user.id for user, _, _ in sales}
+            )
+        }
+        phones = {
+            str(phone.phone_number): phone
+            for phone in users_models.PhoneNumber.objects.filter(
+                phone_number__in={str(phone_number) for _, phone_number, _ in sales}
+            )
+        }
+
+        results = [None] * len(sales)
+        candidates = []
+        for index, (user, phone_number, amount) in enumerate(sales):
+            if user.id not in wallets:
+                results[index] = exceptions.NotFound(
+                    consts.TransactionErrorConsts.WalletNotFound().get_status()
+                )
+            elif str(phone_number) not in phones:
+                results[index] = exceptions.NotFound(
+                    consts.TransactionErrorConsts.PhoneNumberNotFound().get_status()
+                )
+            else:
+                candidates.append(index)
+        if not candidates:
+            return results
+
+        with transaction.atomic():
+            sellers = {wallets[sales[index][0].id] for index in candidates}
+            remaining = BalanceService.lock_wallet_balances(sellers)
+
+            accepted = []
+            wallet_amounts = {}
+            for index in candidates:
+                user, _, amount = sales[index]
+                wallet_id = wallets[user.id].id
+                if amount > remaining[wallet_id]:
+                    results[index] = exceptions.ValidationError(
+                        consts.TransactionErrorConsts.InsufficientBalance().get_status()
+                    )
+                    continue
+                remaining[wallet_id] -= amount
+                wallet_amounts[wallet_id] = wallet_amounts.get(wallet_id, 0) + amount
+                accepted.append(index)
+            if not accepted:
+                return results
+
+            shards = BalanceService.debit_wallets(
+                [wallet for wallet in sellers if wallet.id in wallet_amounts],
+                wallet_amounts
+            )
+
+            phone_amounts = {}
+            wallet_totals = {}
+            phone_totals = {}
+            for index in accepted:
+                user, phone_number, amount = sales[index]
+                wallet_key = (wallets[user.id].id, shards.get(wallets[user.id].id, 0))
+                phone_id = phones[str(phone_number)].id
+                phone_amounts[phone_id] = phone_amounts.get(phone_id, 0) + amount
+                count, total = wallet_totals.get(wallet_key, (0, 0))
+                wallet_totals[wallet_key] = (count + 1, total + amount)
+                count, total = phone_totals.get((phone_id,), (0, 0))
+                phone_totals[(phone_id,)] = (count + 1, total + amount)
+            BalanceService.credit_phones(phone_amounts)
+
+            now = timezone.now()
+            trcs = models.Transaction.objects.bulk_create([
+                models.Transaction(
+                    amount=sales[index][2],
+                    status=models.TransactionStatus.APPROVED,
+                    from_type=models.SourceType.WALLET,
+                    from_wallet=wallets[sales[index][0].id],
+                    to_type=models.DestType.PHONE,
+                    to_phone=phones[str(sales[index][1])],
+                    updated_at=now,
+                    updated_by=sales[index][0]
+                )
+                for index in accepted
+            ])
+            for index, trc in zip(accepted, trcs):
+                results[index] = trc
+
+            day = timezone.localdate(now)
+            RollupService.add(RollupService.WALLET_SALES, day, wallet_totals)
+            RollupService.add(RollupService.PHONE_CHARGES, day, phone_totals)
+
+        return results
+
+    @staticmethod
+    def _raise_for_failed_items(results):
+        errors = [
+            {'index': result['index'], **result['error']}
+            for result in results if result['error'] is not None
+        ]
+        if errors:
+            raise exceptions.ValidationError({
+                **consts.TransactionErrorConsts.BatchFailed().get_status(),
+                'errors': errors,
+            })
+
+
+class SaleCoalescer:
+    """
+    Group commit for single sales (settings.TRANSACTION_SALE_COALESCING).
+
+    Request threads queue their sale and wait on a Future. A background thread
+    takes every sale that arrives within TRANSACTION_SALE_COALESCE_WINDOW_MS of
+    the first one (at most TRANSACTION_SALE_COALESCE_MAX_BATCH) and settles
+    them with `ChargeService._settle_sales_batch`, so a burst of sales shares
+    one commit and one WAL flush. If the batch as a whole fails, nothing of it
+    was committed and each sale is retried on its own.
+
+    Coalesced sales commit on the coalescer's connection, outside any
+    transaction the caller may have open. Only sales of one process are
+    merged, so this pays off with workers that serve requests concurrently
+    (the asgi profile, or gthread workers); under single-threaded sync workers
+    gunicorn.conf.py turns it off.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, window, max_batch):
+        self.window = window
+        self.max_batch = max_batch
+        self.pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name='sale-coalescer', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls):
+        """The coalescer of this process, started on first use (and again after a fork)."""
+        with cls._instance_lock:
+            instance = cls._instance
+            if instance is None or instance.pid != os.getpid() or not instance.thread.is_alive():
+                instance = cls._instance = cls(
+                    window=settings.TRANSACTION_SALE_COALESCE_WINDOW_MS / 1000,
+                    max_batch=settings.TRANSACTION_SALE_COALESCE_MAX_BATCH,
+                )
+            return instance
+
+    @classmethod
+    def stop(cls):
+        """Settle the queued sales, then stop the thread and close its connection."""
+        with cls._instance_lock:
+            instance, cls._instance = cls._instance, None
+        if instance is not None and instance.pid == os.getpid():
+            instance.queue.put(None)
+            instance.thread.join()
+
+    def submit(self, user, phone_number, amount):
+        """Queue a sale; the Future resolves to its Transaction or raises its error."""
+        future = Future()
+        self.queue.put((user, phone_number, amount, future))
+        return future
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                first = self.queue.get()
+                if first is None:
+                    break
+                batch = [first]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._settle(batch)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _settle(batch):
+        close_old_connections()
+        try:
+            results = ChargeService._settle_sales_batch([
+                (user, phone_number, amount) for user, phone_number, amount, _ in batch
+            ])
+        except Exception:
+            for user, phone_number, amount, future in batch:
+                try:
+                    future.set_result(ChargeService._sell_charge(user, phone_number, amount))
+                except Exception as error:
+                    future.set_exception(error)
+            return
+
+        for (_, _, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class TransactionPartitionService:
+    """
+    Maintenance of the monthly range partitions of the transaction table
+    (see migration 0006). Rows outside every partition land in the default
+    partition; creating the partition of their month moves them over.
+    """
+
+    TABLE = models.Transaction._meta.db_table
+    DEFAULT_PARTITION = f'{TABLE}_default'
+    BOUND_PATTERN = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+    @staticmethod
+    def _parse_bound(value):
+        if value in ('MINVALUE', 'MAXVALUE'):
+            return None
+        return datetime.fromisoformat(value.strip("'"))
+
+    @staticmethod
+    def _add_months(moment, months):
+        month = moment.month - 1 + months
+        return moment.replace(year=moment.year + month // 12, month=month % 12 + 1)
+
+    @staticmethod
+    def current_month():
+        """
+        Start of the current month as migration 0006 computed its boundary:
+        date_trunc in the database session's time zone.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT date_trunc('month', now())")
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def list_partitions():
+        """Return the range partitions as (name, start, end), None for an open bound."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+                'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+                [TransactionPartitionService.TABLE]
+            )
+            rows = cursor.fetchall()
+
+        partitions = []
+        for name, bound in rows:
+            match = TransactionPartitionService.BOUND_PATTERN.search(bound)
+            if match is None:
+                continue  # DEFAULT
+            partitions.append((
+                name,
+                TransactionPartitionService._parse_bound(match.group(1)),
+                TransactionPartitionService._parse_bound(match.group(2)),
+            ))
+        return partitions
+
+    @staticmethod
+    def create_partitions(months_ahead=None):
+        """
+        Create the monthly partitions from the current month up to `months_ahead`
+        months later, skipping months an existing partition already covers.
+        """
+        if months_ahead is None:
+            months_ahead = settings.TRANSACTION_PARTITION_MONTHS_AHEAD
+
+        quote_name = connection.ops.quote_name
+        table = quote_name(TransactionPartitionService.TABLE)
+        default = quote_name(TransactionPartitionService.DEFAULT_PARTITION)
+        existing = TransactionPartitionService.list_partitions()
+        month_start = TransactionPartitionService.current_month()
+
+        created = []
+        for offset in range(months_ahead + 1):
+            start = TransactionPartitionService._add_months(month_start, offset)
+            end = TransactionPartitionService._add_months(month_start, offset + 1)
+            if any(
+                (lower is None or lower < end) and (upper is None or upper > start)
+                for _, lower, upper in existing
+            ):
+                continue
+
+            name = f'{TransactionPartitionService.TABLE}_p{start:%Y%m}'
+            partition = quote_name(name)
+            # Built detached and attached afterwards so rows of this month that
+            # already landed in the default partition can be moved in first
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                )
+                cursor.execute(
+                    f'WITH moved AS ('
+                    f'  DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *'
+                    f') INSERT INTO {partition} SELECT * FROM moved',
+                    [start, end]
+                )
+                cursor.execute(
+                    f'ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)',
+                    [start, end]
+                )
+            created.append(name)
+        return created
+
+    @staticmethod
+    def detach_partitions(before):
+        """
+        Detach the partitions of months ending by `before` once they are
+        empty: settled rows leave through TransactionArchiveService, which
+        carries their amounts into ArchivedBalance, and pending ones must be
+        processed first. The detached tables are kept, for dropping.
+
+        Returns the detached partitions and the kept ones as
+        (name, whether it still has pending rows; else settled rows are not
+        yet archived).
+        """
+        quote_name = connection.ops.quote_name
+        table = quote_name(TransactionPartitionService.TABLE)
+        params = [models.TransactionStatus.PENDING]
+        detached, kept = [], []
+        for name, _, end in TransactionPartitionService.list_partitions():
+            if end is None or end > before:
+                continue
+            partition = quote_name(name)
+            # Probed on the partition alone, so keeping one (the usual case)
+            # never locks the parent table or scans the partition
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT EXISTS (SELECT 1 FROM {partition}), '
+                    f'EXISTS (SELECT 1 FROM {partition} WHERE status = %s)',
+                    params
+                )
+                occupied, pending = cursor.fetchone()
+            if occupied:
+                kept.append((name, pending))
+                continue
+
+            # Looked at again under the detach's exclusive lock, in case a row
+            # arrived since; the lock is held for that probe only
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {partition}')
+                cursor.execute(
+                    f'SELECT EXISTS (SELECT 1 FROM {partition}), '
+                    f'EXISTS (SELECT 1 FROM {partition} WHERE status = %s)',
+                    params
+                )
+                occupied, pending = cursor.fetchone()
+                if occupied:
+                    transaction.set_rollback(True)
+                    kept.append((name, pending))
+                else:
+                    detached.append(name)
+        return detached, kept
+
+
+class TransactionHistoryService:
+    """
+    Keyset pagination over a seller's transactions, newest first.
+
+    Sales (from_wallet) and credit requests (to_wallet) are read by two
+    queries, each walking its (wallet, created_at, id) index from the cursor
+    position for at most one page, and merged here; so any page costs the same
+    as the first one, no matter how deep it is.
+    """
+
+    @staticmethod
+    def encode_cursor(trc):
+        raw = f'{trc.created_at.isoformat()}|{trc.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, trc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(trc_id)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InvalidCursor().get_status()
+            )
+
+    @staticmethod
+    def get_history(user, limit, cursor=None, status=None, history_type=None,
+                    created_after=None, created_before=None):
+        """
+        Return one page of the user's wallet transactions and the cursor of the
+        next page (None on the last page).
+        """
+        wallet_id = models.Wallet.objects.filter(user=user).values_list('id', flat=True).first()
+        if wallet_id is None:
+            raise exceptions.NotFound(
+                consts.TransactionErrorConsts.WalletNotFound().get_status()
+            )
+
+        conditions = Q()
+        if status is not None:
+            conditions &= Q(status=status)
+        if created_after is not None:
+            conditions &= Q(created_at__gte=created_after)
+        if created_before is not None:
+            conditions &= Q(created_at__lt=created_before)
+        if cursor is not None:
+            created_at, trc_id = TransactionHistoryService.decode_cursor(cursor)
+            # (created_at, id) < cursor, spelled so the index range is bounded on created_at
+            conditions &= Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=trc_id))
+
+        sides = []
+        if history_type in (None, consts.HistoryType.SALE):
+            sides.append(Q(from_wallet_id=wallet_id))
+        if history_type in (None, consts.HistoryType.CREDIT):
+            sides.append(Q(to_wallet_id=wallet_id))
+
+        transactions = []
+        for side in sides:
+            transactions.extend(
+                models.Transaction.objects.filter(side, conditions).select_related(
+                    'to_phone'
+                ).order_by('-created_at', '-id')[:limit + 1]
+            )
+        transactions.sort(key=lambda trc: (trc.created_at, trc.id), reverse=True)
+
+        page = transactions[:limit]
+        next_cursor = None
+        if len(transactions) > limit:
+            next_cursor = TransactionHistoryService.encode_cursor(page[-1])
+        return page, next_cursor
+
+
+class TransactionExportService:
+    """
+    Stream transactions for reconciliation. Rows are read through a PostgreSQL
+    server-side cursor one chunk at a time and encoded as they arrive, so memory
+    stays flat whatever the size of the range.
+    """
+
+    FIELDS = [field.attname for field in models.Transaction._meta.concrete_fields]
+
+    @staticmethod
+    def get_rows(created_after=None, created_before=None, status=None,
+                 chunk_size=consts.TransactionConsts.EXPORT_CHUNK_SIZE):
+        queryset = models.Transaction.objects.all()
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before is not None:
+            queryset = queryset.filter(created_at__lt=created_before)
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        return queryset.order_by('id').values_list(
+            *TransactionExportService.FIELDS
+        ).iterator(chunk_size=chunk_size)
+
+    @staticmethod
+    def encode(rows, export_format, chunk_size=consts.TransactionConsts.EXPORT_CHUNK_SIZE):
+        """Yield the rows encoded as NDJSON or CSV, `chunk_size` rows per bytes chunk."""
+        buffer = io.StringIO()
+        if export_format == consts.ExportFormat.CSV:
+            writer = csv.writer(buffer)
+            writer.writerow(TransactionExportService.FIELDS)
+            write = writer.writerow
+        else:
+            encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+            def write(row):
+                buffer.write(encoder.encode(dict(zip(TransactionExportService.FIELDS, row))))
+                buffer.write('\n')
+
+        pending = 0
+        for row in rows:
+            write(row)
+            pending += 1
+            if pending == chunk_size:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    @staticmethod
+    def gzip(chunks):
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    @staticmethod
+    def export(export_format, compress=False, chunk_size=consts.TransactionConsts.EXPORT_CHUNK_SIZE, **filters):
+        chunks = TransactionExportService.encode(
+            TransactionExportService.get_rows(chunk_size=chunk_size, **filters),
+            export_format,
+            chunk_size=chunk_size
+        )
+        if compress:
+            chunks = TransactionExportService.gzip(chunks)
+        return chunks
+
+
+class TransactionArchiveService:
+    """
+    Moves settled transactions older than a cutoff into gzipped NDJSON files
+    under TRANSACTION_ARCHIVE_DIR, one ArchiveBatch per file.
+
+    A file is fully written and verified (row count and amount sum read back
+    from disk) before any of its rows is deleted, and rows are deleted by the
+    ids read from the file, in bounded batches. Each deletion batch adds its
+    approved amounts to ArchivedBalance in the same database transaction. An
+    interrupted run leaves its batch PENDING (discarded) or WRITTEN (deletion
+    resumed) for the next run, so archiving can be re-run at any time.
+    """
+
+    SETTLED = [models.TransactionStatus.APPROVED, models.TransactionStatus.REJECTED]
+
+    @staticmethod
+    def _path(batch):
+        return os.path.join(settings.TRANSACTION_ARCHIVE_DIR, batch.file_name)
+
+    @staticmethod
+    def read_file(batch):
+        with gzip.open(TransactionArchiveService._path(batch), 'rt') as archive:
+            for line in archive:
+                yield json.loads(line)
+
+    @staticmethod
+    def archive(cutoff=None, chunk_size=consts.TransactionConsts.ARCHIVE_CHUNK_SIZE,
+                delete_batch_size=consts.TransactionConsts.ARCHIVE_DELETE_BATCH_SIZE):
+        """
+        Archive every transaction settled and created before `cutoff` (defaults
+        to TRANSACTION_ARCHIVE_RETENTION_DAYS ago). Returns the batches completed.
+        """
+        if cutoff is None:
+            cutoff = timezone.now() - timedelta(days=settings.TRANSACTION_ARCHIVE_RETENTION_DAYS)
+        os.makedirs(settings.TRANSACTION_ARCHIVE_DIR, exist_ok=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_try_advisory_lock(%s, 0)',
+                [consts.TransactionConsts.ARCHIVE_LOCK_NAMESPACE]
+            )
+            if not cursor.fetchone()[0]:
+                raise Conflict(consts.TransactionErrorConsts.ArchiveInProgress().get_status())
+
+        try:
+            for batch in models.ArchiveBatch.objects.filter(status=models.ArchiveBatchStatus.PENDING):
+                # Interrupted before its file was complete: nothing was deleted yet
+                for path in (TransactionArchiveService._path(batch), f'{TransactionArchiveService._path(batch)}.tmp'):
+                    if os.path.exists(path):
+                        os.remove(path)
+                batch.delete()
+
+            completed = []
+            for batch in models.ArchiveBatch.objects.filter(
+                status=models.ArchiveBatchStatus.WRITTEN
+            ).order_by('id'):
+                TransactionArchiveService._delete_rows(batch, delete_batch_size)
+                completed.append(batch)
+
+            while True:
+                batch = TransactionArchiveService._write_batch(cutoff, chunk_size)
+                if batch is None:
+                    return completed
+                TransactionArchiveService._delete_rows(batch, delete_batch_size)
+                completed.append(batch)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_unlock(%s, 0)',
+                    [consts.TransactionConsts.ARCHIVE_LOCK_NAMESPACE]
+                )
+
+    @staticmethod
+    def _write_batch(cutoff, chunk_size):
+        queryset = models.Transaction.objects.filter(
+            status__in=TransactionArchiveService.SETTLED,
+            created_at__lt=cutoff
+        )
+        if not queryset.exists():
+            return None
+
+        batch = models.ArchiveBatch.objects.create(file_name='', cutoff=cutoff)
+        batch.file_name = f'transactions-{batch.id:08d}.ndjson.gz'
+        batch.save(update_fields=['file_name'])
+
+        fields = TransactionExportService.FIELDS
+        created_at_index = fields.index('created_at')
+        amount_index = fields.index('amount')
+
+        def tracked(rows):
+            # Tally the rows as they stream to the file
+            for row in rows:
+                batch.row_count += 1
+                batch.amount_sum += row[amount_index]
+                created_at = row[created_at_index]
+                if batch.min_created_at is None or created_at < batch.min_created_at:
+                    batch.min_created_at = created_at
+                if batch.max_created_at is None or created_at > batch.max_created_at:
+                    batch.max_created_at = created_at
+                yield row
+
+        rows = queryset.order_by('id').values_list(*fields)[:chunk_size].iterator(
+            chunk_size=consts.TransactionConsts.EXPORT_CHUNK_SIZE
+        )
+        path = TransactionArchiveService._path(batch)
+        with open(f'{path}.tmp', 'wb') as archive:
+            for chunk in TransactionExportService.gzip(
+                TransactionExportService.encode(tracked(rows), consts.ExportFormat.NDJSON)
+            ):
+                archive.write(chunk)
+            archive.flush()
+            os.fsync(archive.fileno())
+        os.replace(f'{path}.tmp', path)
+
+        row_count, amount_sum = 0, Decimal('0')
+        for row in TransactionArchiveService.read_file(batch):
+            row_count += 1
+            amount_sum += Decimal(row['amount'])
+        if (row_count, amount_sum) != (batch.row_count, batch.amount_sum):
+            raise exceptions.APIException(
+                consts.TransactionErrorConsts.ArchiveVerificationFailed().get_status(batch.file_name)
+            )
+
+        batch.status = models.ArchiveBatchStatus.WRITTEN
+        batch.save()
+        return batch
+
+    @staticmethod
+    def _delete_rows(batch, delete_batch_size):
+        table = connection.ops.quote_name(models.Transaction._meta.db_table)
+
+        def delete(ids):
+            wallet_amounts, phone_amounts = {}, {}
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    # created_at bound keeps the delete on the partitions being archived
+                    cursor.execute(
+                        f'DELETE FROM {table} WHERE id = ANY(%s) AND created_at < %s '
+                        f'RETURNING amount, status, from_wallet_id, to_wallet_id, to_phone_id',
+                        [ids, batch.cutoff]
+                    )
+                    rows = cursor.fetchall()
+                for amount, status, from_wallet_id, to_wallet_id, to_phone_id in rows:
+                    if status != models.TransactionStatus.APPROVED:
+                        continue
+                    if from_wallet_id is not None:
+                        wallet_amounts[from_wallet_id] = wallet_amounts.get(from_wallet_id, 0) - amount
+                    if to_wallet_id is not None:
+                        wallet_amounts[to_wallet_id] = wallet_amounts.get(to_wallet_id, 0) + amount
+                    if to_phone_id is not None:
+                        phone_amounts[to_phone_id] = phone_amounts.get(to_phone_id, 0) + amount
+                TransactionArchiveService._add_archived_amounts('wallet_id', wallet_amounts)
+                TransactionArchiveService._add_archived_amounts('phone_id', phone_amounts)
+
+        ids = []
+        for row in TransactionArchiveService.read_file(batch):
+            ids.append(row['id'])
+            if len(ids) == delete_batch_size:
+                delete(ids)
+                ids = []
+        if ids:
+            delete(ids)
+
+        batch.status = models.ArchiveBatchStatus.DELETED
+        batch.save(update_fields=['status'])
+
+    @staticmethod
+    def _add_archived_amounts(column, amounts):
+        if not amounts:
+            return
+        rows = sorted(amounts.items())
+        values = ', '.join(['(%s, %s::numeric)'] * len(rows))
+        table = connection.ops.quote_name(models.ArchivedBalance._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} AS a ({column}, amount) VALUES {values} '
+                f'ON CONFLICT ({column}) DO UPDATE SET amount = a.amount + EXCLUDED.amount',
+                [value for row in rows for value in row]
+            )
+
+    @staticmethod
+    def read(wallet_id=None, created_after=None, created_before=None):
+        """
+        Yield archived transactions (as exported dicts) of a wallet, sent or
+        received, and/or within a creation date range, without restoring them.
+        Only the files whose date range overlaps the requested one are read.
+        """
+        batches = models.ArchiveBatch.objects.exclude(status=models.ArchiveBatchStatus.PENDING)
+        if created_after is not None:
+            batches = batches.filter(max_created_at__gte=created_after)
+        if created_before is not None:
+            batches = batches.filter(min_created_at__lt=created_before)
+
+        for batch in batches.order_by('id'):
+            for row in TransactionArchiveService.read_file(batch):
+                if wallet_id is not None and wallet_id not in (row['from_wallet_id'], row['to_wallet_id']):
+                    continue
+                if created_after is not None or created_before is not None:
+                    created_at = datetime.fromisoformat(row['created_at'])
+                    if created_after is not None and created_at < created_after:
+                        continue
+                    if created_before is not None and created_at >= created_before:
+                        continue
+                yield row
+
+
+class ReconciliationService:
+    """
+    Checks that every wallet and phone number balance equals the net of its
+    approved transactions (plus what archival carried into ArchivedBalance).
+
+    Accounts are split into id ranges, each checked by one aggregated query, and
+    the ranges are spread over a process pool. A full run checks every account;
+    an incremental one only the accounts of transactions approved since the
+    previous finished run. That window reaches TRANSACTION_RECONCILE_OVERLAP
+    seconds back before the previous run started, so a transaction whose id
+    and updated_at were taken before then but which committed after it (and
+    so was invisible to that run) is still checked.
+    """
+
+    @staticmethod
+    def _actual_balance(account):
+        quote_name = connection.ops.quote_name
+        if settings.TRANSACTION_LEDGER_MODE:
+            column = f'{account}_id'
+            snapshots = quote_name(models.BalanceSnapshot._meta.db_table)
+            entries = quote_name(models.LedgerEntry._meta.db_table)
+            return (
+                f'COALESCE((SELECT s.balance FROM {snapshots} s WHERE s.{column} = a.id '
+                f'  ORDER BY s.last_entry_id DESC LIMIT 1), 0) + '
+                f'COALESCE((SELECT SUM(e.amount) FROM {entries} e WHERE e.{column} = a.id AND e.id > '
+                f'  COALESCE((SELECT MAX(s.last_entry_id) FROM {snapshots} s WHERE s.{column} = a.id), 0)), 0)'
+            )
+        if account == consts.AccountType.WALLET:
+            shards = quote_name(models.WalletShard._meta.db_table)
+            return f'a.balance + COALESCE((SELECT SUM(s.balance) FROM {shards} s WHERE s.wallet_id = a.id), 0)'
+        return 'a.balance'
+
+    @staticmethod
+    def reconcile_range(account, first_id=None, last_id=None, ids=None):
+        """
+        Check the accounts with ids in [first_id, last_id], or in `ids`. Returns
+        the number of accounts checked and their discrepancies.
+        """
+        quote_name = connection.ops.quote_name
+        transactions = quote_name(models.Transaction._meta.db_table)
+        archived = quote_name(models.ArchivedBalance._meta.db_table)
+        if account == consts.AccountType.WALLET:
+            accounts = quote_name(models.Wallet._meta.db_table)
+            movements = [('to_wallet_id', ''), ('from_wallet_id', '-')]
+        else:
+            accounts = quote_name(users_models.PhoneNumber._meta.db_table)
+            movements = [('to_phone_id', '')]
+
+        def condition(column):
+            if ids is not None:
+                return f'{column} = ANY(%(ids)s)'
+            return f'{column} BETWEEN %(first_id)s AND %(last_id)s'
+
+        union = ' UNION ALL '.join(
+            f'SELECT {column} AS account_id, {sign}amount AS amount FROM {transactions} '
+            f'WHERE status = %(approved)s AND {condition(column)}'
+            for column, sign in movements
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH expected AS ('
+                f'  SELECT account_id, SUM(amount) AS amount FROM ({union}) m GROUP BY account_id'
+                f') '
+                f'SELECT a.id, {ReconciliationService._actual_balance(account)}, '
+                f'  COALESCE(ab.amount, 0) + COALESCE(e.amount, 0) '
+                f'FROM {accounts} a '
+                f'LEFT JOIN expected e ON e.account_id = a.id '
+                f'LEFT JOIN {archived} ab ON ab.{account}_id = a.id '
+                f'WHERE {condition("a.id")}',
+                {
+                    'approved': models.TransactionStatus.APPROVED,
+                    'first_id': first_id,
+                    'last_id': last_id,
+                    'ids': ids,
+                }
+            )
+            rows = cursor.fetchall()
+
+        discrepancies = [
+            {
+                'account': account,
+                'id': account_id,
+                'actual': actual,
+                'expected': expected,
+                'difference': actual - expected,
+            }
+            for account_id, actual, expected in rows
+            if actual != expected
+        ]
+        return len(rows), discrepancies
+
+    @staticmethod
+    def _full_tasks(range_size):
+        tasks = []
+        for account, model in (
+            (consts.AccountType.WALLET, models.Wallet),
+            (consts.AccountType.PHONE, users_models.PhoneNumber),
+        ):
+            bounds = model.objects.aggregate(first=Min('id'), last=Max('id'))
+            if bounds['first'] is None:
+                continue
+            for first_id in range(bounds['first'], bounds['last'] + 1, range_size):
+                tasks.append({'account': account, 'first_id': first_id, 'last_id': first_id + range_size - 1})
+        return tasks
+
+    @staticmethod
+    def _incremental_tasks(previous, range_size):
+        touched = {consts.AccountType.WALLET: set(), consts.AccountType.PHONE: set()}
+        rows = models.Transaction.objects.filter(
+            Q(id__gt=previous.high_water_id) |
+            Q(updated_at__gte=previous.started_at - timedelta(seconds=settings.TRANSACTION_RECONCILE_OVERLAP)),
+            status=models.TransactionStatus.APPROVED
+        ).values_list('from_wallet_id', 'to_wallet_id', 'to_phone_id').iterator(
+            chunk_size=consts.TransactionConsts.EXPORT_CHUNK_SIZE
+        )
+        for from_wallet_id, to_wallet_id, to_phone_id in rows:
+            touched[consts.AccountType.WALLET].update(
+                wallet_id for wallet_id in (from_wallet_id, to_wallet_id) if wallet_id is not None
+            )
+            if to_phone_id is not None:
+                touched[consts.AccountType.PHONE].add(to_phone_id)
+
+        tasks = []
+        for account, ids in touched.items():
+            ids = sorted(ids)
+            for start in range(0, len(ids), range_size):
+                tasks.append({'account': account, 'ids': ids[start:start + range_size]})
+        return tasks
+
+    @staticmethod
+    def _run_task(task):
+        return ReconciliationService.reconcile_range(**task)
+
+    @staticmethod
+    def run(full=False, workers=None, range_size=consts.TransactionConsts.RECONCILE_RANGE_SIZE, report_path=None):
+        """
+        Reconcile balances, write the JSON discrepancy report and record the run.
+        Workers are forked processes, each with its own database connection;
+        `workers=1` runs in this process.
+        """
+        previous = models.ReconciliationRun.objects.filter(
+            finished_at__isnull=False
+        ).order_by('-id').first()
+        run = models.ReconciliationRun.objects.create(
+            full=full or previous is None,
+            high_water_id=models.Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+        )
+        if run.full:
+            tasks = ReconciliationService._full_tasks(range_size)
+        else:
+            tasks = ReconciliationService._incremental_tasks(previous, range_size)
+
+        if workers == 1:
+            results = [ReconciliationService._run_task(task) for task in tasks]
+        else:
+            # Forked children must not share this process' connection
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork')
+            ) as executor:
+                results = list(executor.map(ReconciliationService._run_task, tasks))
+
+        discrepancies = [item for _, found in results for item in found]
+        run.accounts_checked = sum(checked for checked, _ in results)
+        run.discrepancies = len(discrepancies)
+        if report_path is None:
+            os.makedirs(settings.TRANSACTION_RECONCILE_REPORT_DIR, exist_ok=True)
+            report_path = os.path.join(settings.TRANSACTION_RECONCILE_REPORT_DIR, f'reconciliation-{run.id}.json')
+        run.report_path = report_path
+        run.finished_at = timezone.now()
+
+        with open(run.report_path, 'w') as report:
+            json.dump(
+                {
+                    'run': run.id,
+                    'full': run.full,
+                    'started_at': run.started_at,
+                    'finished_at': run.finished_at,
+                    'accounts_checked': run.accounts_checked,
+                    'discrepancies': discrepancies,
+                },
+                report,
+                cls=DjangoJSONEncoder,
+                indent=2
+            )
+        run.save()
+        return run
+
+
+class IdempotencyService:
+    @staticmethod
+    def claim(user, scope, key, payload):
+        """
+        Reserve `key` for this request. Returns (claim, None) when the caller
+        should run the request and then complete or release the claim, or
+        (None, record) holding the stored outcome of an earlier identical
+        request. A duplicate still in flight is waited for, never raced.
+        """
+        if not key or len(key) > consts.TransactionConsts.IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise exceptions.ValidationError(
+                consts.TransactionErrorConsts.InvalidIdempotencyKey().get_status()
+            )
+
+        key_hash = hashlib.sha256(f'{scope}:{key}'.encode()).digest()
+        request_hash = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode()
+        ).digest()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        while True:
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    record = models.IdempotencyKey.objects.create(
+                        user=user,
+                        key_hash=key_hash,
+                        request_hash=request_hash,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+                    )
+                return record, None
+            except IntegrityError:
+                pass
+
+            record = models.IdempotencyKey.objects.filter(
+                user=user,
+                key_hash=key_hash
+            ).first()
+            if record is None:
+                continue
+
+            if record.expires_at <= now:
+                models.IdempotencyKey.objects.filter(id=record.id, created_at=record.created_at).delete()
+                continue
+
+            abandoned = (
+                record.status_code is None and
+                record.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+            )
+            if abandoned and IdempotencyService._discard_abandoned(record):
+                continue
+
+            if bytes(record.request_hash) != request_hash:
+                raise exceptions.ValidationError(
+                    consts.TransactionErrorConsts.IdempotencyKeyReused().get_status()
+                )
+
+            if record.status_code is not None:
+                return None, record
+
+            if time.monotonic() >= deadline:
+                raise Conflict(
+                    consts.TransactionErrorConsts.IdempotentRequestInProgress().get_status()
+                )
+            time.sleep(consts.TransactionConsts.IDEMPOTENCY_POLL_INTERVAL)
+
+    @staticmethod
+    def _discard_abandoned(record):
+        """
+        Delete an old claim that no request holds. A claim held by a running
+        request is row locked, however long it runs, and is skipped.
+        """
+        with transaction.atomic():
+            ids = list(
+                models.IdempotencyKey.objects.select_for_update(skip_locked=True).filter(
+                    id=record.id,
+                    status_code__isnull=True
+                ).values_list('id', flat=True)
+            )
+            if ids:
+                models.IdempotencyKey.objects.filter(id__in=ids).delete()
+        return bool(ids)
+
+    @staticmethod
+    def hold(record):
+        """
+        Row lock the claim for the caller's transaction, which runs the request
+        and must `complete` (or `release`) the claim before committing: the
+        outcome is then stored with the request's changes or not at all, and
+        the claim cannot be taken over while the request runs.
+        """
+        held = models.IdempotencyKey.objects.select_for_update().filter(
+            id=record.id,
+            status_code__isnull=True
+        ).values_list('id', flat=True)
+        if not held:
+            raise Conflict(
+                consts.TransactionErrorConsts.IdempotentRequestInProgress().get_status()
+            )
+
+    @staticmethod
+    def complete(record, status_code, body):
+        models.IdempotencyKey.objects.filter(
+            id=record.id
+        ).update(
+            status_code=status_code,
+            response_body=body
+        )
+
+    @staticmethod
+    def release(record):
+        """Forget a claim whose request failed, so a retry runs it again."""
+        models.IdempotencyKey.objects.filter(
+            id=record.id,
+            status_code__isnull=True
+        ).delete()
+
+    @staticmethod
+    def purge_expired(batch_size=10000):
+        deleted = 0
+        while True:
+            ids = list(
+                models.IdempotencyKey.objects.filter(
+                    expires_at__lte=timezone.now()
+                ).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += models.IdempotencyKey.objects.filter(id__in=ids).delete()[0]
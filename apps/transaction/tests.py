@@ -1,10 +1,21 @@
+import datetime
+import io
 from decimal import Decimal
 import threading
-from django.test import TestCase, TransactionTestCase
+import fakeredis
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
 from django.db.models import Sum
+from django.utils.translation import gettext_lazy
+from rest_framework import exceptions, parsers, renderers
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 
+from apps.core.parsers import ORJSONParser
+from apps.core.renderers import ORJSONRenderer
 from apps.users import models as users_models, consts as users_consts
-from apps.transaction import models, services
+from apps.transaction import models, services, consts, views, serializers
 
 
 class SimpleTransactionTestCase(TestCase):
@@ -292,6 +303,79 @@ class AccountingConsistencyTestCase(TestCase):
         self.assertEqual(total_transactions, 2)
 
 
+    def test_single_statement_sale(self):
+        from rest_framework.exceptions import NotFound, ValidationError
+
+        self.wallet.balance = Decimal('1000')
+        self.wallet.save()
+
+        with self.assertNumQueries(1):
+            trc = services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('400')
+            )
+
+        trc.refresh_from_db()
+        self.assertEqual(trc.from_wallet, self.wallet)
+        self.assertEqual(trc.to_phone, self.phone)
+        self.assertEqual(trc.updated_by, self.seller)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.balance, Decimal('400'))
+
+        with self.assertRaises(ValidationError):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('601')
+            )
+        with self.assertRaises(NotFound):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number='+989000000000',
+                amount=Decimal('1')
+            )
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('600'))
+        self.assertEqual(models.Transaction.objects.count(), 1)
+
+    def test_single_statement_approval(self):
+        from rest_framework.exceptions import NotFound, ValidationError
+
+        trc = services.CreditRequestService.create_credit_request(
+            user=self.seller,
+            amount=Decimal('2500')
+        )
+
+        with self.assertNumQueries(1):
+            updated = services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id,
+                admin_user=self.admin,
+                status=models.TransactionStatus.APPROVED
+            )
+
+        self.assertEqual(updated.id, trc.id)
+        self.assertEqual(updated.status, models.TransactionStatus.APPROVED)
+        self.assertEqual(updated.updated_by, self.admin)
+        self.assertEqual(updated.amount, Decimal('2500'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('2500'))
+
+        with self.assertRaises(ValidationError):
+            services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id,
+                admin_user=self.admin,
+                status=models.TransactionStatus.REJECTED
+            )
+        with self.assertRaises(NotFound):
+            services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id + 1000,
+                admin_user=self.admin,
+                status=models.TransactionStatus.APPROVED
+            )
+
+
 class ConcurrentTransactionTestCase(TransactionTestCase):
     """
     - Multiple concurrent charge sales
@@ -486,6 +570,176 @@ class ConcurrentTransactionTestCase(TransactionTestCase):
             f"More sales than possible: {success_count[0]} > {expected_successful_sales}"
         )
 
+    def test_concurrent_sharded_seller_sales(self):
+        seller = self.sellers[0]
+        wallet = self.wallets[0]
+
+        credit_amount = Decimal('100000')
+        trc = services.CreditRequestService.create_credit_request(
+            user=seller,
+            amount=credit_amount
+        )
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=trc.id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+        services.WalletShardService.configure_sharding(wallet, 8)
+
+        charge_amount = Decimal('700')
+        num_workers = 30
+        sales_per_worker = 5
+        threads = []
+        success_count = [0]
+        lock = threading.Lock()
+
+        def sell_charge_worker(seller_user, phone_num):
+            try:
+                for _ in range(sales_per_worker):
+                    try:
+                        services.ChargeService.sell_charge(
+                            user=seller_user,
+                            phone_number=phone_num,
+                            amount=charge_amount
+                        )
+                        with lock:
+                            success_count[0] += 1
+                    except Exception as e:
+                        self._record_error(f"Expected error: {str(e)}")
+            finally:
+                connection.close()
+
+        for i in range(num_workers):
+            phone = self.phones[i % len(self.phones)]
+            thread = threading.Thread(
+                target=sell_charge_worker,
+                args=(seller, phone.phone_number)
+            )
+            threads.append(thread)
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        wallet.refresh_from_db()
+        self.assertFalse(
+            models.WalletShard.objects.filter(wallet=wallet, balance__lt=0).exists(),
+            "Shard balance went negative!"
+        )
+        self.assertEqual(success_count[0], int(credit_amount // charge_amount))
+        self.assertEqual(
+            wallet.available_balance,
+            credit_amount - charge_amount * success_count[0]
+        )
+
+    def test_single_statement_sale_sees_concurrent_sharding(self):
+        import time
+        from django.db import transaction
+        from django.db.models import F
+
+        seller = self.sellers[0]
+        wallet = self.wallets[0]
+        models.Wallet.objects.filter(id=wallet.id).update(balance=Decimal('1000'))
+        wallet.refresh_from_db()
+
+        sharded, finish = threading.Event(), threading.Event()
+
+        def shard_wallet():
+            try:
+                with transaction.atomic():
+                    services.WalletShardService.configure_sharding(wallet, 2)
+                    # A credit landing on the wallet row of the now sharded wallet
+                    models.Wallet.objects.filter(id=wallet.id).update(balance=F('balance') + Decimal('500'))
+                    sharded.set()
+                    finish.wait(10)
+            except Exception as e:
+                self._record_error(str(e))
+            finally:
+                connection.close()
+
+        def sell():
+            try:
+                services.ChargeService.sell_charge(
+                    user=seller, phone_number=self.phones[0].phone_number, amount=Decimal('100')
+                )
+            except Exception as e:
+                self._record_error(str(e))
+            finally:
+                connection.close()
+
+        sharding = threading.Thread(target=shard_wallet)
+        sharding.start()
+        self.assertTrue(sharded.wait(10))
+        sale = threading.Thread(target=sell)
+        sale.start()
+        # Let the sale's statement queue behind the sharding transaction's row lock
+        deadline = time.monotonic() + 10
+        with connection.cursor() as cursor:
+            while time.monotonic() < deadline:
+                cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock'")
+                if cursor.fetchone()[0]:
+                    break
+                time.sleep(0.01)
+        finish.set()
+        sharding.join()
+        sale.join()
+
+        self.assertEqual(self.errors, [])
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, Decimal('500'))
+        self.assertEqual(wallet.available_balance, Decimal('1400'))
+
+    def test_sharded_sales_do_not_wait_on_rollup_row(self):
+        from django.db import transaction
+        from django.utils import timezone
+
+        seller = self.sellers[0]
+        wallet = self.wallets[0]
+        trc = services.CreditRequestService.create_credit_request(user=seller, amount=Decimal('1000'))
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=trc.id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+        wallet = services.WalletShardService.configure_sharding(wallet, 2)
+
+        sold, finish = threading.Event(), threading.Event()
+
+        def open_sale():
+            try:
+                with transaction.atomic():
+                    services.ChargeService.sell_charge(
+                        user=seller, phone_number=self.phones[0].phone_number, amount=Decimal('100')
+                    )
+                    sold.set()
+                    finish.wait(10)
+            except Exception as e:
+                self._record_error(str(e))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=open_sale)
+        thread.start()
+        try:
+            self.assertTrue(sold.wait(10))
+            # Waiting on the first sale's rollup row would fail here
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = '2s'")
+                services.ChargeService.sell_charge(
+                    user=seller, phone_number=self.phones[1].phone_number, amount=Decimal('100')
+                )
+        finally:
+            finish.set()
+            thread.join()
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual(models.WalletDailyRollup.objects.filter(wallet=wallet, sales_count=1).count(), 2)
+        [totals] = services.RollupService.get_daily_totals(
+            seller, consts.AccountType.WALLET, timezone.localdate(), timezone.localdate()
+        )
+        self.assertEqual((totals.sales_count, totals.sales_amount), (2, Decimal('200')))
+
     def test_concurrent_credit_approvals(self):
         seller = self.sellers[0]
         wallet = self.wallets[0]
@@ -550,3 +804,1723 @@ class ConcurrentTransactionTestCase(TransactionTestCase):
         ).count()
 
         self.assertEqual(approved_count, 10)
+
+
+class BatchSellChargeTestCase(TestCase):
+    """
+    - Batch sales settle wallet, phones and logs together
+    - All-or-nothing batches leave no trace on failure
+    - Best-effort batches settle what the balance allows
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        self.phones = []
+        for i in range(3):
+            phone_user = users_models.User.objects.create(
+                username=f'phone_user_{i}',
+                email=f'phone{i}@test.com',
+                password='phone123'
+            )
+            phone = users_models.PhoneNumber.objects.create(
+                phone_number=f'+9891234567{i:02d}',
+                user=phone_user,
+                balance=Decimal('0')
+            )
+            self.phones.append(phone)
+
+        trc = services.CreditRequestService.create_credit_request(
+            user=self.seller,
+            amount=Decimal('1000')
+        )
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=trc.id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+
+    def test_batch_settles_all_items(self):
+        items = [
+            (self.phones[0].phone_number, Decimal('100')),
+            (self.phones[1].phone_number, Decimal('200')),
+            (self.phones[0].phone_number, Decimal('50')),
+        ]
+
+        results = services.ChargeService.sell_charges_bulk(user=self.seller, items=items)
+
+        self.assertTrue(all(result['error'] is None for result in results))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('650'))
+        self.phones[0].refresh_from_db()
+        self.phones[1].refresh_from_db()
+        self.assertEqual(self.phones[0].balance, Decimal('150'))
+        self.assertEqual(self.phones[1].balance, Decimal('200'))
+        self.assertEqual(
+            models.Transaction.objects.filter(from_wallet=self.wallet).count(),
+            3
+        )
+
+    def test_all_or_nothing_rejects_whole_batch(self):
+        from rest_framework.exceptions import ValidationError
+
+        items = [
+            (self.phones[0].phone_number, Decimal('600')),
+            (self.phones[1].phone_number, Decimal('600')),
+        ]
+
+        with self.assertRaises(ValidationError):
+            services.ChargeService.sell_charges_bulk(user=self.seller, items=items)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('1000'))
+        self.assertFalse(models.Transaction.objects.filter(from_wallet=self.wallet).exists())
+
+    def test_best_effort_settles_what_fits(self):
+        items = [
+            (self.phones[0].phone_number, Decimal('600')),
+            ('+989000000000', Decimal('10')),
+            (self.phones[1].phone_number, Decimal('600')),
+            (self.phones[2].phone_number, Decimal('400')),
+        ]
+
+        results = services.ChargeService.sell_charges_bulk(
+            user=self.seller,
+            items=items,
+            mode=consts.BatchMode.BEST_EFFORT
+        )
+
+        self.assertEqual(
+            [result['error'] is None for result in results],
+            [True, False, False, True]
+        )
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0'))
+        self.phones[1].refresh_from_db()
+        self.assertEqual(self.phones[1].balance, Decimal('0'))
+
+
+class BulkCreditApprovalTestCase(TestCase):
+    """
+    - Bulk approval credits each wallet once with the summed amount
+    - Already processed and missing ids are reported, not re-applied
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+
+        self.sellers = []
+        self.wallets = []
+        for i in range(2):
+            seller = users_models.User.objects.create(
+                username=f'seller{i}',
+                email=f'seller{i}@test.com',
+                password='seller123',
+                role=users_consts.UserRole.SELLER
+            )
+            self.sellers.append(seller)
+            self.wallets.append(models.Wallet.objects.create(user=seller, balance=Decimal('0')))
+
+    def test_bulk_approval(self):
+        credit_requests = [
+            services.CreditRequestService.create_credit_request(
+                user=self.sellers[i % 2],
+                amount=Decimal('1000')
+            )
+            for i in range(6)
+        ]
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=credit_requests[0].id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+
+        result = services.CreditRequestService.bulk_update_status_credit_requests(
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED,
+            transaction_ids=[trc.id for trc in credit_requests] + [999999]
+        )
+
+        self.assertEqual(result['processed'], [trc.id for trc in credit_requests[1:]])
+        self.assertEqual(result['already_processed'], [credit_requests[0].id])
+        self.assertEqual(result['not_found'], [999999])
+
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.balance, Decimal('3000'))
+        self.assertEqual(
+            models.Transaction.objects.filter(
+                status=models.TransactionStatus.APPROVED,
+                updated_by=self.admin
+            ).count(),
+            6
+        )
+
+    def test_bulk_rejection_by_date_range(self):
+        trc = services.CreditRequestService.create_credit_request(
+            user=self.sellers[0],
+            amount=Decimal('1000')
+        )
+
+        result = services.CreditRequestService.bulk_update_status_credit_requests(
+            admin_user=self.admin,
+            status=models.TransactionStatus.REJECTED,
+            created_after=trc.created_at
+        )
+
+        self.assertEqual(result['processed'], [trc.id])
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].balance, Decimal('0'))
+
+    def test_bulk_reports_unprocessed_ids_by_status(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+
+        credit_requests = [
+            services.CreditRequestService.create_credit_request(
+                user=self.sellers[0],
+                amount=Decimal('1000')
+            )
+            for _ in range(3)
+        ]
+        models.Transaction.objects.filter(id=credit_requests[0].id).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        with mock.patch.object(consts.TransactionConsts, 'MAX_BULK_STATUS_SIZE', 1):
+            result = services.CreditRequestService.bulk_update_status_credit_requests(
+                admin_user=self.admin,
+                status=models.TransactionStatus.REJECTED,
+                transaction_ids=[credit_requests[0].id],
+                created_after=timezone.now() - timedelta(days=1)
+            )
+            self.assertEqual(result['processed'], [])
+            self.assertEqual(result['skipped'], [credit_requests[0].id])
+            self.assertEqual(result['already_processed'], [])
+
+            result = services.CreditRequestService.bulk_update_status_credit_requests(
+                admin_user=self.admin,
+                status=models.TransactionStatus.REJECTED,
+                created_after=timezone.now() - timedelta(days=1)
+            )
+            self.assertEqual(result['processed'], [credit_requests[1].id])
+            self.assertTrue(result['has_more'])
+
+            with self.assertRaises(exceptions.ValidationError):
+                services.CreditRequestService.bulk_update_status_credit_requests(
+                    admin_user=self.admin,
+                    status=models.TransactionStatus.REJECTED,
+                    transaction_ids=[trc.id for trc in credit_requests]
+                )
+
+
+class ShardedWalletTestCase(TestCase):
+    """
+    - Sharding splits and rebalances funds without losing any
+    - Debits fall back to other shards and to draining several shards
+    """
+
+    def setUp(self):
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+    def test_configure_and_rebalance(self):
+        wallet = services.WalletShardService.configure_sharding(self.wallet, 3)
+
+        self.assertEqual(wallet.balance, Decimal('0'))
+        self.assertEqual(
+            sorted(wallet.shards.values_list('balance', flat=True)),
+            [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')]
+        )
+
+        models.Wallet.objects.filter(id=wallet.id).update(balance=Decimal('300'))
+        wallet = services.WalletShardService.rebalance(wallet)
+        self.assertEqual(wallet.available_balance, Decimal('1300'))
+        self.assertEqual(wallet.balance, Decimal('0'))
+
+        wallet = services.WalletShardService.configure_sharding(wallet, 0)
+        self.assertEqual(wallet.balance, Decimal('1300'))
+        self.assertFalse(wallet.shards.exists())
+
+    def test_debit_drains_several_shards(self):
+        services.WalletShardService.configure_sharding(self.wallet, 4)
+
+        services.ChargeService.sell_charge(
+            user=self.seller,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('600')
+        )
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.available_balance, Decimal('400'))
+        self.assertFalse(self.wallet.shards.filter(balance__lt=0).exists())
+
+        from rest_framework.exceptions import ValidationError
+        with self.assertRaises(ValidationError):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('401')
+            )
+        self.assertEqual(self.wallet.available_balance, Decimal('400'))
+
+
+@override_settings(TRANSACTION_LEDGER_MODE=True)
+class LedgerModeTestCase(TestCase):
+    """
+    - Movements are ledger entries, balance columns stay untouched
+    - Compaction rolls entries into snapshots without changing balances
+    - No negative wallet balance
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+        trc = services.CreditRequestService.create_credit_request(
+            user=self.seller,
+            amount=Decimal('1000')
+        )
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=trc.id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+
+    def test_ledger_balances(self):
+        for _ in range(3):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('200')
+            )
+
+        self.assertEqual(services.BalanceService.get_wallet_balance(self.wallet), Decimal('400'))
+        self.assertEqual(services.BalanceService.get_phone_balance(self.phone), Decimal('600'))
+
+        self.wallet.refresh_from_db()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0'))
+        self.assertEqual(self.phone.balance, Decimal('0'))
+
+        from rest_framework.exceptions import ValidationError
+        with self.assertRaises(ValidationError):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('401')
+            )
+
+    def test_compaction_keeps_balances(self):
+        services.ChargeService.sell_charge(
+            user=self.seller,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('300')
+        )
+
+        self.assertEqual(services.LedgerService.compact(lag=0), 2)
+        self.assertEqual(services.LedgerService.compact(lag=0), 0)
+
+        services.ChargeService.sell_charge(
+            user=self.seller,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('100')
+        )
+        self.assertEqual(services.LedgerService.compact(lag=0), 2)
+
+        self.assertEqual(services.BalanceService.get_wallet_balance(self.wallet), Decimal('600'))
+        self.assertEqual(services.BalanceService.get_phone_balance(self.phone), Decimal('400'))
+        self.assertEqual(
+            models.BalanceSnapshot.objects.filter(wallet=self.wallet).order_by('-last_entry_id').first().balance,
+            Decimal('600')
+        )
+
+
+class IdempotencyTestCase(TransactionTestCase):
+    """
+    - Retried requests replay the stored response without a second sale
+    - Concurrent duplicates wait for the first request
+    - A key cannot be reused for a different payload
+    - The outcome is stored with the sale or not at all, and a claim held by
+      a running request is never taken over
+    """
+
+    def setUp(self):
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+    def _sell(self, key, amount='100'):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        return client.post(
+            '/api/v1/transactions/sell-charge/',
+            {'phone_number': str(self.phone.phone_number), 'amount': amount},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_response(self):
+        first = self._sell('retry-key')
+        second = self._sell('retry-key')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(models.Transaction.objects.count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('900'))
+
+        self.assertEqual(self._sell('retry-key', amount='200').status_code, 400)
+
+    def test_concurrent_duplicates(self):
+        responses = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                result = self._sell('concurrent-key')
+                with lock:
+                    responses.append(result)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([result.status_code for result in responses], [201] * 10)
+        self.assertEqual(len({result.json()['id'] for result in responses}), 1)
+        self.assertEqual(models.Transaction.objects.count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('900'))
+
+    def test_outcome_commits_with_sale(self):
+        from unittest import mock
+
+        with mock.patch.object(services.IdempotencyService, 'complete', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._sell('failed-key')
+        self.assertEqual(models.Transaction.objects.count(), 0)
+        self.assertFalse(models.IdempotencyKey.objects.exists())
+
+        self.assertEqual(self._sell('failed-key').status_code, 201)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('900'))
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0, IDEMPOTENCY_WAIT_TIMEOUT=0.2)
+    def test_running_claim_is_not_taken_over(self):
+        from django.db import transaction
+        from apps.core.exceptions import Conflict
+
+        claim, _ = services.IdempotencyService.claim(self.seller, 'sell_charge', 'slow-key', {})
+        held, done = threading.Event(), threading.Event()
+
+        def slow_request():
+            try:
+                with transaction.atomic():
+                    services.IdempotencyService.hold(claim)
+                    held.set()
+                    done.wait()
+                    services.IdempotencyService.complete(claim, 201, {})
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_request)
+        thread.start()
+        held.wait()
+        try:
+            with self.assertRaises(Conflict):
+                services.IdempotencyService.claim(self.seller, 'sell_charge', 'slow-key', {})
+        finally:
+            done.set()
+            thread.join()
+
+        _, replay = services.IdempotencyService.claim(self.seller, 'sell_charge', 'slow-key', {})
+        self.assertEqual(replay.status_code, 201)
+
+
+class TransactionHistoryTestCase(TestCase):
+    """
+    - Pages follow each other without gaps or duplicates
+    - Sales and credit requests are merged, newest first
+    - Filters narrow both sides
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+        self.credits = []
+        for _ in range(4):
+            trc = services.CreditRequestService.create_credit_request(
+                user=self.seller,
+                amount=Decimal('1000')
+            )
+            self.credits.append(trc)
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=self.credits[0].id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+        self.sales = [
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('10')
+            )
+            for _ in range(5)
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def _history(self, **params):
+        response = self.client.get('/api/v1/transactions/history/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cover_all_transactions(self):
+        seen = []
+        body = self._history(limit=2)
+        while True:
+            seen.extend(item['id'] for item in body['results'])
+            if body['next'] is None:
+                break
+            body = self.client.get(body['next']).json()
+
+        expected = models.Transaction.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_filters(self):
+        sales = self._history(type=consts.HistoryType.SALE)['results']
+        self.assertEqual({item['id'] for item in sales}, {trc.id for trc in self.sales})
+
+        pending = self._history(type=consts.HistoryType.CREDIT, status=models.TransactionStatus.PENDING)
+        self.assertEqual({item['id'] for item in pending['results']}, {trc.id for trc in self.credits[1:]})
+
+        self.assertEqual(self._history(created_before=self.credits[0].created_at.isoformat())['results'], [])
+
+        response = self.client.get('/api/v1/transactions/history/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TransactionExportTestCase(TestCase):
+    """
+    - Export is admin only
+    - NDJSON, CSV and gzip outputs carry every matching row
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        self.credits = [
+            services.CreditRequestService.create_credit_request(
+                user=self.seller,
+                amount=Decimal(f'{i + 1}00')
+            )
+            for i in range(5)
+        ]
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=self.credits[0].id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _export(self, **params):
+        response = self.client.get('/api/v1/transactions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_formats(self):
+        import csv
+        import gzip
+        import io
+        import json
+
+        lines = self._export().decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [trc.id for trc in self.credits])
+        self.assertEqual(rows[0]['amount'], '100.00')
+        self.assertEqual(rows[0]['updated_by_id'], self.admin.id)
+
+        pending = self._export(output=consts.ExportFormat.CSV, status=models.TransactionStatus.PENDING)
+        reader = csv.DictReader(io.StringIO(pending.decode()))
+        self.assertEqual([int(row['id']) for row in reader], [trc.id for trc in self.credits[1:]])
+
+        compressed = self._export(gzip='true')
+        self.assertEqual(gzip.decompress(compressed).decode().splitlines(), lines)
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(self.seller)
+        response = self.client.get('/api/v1/transactions/export/')
+        self.assertEqual(response.status_code, 403)
+
+
+class TransactionPartitionTestCase(TestCase):
+    """
+    - Future months get their own partitions, filled from the default one
+    - Old partitions are detached only once every row was settled and archived
+    """
+
+    def setUp(self):
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+    def _partition_of(self, trc):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT tableoid::regclass::text FROM transaction_transaction WHERE id = %s',
+                [trc.id]
+            )
+            return cursor.fetchone()[0]
+
+    def test_create_and_detach_partitions(self):
+        import tempfile
+        from datetime import timedelta
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+
+        partitions = services.TransactionPartitionService
+        next_month = partitions._add_months(
+            timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0), 1
+        )
+        current = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('10'))
+        future = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('20'))
+        models.Transaction.objects.filter(id=future.id).update(created_at=next_month + timedelta(days=3))
+        self.assertEqual(self._partition_of(future), partitions.DEFAULT_PARTITION)
+
+        created = partitions.create_partitions(months_ahead=2)
+        self.assertEqual(created, [
+            f'transaction_transaction_p{partitions._add_months(next_month, offset):%Y%m}'
+            for offset in range(2)
+        ])
+        self.assertEqual(self._partition_of(future), created[0])
+        self.assertEqual(partitions.create_partitions(months_ahead=2), [])
+
+        # Pending, then settled but not archived: the partition stays attached,
+        # without the parent table being locked to find that out
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                partitions.detach_partitions(before=next_month),
+                ([], [('transaction_transaction_p_legacy', True)])
+            )
+        self.assertFalse([query for query in queries if 'DETACH' in query['sql']])
+        models.Transaction.objects.filter(id=current.id).update(status=models.TransactionStatus.APPROVED)
+        self.assertEqual(
+            partitions.detach_partitions(before=next_month),
+            ([], [('transaction_transaction_p_legacy', False)])
+        )
+        self.assertTrue(models.Transaction.objects.filter(id=current.id).exists())
+
+        with tempfile.TemporaryDirectory() as archive_dir, override_settings(TRANSACTION_ARCHIVE_DIR=archive_dir):
+            services.TransactionArchiveService.archive(cutoff=next_month)
+        self.assertEqual(
+            models.ArchivedBalance.objects.get(wallet_id=current.to_wallet_id).amount, Decimal('10')
+        )
+
+        detached, kept = partitions.detach_partitions(before=next_month)
+        self.assertEqual((detached, kept), (['transaction_transaction_p_legacy'], []))
+        self.assertTrue(models.Transaction.objects.filter(id=future.id).exists())
+
+
+class TransactionArchiveTestCase(TestCase):
+    """
+    - Only settled transactions older than the cutoff are archived
+    - Archived rows are readable by wallet and date, and their approved
+      amounts are carried into ArchivedBalance
+    - Re-running resumes an interrupted batch and archives nothing twice
+    """
+
+    def setUp(self):
+        import tempfile
+        from datetime import timedelta
+        from django.utils import timezone
+
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(TRANSACTION_ARCHIVE_DIR=archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+        approved = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('1000'))
+        rejected = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('50'))
+        self.pending = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('70'))
+        for trc, status in ((approved, models.TransactionStatus.APPROVED), (rejected, models.TransactionStatus.REJECTED)):
+            services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id,
+                admin_user=self.admin,
+                status=status
+            )
+        sales = [
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('100')
+            )
+            for _ in range(3)
+        ]
+        self.old = [approved, rejected, self.pending] + sales[:2]
+        self.recent = sales[2]
+
+        self.cutoff = timezone.now() - timedelta(days=30)
+        models.Transaction.objects.filter(
+            id__in=[trc.id for trc in self.old]
+        ).update(created_at=self.cutoff - timedelta(days=10))
+
+    def test_archive_and_read(self):
+        batches = services.TransactionArchiveService.archive(cutoff=self.cutoff, chunk_size=3, delete_batch_size=2)
+
+        self.assertEqual([batch.row_count for batch in batches], [3, 1])
+        self.assertEqual(sum(batch.amount_sum for batch in batches), Decimal('1250'))
+        self.assertEqual(
+            set(models.Transaction.objects.values_list('id', flat=True)),
+            {self.pending.id, self.recent.id}
+        )
+
+        archived = list(services.TransactionArchiveService.read(wallet_id=self.wallet.id))
+        self.assertEqual(len(archived), 4)
+        self.assertEqual(list(services.TransactionArchiveService.read(created_after=self.cutoff)), [])
+
+        self.assertEqual(models.ArchivedBalance.objects.get(wallet=self.wallet).amount, Decimal('800'))
+        self.assertEqual(models.ArchivedBalance.objects.get(phone=self.phone).amount, Decimal('200'))
+
+        self.assertEqual(services.TransactionArchiveService.archive(cutoff=self.cutoff), [])
+
+    def test_resume_interrupted_run(self):
+        from unittest import mock
+
+        with mock.patch.object(services.TransactionArchiveService, '_delete_rows', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                services.TransactionArchiveService.archive(cutoff=self.cutoff)
+        self.assertEqual(models.Transaction.objects.count(), 6)
+
+        batches = services.TransactionArchiveService.archive(cutoff=self.cutoff)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].status, models.ArchiveBatchStatus.DELETED)
+        self.assertEqual(models.Transaction.objects.count(), 2)
+        self.assertEqual(models.ArchivedBalance.objects.get(wallet=self.wallet).amount, Decimal('800'))
+
+
+class ReconciliationTestCase(TestCase):
+    """
+    - Consistent balances produce an empty report
+    - Tampered balances are reported
+    - Incremental runs only check accounts touched since the last run, with
+      an overlap for transactions that committed after it started
+    - Reports default to TRANSACTION_RECONCILE_REPORT_DIR
+    """
+
+    def setUp(self):
+        import tempfile
+
+        report_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(report_dir.cleanup)
+        self.report_dir = report_dir.name
+
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.wallets = []
+        for i in range(3):
+            seller = users_models.User.objects.create(
+                username=f'seller{i}',
+                email=f'seller{i}@test.com',
+                password='seller123',
+                role=users_consts.UserRole.SELLER
+            )
+            self.wallets.append(models.Wallet.objects.create(user=seller, balance=Decimal('0')))
+            trc = services.CreditRequestService.create_credit_request(user=seller, amount=Decimal('500'))
+            services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id,
+                admin_user=self.admin,
+                status=models.TransactionStatus.APPROVED
+            )
+
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456789',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+        services.ChargeService.sell_charge(
+            user=self.wallets[0].user,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('120')
+        )
+
+    def _run(self, **kwargs):
+        import json
+        import os
+
+        run = services.ReconciliationService.run(
+            workers=1,
+            range_size=2,
+            report_path=os.path.join(self.report_dir, 'report.json'),
+            **kwargs
+        )
+        with open(run.report_path) as report:
+            return run, json.load(report)
+
+    @override_settings(TRANSACTION_RECONCILE_OVERLAP=0)
+    def test_full_and_incremental_runs(self):
+        run, report = self._run()
+        self.assertTrue(run.full)
+        self.assertEqual(run.accounts_checked, 4)
+        self.assertEqual(report['discrepancies'], [])
+
+        models.Wallet.objects.filter(id=self.wallets[1].id).update(balance=Decimal('450'))
+        models.Wallet.objects.filter(id=self.wallets[2].id).update(balance=Decimal('999'))
+        services.ChargeService.sell_charge(
+            user=self.wallets[1].user,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('10')
+        )
+
+        run, report = self._run()
+        self.assertFalse(run.full)
+        self.assertEqual(run.accounts_checked, 2)
+        self.assertEqual(
+            [(item['account'], item['id'], item['difference']) for item in report['discrepancies']],
+            [(consts.AccountType.WALLET, self.wallets[1].id, '-50.00')]
+        )
+
+        run, report = self._run(full=True)
+        self.assertEqual(run.discrepancies, 2)
+
+    def test_incremental_run_overlaps_previous_start(self):
+        from datetime import timedelta
+
+        run, _ = self._run()
+        # A sale numbered and stamped before that run started, committed after it
+        trc = services.ChargeService.sell_charge(
+            user=self.wallets[2].user,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('10')
+        )
+        models.Transaction.objects.filter(id=trc.id).update(updated_at=run.started_at - timedelta(seconds=1))
+        models.ReconciliationRun.objects.filter(id=run.id).update(high_water_id=trc.id)
+        models.Wallet.objects.filter(id=self.wallets[2].id).update(balance=Decimal('999'))
+
+        with override_settings(TRANSACTION_RECONCILE_OVERLAP=0):
+            self.assertEqual(self._run()[0].accounts_checked, 0)
+        models.ReconciliationRun.objects.exclude(id=run.id).delete()
+
+        run, report = self._run()
+        self.assertEqual(
+            [(item['account'], item['id']) for item in report['discrepancies']],
+            [(consts.AccountType.WALLET, self.wallets[2].id)]
+        )
+
+    def test_default_report_directory(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as report_dir, \
+                override_settings(TRANSACTION_RECONCILE_REPORT_DIR=os.path.join(report_dir, 'reports')):
+            run = services.ReconciliationService.run(workers=1)
+            self.assertEqual(run.report_path, os.path.join(report_dir, 'reports', f'reconciliation-{run.id}.json'))
+            self.assertTrue(os.path.exists(run.report_path))
+
+
+class DailyRollupTestCase(TestCase):
+    """
+    - Every sale and approval path updates the daily rollups
+    - A rebuild from the transactions gives the same totals
+    - The API serves the caller's rollups
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+
+        self.phones = []
+        for i in range(2):
+            phone_user = users_models.User.objects.create(
+                username=f'phone{i}',
+                email=f'phone{i}@test.com',
+                password='phone123'
+            )
+            self.phones.append(users_models.PhoneNumber.objects.create(
+                phone_number=f'+98912345678{i}',
+                user=phone_user,
+                balance=Decimal('0')
+            ))
+
+    def _rollups(self):
+        return (
+            list(models.WalletDailyRollup.objects.values_list(
+                'wallet_id', 'sales_count', 'sales_amount', 'credit_count', 'credit_amount'
+            )),
+            sorted(models.PhoneDailyRollup.objects.values_list('phone_id', 'charge_count', 'charge_amount')),
+        )
+
+    def test_rollups_follow_movements(self):
+        first = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('1000'))
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=first.id,
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED
+        )
+        second = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('500'))
+        services.CreditRequestService.bulk_update_status_credit_requests(
+            admin_user=self.admin,
+            status=models.TransactionStatus.APPROVED,
+            transaction_ids=[second.id]
+        )
+
+        services.ChargeService.sell_charge(
+            user=self.seller,
+            phone_number=self.phones[0].phone_number,
+            amount=Decimal('100')
+        )
+        with override_settings(TRANSACTION_SINGLE_STATEMENT_SALES=False):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phones[1].phone_number,
+                amount=Decimal('30')
+            )
+        services.ChargeService.sell_charges_bulk(
+            user=self.seller,
+            items=[(self.phones[0].phone_number, Decimal('20')), (self.phones[1].phone_number, Decimal('5'))]
+        )
+
+        expected = (
+            [(self.wallet.id, 4, Decimal('155'), 2, Decimal('1500'))],
+            [(self.phones[0].id, 2, Decimal('120')), (self.phones[1].id, 2, Decimal('35'))],
+        )
+        self.assertEqual(self._rollups(), expected)
+
+        from django.utils import timezone
+        services.RollupService.rebuild(timezone.localdate())
+        self.assertEqual(self._rollups(), expected)
+
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        response = client.get('/api/v1/transactions/stats/daily/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{
+            'day': str(timezone.localdate()),
+            'sales_count': 4,
+            'sales_amount': '155.00',
+            'credit_count': 2,
+            'credit_amount': '1500.00',
+        }])
+
+        client.force_authenticate(self.phones[0].user)
+        response = client.get('/api/v1/transactions/stats/daily/', {'account': consts.AccountType.PHONE})
+        self.assertEqual(response.json()['results'][0]['charge_count'], 2)
+        response = client.get('/api/v1/transactions/stats/daily/', {'start': '2026-01-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CreditQueueTestCase(TransactionTestCase):
+    """
+    - Concurrent admins claim disjoint batches
+    - Leases are renewed for their holder, released, and expire
+    - The queue lists pending requests only
+    """
+
+    def setUp(self):
+        self.admins = [
+            users_models.User.objects.create(
+                username=f'admin{i}',
+                email=f'admin{i}@test.com',
+                password='admin123',
+                is_admin=True,
+                role=users_consts.UserRole.ADMIN
+            )
+            for i in range(5)
+        ]
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+        self.requests = [
+            services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('100'))
+            for _ in range(20)
+        ]
+
+    def test_concurrent_claims_are_disjoint(self):
+        claims = {}
+        lock = threading.Lock()
+
+        def worker(admin):
+            try:
+                claimed = services.CreditQueueService.claim(admin, limit=4)
+                with lock:
+                    claims[admin.id] = [trc.id for trc in claimed]
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(admin,)) for admin in self.admins]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        claimed_ids = [trc_id for ids in claims.values() for trc_id in ids]
+        self.assertEqual(sorted(claimed_ids), sorted(trc.id for trc in self.requests))
+        for admin in self.admins:
+            self.assertEqual(
+                set(models.Transaction.objects.filter(claimed_by=admin).values_list('id', flat=True)),
+                set(claims[admin.id])
+            )
+
+    def test_lease_lifecycle(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        first, second = self.admins[:2]
+        held = [trc.id for trc in services.CreditQueueService.claim(first, limit=5)]
+        self.assertEqual(held, [trc.id for trc in self.requests[:5]])
+        # Renewal: the holder gets its own requests back first
+        self.assertEqual([trc.id for trc in services.CreditQueueService.claim(first, limit=5)], held)
+        self.assertEqual(
+            [trc.id for trc in services.CreditQueueService.claim(second, limit=2)],
+            [trc.id for trc in self.requests[5:7]]
+        )
+
+        self.assertEqual(services.CreditQueueService.release(first, held[:2]), 2)
+        models.Transaction.objects.filter(id__in=held[2:]).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        services.CreditRequestService.update_status_credit_request(
+            transaction_id=self.requests[7].id,
+            admin_user=second,
+            status=models.TransactionStatus.APPROVED
+        )
+        self.assertEqual(
+            [trc.id for trc in services.CreditQueueService.claim(second, limit=7)],
+            held + [trc.id for trc in self.requests[5:7]]
+        )
+
+        client = APIClient()
+        client.force_authenticate(first)
+        response = client.get('/api/v1/transactions/queue/', {'limit': 15})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertNotIn(self.requests[7].id, [item['id'] for item in body['results']])
+        self.assertEqual(len(body['results']), 15)
+        self.assertEqual(len(client.get(body['next']).json()['results']), 4)
+        self.assertEqual(body['results'][0]['claimed_by_id'], second.id)
+
+
+class AsyncViewTestCase(TestCase):
+    """
+    - Async services settle sales and credit requests like the sync ones
+    - Async views answer with the same payloads, Idempotency-Key included
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456700',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+        self.factory = APIRequestFactory()
+
+    def call(self, view_class, method, data=None, headers=None):
+        request = getattr(self.factory, method)('/', data, format='json', headers=headers)
+        force_authenticate(request, user=self.seller)
+        return async_to_sync(view_class.as_view())(request)
+
+    @override_settings(TRANSACTION_SINGLE_STATEMENT_SALES=False)
+    def test_async_sell_charge_orm_path(self):
+        trc = async_to_sync(services.ChargeService.asell_charge)(
+            user=self.seller,
+            phone_number=self.phone.phone_number,
+            amount=Decimal('300')
+        )
+
+        self.assertEqual(trc.status, models.TransactionStatus.APPROVED)
+        self.wallet.refresh_from_db()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('700'))
+        self.assertEqual(self.phone.balance, Decimal('300'))
+
+    def test_async_sell_charge_invalid_amount(self):
+        with self.assertRaises(exceptions.ValidationError) as error:
+            async_to_sync(services.ChargeService.asell_charge)(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('0')
+            )
+        self.assertEqual(error.exception.detail['code'], str(consts.TransactionErrorConsts.InvalidAmount.code))
+
+    def test_async_views(self):
+        sale = self.call(
+            views.AsyncSellChargeView, 'post',
+            {'phone_number': str(self.phone.phone_number), 'amount': '250.00'},
+            headers={consts.TransactionConsts.IDEMPOTENCY_HEADER: 'sale-1'}
+        )
+        self.assertEqual(sale.status_code, 201)
+        self.assertEqual(sale.data['to_phone_number'], str(self.phone.phone_number))
+
+        replay = self.call(
+            views.AsyncSellChargeView, 'post',
+            {'phone_number': str(self.phone.phone_number), 'amount': '250.00'},
+            headers={consts.TransactionConsts.IDEMPOTENCY_HEADER: 'sale-1'}
+        )
+        self.assertEqual(replay.data['id'], sale.data['id'])
+
+        credit = self.call(views.AsyncCreateCreditRequestView, 'post', {'amount': '100.00'})
+        self.assertEqual(credit.status_code, 201)
+        self.assertEqual(credit.data['status'], models.TransactionStatus.PENDING)
+        self.assertEqual(credit.data['to_wallet_id'], self.wallet.id)
+
+        balance = self.call(views.AsyncWalletBalanceView, 'get')
+        self.assertEqual(balance.status_code, 200)
+        self.assertEqual(balance.data, {'user_email': 'seller@test.com', 'balance': '750.00'})
+
+
+@override_settings(TRANSACTION_SALE_COALESCING=True, TRANSACTION_SALE_COALESCE_WINDOW_MS=200)
+class SaleCoalescingTestCase(TransactionTestCase):
+    """
+    - Concurrent sales of several sellers settle in shared database transactions
+    - A sale that would overdraw fails alone, the rest of its batch commits
+    """
+
+    def setUp(self):
+        self.sellers = []
+        self.wallets = []
+        for i, balance in enumerate([Decimal('1000'), Decimal('100')]):
+            seller = users_models.User.objects.create(
+                username=f'seller{i}',
+                email=f'seller{i}@test.com',
+                password='seller123',
+                role=users_consts.UserRole.SELLER
+            )
+            self.sellers.append(seller)
+            self.wallets.append(models.Wallet.objects.create(user=seller, balance=balance))
+
+        self.phones = []
+        for i in range(2):
+            phone_user = users_models.User.objects.create(
+                username=f'phone_user_{i}',
+                email=f'phone{i}@test.com',
+                password='phone123'
+            )
+            self.phones.append(users_models.PhoneNumber.objects.create(
+                phone_number=f'+9891234567{i:02d}',
+                user=phone_user,
+                balance=Decimal('0')
+            ))
+        self.addCleanup(services.SaleCoalescer.stop)
+
+    def test_concurrent_sales_share_commits(self):
+        from unittest import mock
+
+        sales = [(self.sellers[0], self.phones[i % 2], Decimal('200')) for i in range(4)]
+        sales += [(self.sellers[1], self.phones[0], Decimal('60')) for _ in range(2)]
+        outcomes = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(sales))
+
+        def sell(seller, phone, amount):
+            barrier.wait()
+            try:
+                services.ChargeService.sell_charge(
+                    user=seller,
+                    phone_number=phone.phone_number,
+                    amount=amount
+                )
+                outcome = 'ok'
+            except Exception as e:
+                outcome = str(e.detail['code'])
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append((seller.id, outcome))
+
+        settle = services.ChargeService._settle_sales_batch
+        with mock.patch.object(services.ChargeService, '_settle_sales_batch', side_effect=settle) as batches:
+            threads = [threading.Thread(target=sell, args=sale) for sale in sales]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertLess(batches.call_count, len(sales))
+        self.assertEqual(
+            sorted(outcome for seller_id, outcome in outcomes if seller_id == self.sellers[1].id),
+            sorted(['ok', str(consts.TransactionErrorConsts.InsufficientBalance.code)])
+        )
+        self.assertEqual(
+            [outcome for seller_id, outcome in outcomes if seller_id == self.sellers[0].id],
+            ['ok'] * 4
+        )
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+        self.assertEqual(self.wallets[0].balance, Decimal('200'))
+        self.assertEqual(self.wallets[1].balance, Decimal('40'))
+        self.assertEqual(
+            users_models.PhoneNumber.objects.aggregate(total=Sum('balance'))['total'],
+            Decimal('860')
+        )
+        self.assertEqual(
+            models.WalletDailyRollup.objects.get(wallet=self.wallets[0]).sales_count,
+            4
+        )
+
+
+@override_settings(WALLET_BALANCE_CACHE=True)
+class WalletBalanceCacheTestCase(TestCase):
+    """
+    - Balance polls are served from the cache once it is filled
+    - Sales and approvals publish the new balance when they commit
+    - An older version never replaces a newer cached balance, checked in one
+      atomic step on the apps.core.cache backends
+    - Elsewhere a write that finds another in progress is skipped, not waited for
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+        phone_user = users_models.User.objects.create(
+            username='phone_user',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456700',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.seller)
+
+    def poll(self):
+        response = self.client.get('/api/v1/transactions/wallet/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['balance']
+
+    def test_polls_skip_database_and_follow_writes(self):
+        self.assertEqual(self.poll(), '1000.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.poll(), '1000.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.ChargeService.sell_charge(
+                user=self.seller,
+                phone_number=self.phone.phone_number,
+                amount=Decimal('300')
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.poll(), '700.00')
+
+        trc = services.CreditRequestService.create_credit_request(user=self.seller, amount=Decimal('50'))
+        with self.captureOnCommitCallbacks(execute=True):
+            services.CreditRequestService.update_status_credit_request(
+                transaction_id=trc.id,
+                admin_user=self.admin,
+                status=models.TransactionStatus.APPROVED
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.poll(), '750.00')
+
+    def test_stale_version_is_ignored(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.BalanceService.debit_wallet(self.wallet, Decimal('100'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.version, 1)
+
+        # A poll that read the row before the debit fills in late
+        services.WalletBalanceCache.store(self.seller.id, 0, Decimal('1000'))
+        self.assertEqual(services.WalletBalanceCache.get(self.seller.id), (1, Decimal('900')))
+
+    def test_atomic_backends_compare_versions(self):
+        for backend in (
+            {'BACKEND': 'apps.core.cache.SharedMemoryCache', 'LOCATION': 'tests-balance'},
+            {
+                'BACKEND': 'apps.core.cache.RedisCache',
+                'LOCATION': 'redis://127.0.0.1:6379/14',
+                'OPTIONS': {'connection_class': fakeredis.FakeConnection},
+            },
+        ):
+            with self.subTest(backend=backend['BACKEND']), override_settings(CACHES={'default': backend}):
+                cache.clear()
+                services.WalletBalanceCache.store(self.seller.id, 2, None)
+                services.WalletBalanceCache.store(self.seller.id, 1, Decimal('1000'))
+                self.assertIsNone(services.WalletBalanceCache.get(self.seller.id))
+                services.WalletBalanceCache.store(self.seller.id, 2, Decimal('900'))
+                services.WalletBalanceCache.store(self.seller.id, 2, None)
+                self.assertEqual(services.WalletBalanceCache.get(self.seller.id), (2, Decimal('900')))
+                services.WalletBalanceCache.store(self.seller.id, 3, Decimal('800'))
+                self.assertEqual(services.WalletBalanceCache.get(self.seller.id), (3, Decimal('800')))
+
+    def test_contended_write_is_skipped(self):
+        cache.add(consts.TransactionConsts.BALANCE_CACHE_LOCK_KEY.format(self.seller.id), 1)
+        services.WalletBalanceCache.store(self.seller.id, 1, Decimal('900'))
+        self.assertIsNone(services.WalletBalanceCache.get(self.seller.id))
+
+    def test_sharded_wallet_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.WalletShardService.configure_sharding(self.wallet, 2)
+
+        self.assertIsNone(services.WalletBalanceCache.get(self.seller.id))
+        self.assertEqual(self.poll(), '1000.00')
+        self.assertIsNone(services.WalletBalanceCache.get(self.seller.id))
+
+
+class WalletBalanceETagTestCase(TestCase):
+    """
+    - Balance responses carry an ETag of the wallet version
+    - A matching If-None-Match gets an empty 304 until the balance changes
+    - Sharded wallets, whose version does not follow debits, get no ETag
+    """
+
+    def setUp(self):
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.seller)
+
+    def test_conditional_get(self):
+        first = self.client.get('/api/v1/transactions/wallet/')
+        etag = first['ETag']
+
+        cached = self.client.get('/api/v1/transactions/wallet/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], etag)
+
+        services.BalanceService.debit_wallet(self.wallet, Decimal('1'))
+        changed = self.client.get('/api/v1/transactions/wallet/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['balance'], '999.00')
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_sharded_wallet_has_no_etag(self):
+        services.WalletShardService.configure_sharding(self.wallet, 2)
+
+        response = self.client.get('/api/v1/transactions/wallet/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTestCase(TestCase):
+    """
+    - Every budgeted endpoint stays within its @query_budget in each balance mode
+    - and runs exactly the queries pinned here for that mode, so a cheaper
+      mode cannot regress up to the worst case budget unnoticed
+    - Transaction responses render without loading related rows
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('0'))
+        self.phones = []
+        for i in range(2):
+            phone_user = users_models.User.objects.create(
+                username=f'phone_user_{i}',
+                email=f'phone{i}@test.com',
+                password='phone123'
+            )
+            self.phones.append(users_models.PhoneNumber.objects.create(
+                phone_number=f'+9891234567{i:02d}',
+                user=phone_user,
+                balance=Decimal('0')
+            ))
+        self.seller_client = APIClient()
+        self.seller_client.force_authenticate(user=self.seller)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(user=self.admin)
+
+    def call(self, queries, client, method, url, data=None):
+        """Request `url` and check the view ran exactly `queries` queries, savepoints aside."""
+        from django.test.utils import CaptureQueriesContext
+        from apps.core.decorators import SAVEPOINT_STATEMENTS
+
+        with CaptureQueriesContext(connection) as captured:
+            result = getattr(client, method)(url, data, format='json')
+        ran = [
+            query['sql'] for query in captured.captured_queries
+            if not query['sql'].lstrip().upper().startswith(SAVEPOINT_STATEMENTS)
+        ]
+        self.assertEqual(len(ran), queries, f'{method.upper()} {url}:\n' + '\n'.join(ran))
+        return result
+
+    def exercise_endpoints(self, sale_queries, batch_queries, balance_queries):
+        base = '/api/v1/transactions'
+        credits = [
+            self.call(2, self.seller_client, 'post', f'{base}/credit-request/', {'amount': '500.00'})
+            for _ in range(3)
+        ]
+        self.assertEqual({credit.status_code for credit in credits}, {201})
+
+        self.assertEqual(self.call(1, self.admin_client, 'get', f'{base}/queue/').status_code, 200)
+        self.assertEqual(self.call(1, self.admin_client, 'post', f'{base}/queue/claim/', {'limit': 2}).status_code, 200)
+        self.assertEqual(self.call(
+            1, self.admin_client, 'post', f'{base}/queue/release/', {'transaction_ids': [credits[0].data['id']]}
+        ).status_code, 200)
+
+        self.assertEqual(self.call(
+            1, self.admin_client, 'patch', f'{base}/status/',
+            {'transaction_id': credits[0].data['id'], 'status': models.TransactionStatus.APPROVED}
+        ).status_code, 200)
+        self.assertEqual(self.call(
+            3, self.admin_client, 'patch', f'{base}/status/bulk/',
+            {'transaction_ids': [credits[1].data['id'], credits[2].data['id']], 'status': models.TransactionStatus.APPROVED}
+        ).status_code, 200)
+
+        sale = self.call(
+            sale_queries, self.seller_client, 'post', f'{base}/sell-charge/',
+            {'phone_number': str(self.phones[0].phone_number), 'amount': '100.00'}
+        )
+        self.assertEqual(sale.status_code, 201)
+        self.assertEqual(sale.data['to_phone_number'], str(self.phones[0].phone_number))
+        self.assertEqual(sale.data['from_wallet_id'], self.wallet.id)
+        batch = self.call(
+            batch_queries, self.seller_client, 'post', f'{base}/sell-charge/batch/',
+            {'items': [
+                {'phone_number': str(phone.phone_number), 'amount': '10.00'} for phone in self.phones * 5
+            ]}
+        )
+        self.assertEqual(batch.status_code, 201)
+
+        self.assertEqual(self.call(balance_queries, self.seller_client, 'get', f'{base}/wallet/').data['balance'], '1300.00')
+        self.assertEqual(self.call(3, self.seller_client, 'get', f'{base}/history/').status_code, 200)
+        self.assertEqual(self.call(1, self.seller_client, 'get', f'{base}/stats/daily/').status_code, 200)
+
+    def test_single_statement_mode(self):
+        self.exercise_endpoints(sale_queries=1, batch_queries=7, balance_queries=1)
+
+    @override_settings(TRANSACTION_SINGLE_STATEMENT_SALES=False)
+    def test_orm_mode(self):
+        self.exercise_endpoints(sale_queries=7, batch_queries=7, balance_queries=1)
+
+    @override_settings(TRANSACTION_LEDGER_MODE=True)
+    def test_ledger_mode(self):
+        self.exercise_endpoints(sale_queries=10, batch_queries=10, balance_queries=3)
+
+    def test_sharded_wallet(self):
+        services.WalletShardService.configure_sharding(self.wallet, 2)
+        self.exercise_endpoints(sale_queries=9, batch_queries=8, balance_queries=2)
+
+
+class FastJSONTestCase(TestCase):
+    """
+    - ORJSONRenderer writes the bytes JSONRenderer writes, ORJSONParser reads
+      what JSONParser reads
+    - Precompiled TransactionSerializer / WalletSerializer output is the
+      generic output
+    """
+
+    def setUp(self):
+        self.admin = users_models.User.objects.create(
+            username='admin',
+            email='admin@test.com',
+            password='admin123',
+            is_admin=True,
+            role=users_consts.UserRole.ADMIN
+        )
+        self.seller = users_models.User.objects.create(
+            username='seller',
+            email='seller@test.com',
+            password='seller123',
+            role=users_consts.UserRole.SELLER
+        )
+        self.wallet = models.Wallet.objects.create(user=self.seller, balance=Decimal('1000'))
+        phone_user = users_models.User.objects.create(
+            username='phone@test.com',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = users_models.PhoneNumber.objects.create(
+            phone_number='+989123456700',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+    def transactions(self):
+        services.ChargeService.sell_charge(self.seller, str(self.phone.phone_number), Decimal('12.5'))
+        credit = services.CreditRequestService.create_credit_request(self.seller, Decimal('0.01'))
+        services.CreditRequestService.update_status_credit_request(
+            credit.id, self.admin, models.TransactionStatus.APPROVED
+        )
+        services.CreditRequestService.create_credit_request(self.seller, Decimal('99999.99'))
+        return list(models.Transaction.objects.select_related('to_phone').order_by('id'))
+
+    def render(self, renderer_class, data):
+        return renderer_class().render(data, 'application/json', {})
+
+    def test_renderer_bytes(self):
+        data = {
+            'amount': Decimal('10.50'),
+            'at': datetime.datetime(2026, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone.utc),
+            'on': datetime.date(2026, 1, 2),
+            'naive': datetime.datetime(2026, 1, 2, 3, 4, 5),
+            'text': 'caf\u00e9 \u2028 \u2029 "quoted" \\ \n \x1f \U0001f600',
+            'lazy': gettext_lazy('Pending'),
+            'nested': [{'a': None, 'b': True, 'c': 2 ** 40}, [], {}],
+            1: 'non-string key',
+            'float': 0.1,
+        }
+        self.assertEqual(self.render(ORJSONRenderer, data), self.render(renderers.JSONRenderer, data))
+        self.assertEqual(self.render(ORJSONRenderer, None), b'')
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=4', {}),
+            renderers.JSONRenderer().render(data, 'application/json; indent=4', {})
+        )
+
+    def test_parser(self):
+        def parse(parser_class, body):
+            return parser_class().parse(io.BytesIO(body), 'application/json', {})
+
+        for body in (
+            b'{"amount": "10.50", "ids": [1, 2, 3], "email": "caf\xc3\xa9@test.com"}',
+            b'[1.5, null, true, "\\u2028"]',
+        ):
+            self.assertEqual(parse(ORJSONParser, body), parse(parsers.JSONParser, body))
+
+        for body in (b'{"amount": ', b'{"amount": NaN}'):
+            with self.assertRaises(exceptions.ParseError) as fast:
+                parse(ORJSONParser, body)
+            with self.assertRaises(exceptions.ParseError) as stdlib:
+                parse(parsers.JSONParser, body)
+            self.assertEqual(str(fast.exception), str(stdlib.exception))
+
+    def test_precompiled_serializers(self):
+        transactions = self.transactions()
+        self.assertEqual(len(transactions), 3)
+        generic = serializers.TransactionSerializer(transactions, many=True).data
+        wallet = serializers.WalletSerializer(self.wallet).data
+        with override_settings(PRECOMPILED_SERIALIZERS=True):
+            precompiled = serializers.TransactionSerializer(transactions, many=True).data
+            precompiled_wallet = serializers.WalletSerializer(self.wallet).data
+            # Subclasses render their extra fields through the generic path
+            queue_item = serializers.CreditQueueItemSerializer(transactions[-1]).data
+
+        self.assertEqual(list(precompiled), list(generic))
+        self.assertEqual(
+            self.render(renderers.JSONRenderer, precompiled),
+            self.render(renderers.JSONRenderer, generic)
+        )
+        self.assertEqual(self.render(ORJSONRenderer, precompiled), self.render(renderers.JSONRenderer, generic))
+        self.assertEqual(
+            self.render(ORJSONRenderer, precompiled_wallet),
+            self.render(renderers.JSONRenderer, wallet)
+        )
+        self.assertIn('claimed_by_id', queue_item)
@@ -1,10 +1,28 @@
+from django.conf import settings
 from django.urls import path
 
 from apps.transaction import views
 
+if settings.ASYNC_VIEWS:
+    wallet_balance_view = views.AsyncWalletBalanceView
+    credit_request_view = views.AsyncCreateCreditRequestView
+    sell_charge_view = views.AsyncSellChargeView
+else:
+    wallet_balance_view = views.WalletBalanceView
+    credit_request_view = views.CreateCreditRequestView
+    sell_charge_view = views.SellChargeView
+
 urlpatterns = [
-    path('wallet/', views.WalletBalanceView.as_view(), name='wallet_balance'),
-    path('credit-request/', views.CreateCreditRequestView.as_view(), name='create_credit_request'),
+    path('wallet/', wallet_balance_view.as_view(), name='wallet_balance'),
+    path('history/', views.TransactionHistoryView.as_view(), name='transaction_history'),
+    path('stats/daily/', views.DailyRollupView.as_view(), name='daily_rollups'),
+    path('export/', views.TransactionExportView.as_view(), name='transaction_export'),
+    path('credit-request/', credit_request_view.as_view(), name='create_credit_request'),
     path('status/', views.UpdateCreditRequestView.as_view(), name='update_credit_request_status'),
-    path('sell-charge/', views.SellChargeView.as_view(), name='sell_charge'),
+    path('status/bulk/', views.BulkUpdateCreditRequestView.as_view(), name='bulk_update_credit_request_status'),
+    path('queue/', views.CreditQueueView.as_view(), name='credit_queue'),
+    path('queue/claim/', views.CreditQueueClaimView.as_view(), name='credit_queue_claim'),
+    path('queue/release/', views.CreditQueueReleaseView.as_view(), name='credit_queue_release'),
+    path('sell-charge/', sell_charge_view.as_view(), name='sell_charge'),
+    path('sell-charge/batch/', views.SellChargeBatchView.as_view(), name='sell_charge_batch'),
 ]
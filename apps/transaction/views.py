@@ -1,23 +1,141 @@
-from rest_framework import status, permissions, views, response, generics
+from adrf import views as async_views
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status, permissions, views, response
 
-from apps.transaction import services, serializers, models
+from apps.transaction import services, serializers, models, consts
+from apps.transaction.decorators import idempotent
 from apps.throttling import throttles
+from apps.core.decorators import query_budget
 from apps.core.permissions import IsAdminUser
 
 
-class WalletBalanceView(generics.RetrieveAPIView):
-    serializer_class = serializers.WalletSerializer
+def _wallet_balance_response(request, balance, version):
+    """
+    Balance response carrying an ETag of the wallet version, or a bodiless
+    304 when the client's If-None-Match already names that version.
+    """
+    if version is None:
+        serializer = serializers.WalletSerializer(models.Wallet(user=request.user), context={'balance': balance})
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+    etag = quote_etag(f'{request.user.id}.{version}')
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return response.Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    serializer = serializers.WalletSerializer(models.Wallet(user=request.user), context={'balance': balance})
+    return response.Response(serializer.data, status=status.HTTP_200_OK, headers=headers)
+
+
+class WalletBalanceView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionListThrottle]
+
+    @query_budget(3)
+    def get(self, request):
+        balance, version = services.BalanceService.get_user_wallet_balance(request.user)
+        return _wallet_balance_response(request, balance, version)
+
+
+class AsyncWalletBalanceView(async_views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionListThrottle]
+
+    async def get(self, request):
+        balance, version = await services.BalanceService.aget_user_wallet_balance(request.user)
+        return _wallet_balance_response(request, balance, version)
+
+
+class TransactionHistoryView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionListThrottle]
+
+    @query_budget(3)
+    def get(self, request):
+        serializer = serializers.TransactionHistoryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        transactions, next_cursor = services.TransactionHistoryService.get_history(
+            user=request.user,
+            limit=serializer.validated_data['limit'],
+            cursor=serializer.validated_data.get('cursor'),
+            status=serializer.validated_data.get('status'),
+            history_type=serializer.validated_data.get('type'),
+            created_after=serializer.validated_data.get('created_after'),
+            created_before=serializer.validated_data.get('created_before'),
+        )
+
+        next_url = None
+        if next_cursor is not None:
+            query_params = request.query_params.copy()
+            query_params['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f'{request.path}?{query_params.urlencode()}')
+
+        response_serializer = serializers.TransactionSerializer(transactions, many=True)
+        return response.Response(
+            {'next': next_url, 'results': response_serializer.data},
+            status=status.HTTP_200_OK
+        )
+
+
+class TransactionExportView(views.APIView):
+    permission_classes = [IsAdminUser,]
+    throttle_classes = [throttles.TransactionListThrottle]
+
+    def get(self, request):
+        serializer = serializers.TransactionExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        export_format = serializer.validated_data['output']
+        compress = serializer.validated_data['gzip']
+        chunks = services.TransactionExportService.export(
+            export_format=export_format,
+            compress=compress,
+            status=serializer.validated_data.get('status'),
+            created_after=serializer.validated_data.get('created_after'),
+            created_before=serializer.validated_data.get('created_before'),
+        )
+
+        filename = f'transactions.{export_format}'
+        content_type = consts.ExportFormat.CONTENT_TYPES[export_format]
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        export_response = StreamingHttpResponse(chunks, content_type=content_type)
+        export_response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return export_response
+
+
+class DailyRollupView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
     throttle_classes = [throttles.TransactionListThrottle]
 
-    def get_object(self):
-        return models.Wallet.objects.get(user=self.request.user)
+    @query_budget(1)
+    def get(self, request):
+        serializer = serializers.DailyRollupQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        account = serializer.validated_data['account']
+        rollups = services.RollupService.get_daily_totals(
+            user=request.user,
+            account=account,
+            start=serializer.validated_data['start'],
+            end=serializer.validated_data['end'],
+        )
+        if account == consts.AccountType.WALLET:
+            response_serializer = serializers.WalletDailyRollupSerializer(rollups, many=True)
+        else:
+            response_serializer = serializers.PhoneDailyRollupSerializer(rollups, many=True)
+        return response.Response({'results': response_serializer.data}, status=status.HTTP_200_OK)
 
 
 class CreateCreditRequestView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
     throttle_classes = [throttles.TransactionCreateThrottle]
 
+    @idempotent(scope='credit_request')
+    @query_budget(2)
     def post(self, request):
         serializer = serializers.CreateCreditRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -30,10 +148,28 @@ class CreateCreditRequestView(views.APIView):
         return response.Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 
+class AsyncCreateCreditRequestView(async_views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @idempotent(scope='credit_request')
+    async def post(self, request):
+        serializer = serializers.CreateCreditRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        trc = await services.CreditRequestService.acreate_credit_request(
+            user=request.user,
+            amount=serializer.validated_data.get('amount')
+        )
+        response_serializer = serializers.TransactionSerializer(trc)
+        return response.Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+
 class UpdateCreditRequestView(views.APIView):
     permission_classes = [IsAdminUser,]
     throttle_classes = [throttles.TransactionCreateThrottle]
 
+    @query_budget(1)
     def patch(self, request):
         serializer = serializers.ProcessTransactionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -47,10 +183,91 @@ class UpdateCreditRequestView(views.APIView):
         return response.Response(response_serializer.data, status=status.HTTP_200_OK)
 
 
+class BulkUpdateCreditRequestView(views.APIView):
+    permission_classes = [IsAdminUser,]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @query_budget(3)
+    def patch(self, request):
+        serializer = serializers.BulkProcessTransactionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = services.CreditRequestService.bulk_update_status_credit_requests(
+            admin_user=request.user,
+            status=serializer.validated_data.get('status'),
+            transaction_ids=serializer.validated_data.get('transaction_ids'),
+            created_after=serializer.validated_data.get('created_after'),
+            created_before=serializer.validated_data.get('created_before'),
+        )
+        return response.Response(result, status=status.HTTP_200_OK)
+
+
+class CreditQueueView(views.APIView):
+    permission_classes = [IsAdminUser,]
+    throttle_classes = [throttles.TransactionListThrottle]
+
+    @query_budget(1)
+    def get(self, request):
+        serializer = serializers.CreditQueueQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        trcs, next_cursor = services.CreditQueueService.list_pending(
+            limit=serializer.validated_data['limit'],
+            cursor=serializer.validated_data.get('cursor'),
+        )
+
+        next_url = None
+        if next_cursor is not None:
+            query_params = request.query_params.copy()
+            query_params['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f'{request.path}?{query_params.urlencode()}')
+
+        response_serializer = serializers.CreditQueueItemSerializer(trcs, many=True)
+        return response.Response(
+            {'next': next_url, 'results': response_serializer.data},
+            status=status.HTTP_200_OK
+        )
+
+
+class CreditQueueClaimView(views.APIView):
+    permission_classes = [IsAdminUser,]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @query_budget(1)
+    def post(self, request):
+        serializer = serializers.CreditQueueClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        trcs = services.CreditQueueService.claim(
+            admin_user=request.user,
+            limit=serializer.validated_data['limit']
+        )
+        response_serializer = serializers.CreditQueueItemSerializer(trcs, many=True)
+        return response.Response({'results': response_serializer.data}, status=status.HTTP_200_OK)
+
+
+class CreditQueueReleaseView(views.APIView):
+    permission_classes = [IsAdminUser,]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @query_budget(1)
+    def post(self, request):
+        serializer = serializers.CreditQueueReleaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        released = services.CreditQueueService.release(
+            admin_user=request.user,
+            transaction_ids=serializer.validated_data['transaction_ids']
+        )
+        return response.Response({'released': released}, status=status.HTTP_200_OK)
+
+
 class SellChargeView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
     throttle_classes = [throttles.TransactionCreateThrottle]
 
+    @idempotent(scope='sell_charge')
+    @query_budget(10)
     def post(self, request):
         serializer = serializers.SellChargeSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -62,3 +279,43 @@ class SellChargeView(views.APIView):
         )
         response_serializer = serializers.TransactionSerializer(trc)
         return response.Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncSellChargeView(async_views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @idempotent(scope='sell_charge')
+    async def post(self, request):
+        serializer = serializers.SellChargeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        trc = await services.ChargeService.asell_charge(
+            user=request.user,
+            phone_number=serializer.validated_data['phone_number'],
+            amount=serializer.validated_data['amount']
+        )
+        response_serializer = serializers.TransactionSerializer(trc)
+        return response.Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+
+class SellChargeBatchView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.TransactionCreateThrottle]
+
+    @idempotent(scope='sell_charge_batch')
+    @query_budget(10)
+    def post(self, request):
+        serializer = serializers.SellChargeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = services.ChargeService.sell_charges_bulk(
+            user=request.user,
+            items=[
+                (item['phone_number'], item['amount'])
+                for item in serializer.validated_data['items']
+            ],
+            mode=serializer.validated_data['mode']
+        )
+        response_serializer = serializers.SellChargeBatchResultSerializer(results, many=True)
+        return response.Response({'results': response_serializer.data}, status=status.HTTP_201_CREATED)
@@ -1,7 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
     verbose_name = 'Users'
+
+    def ready(self):
+        # Connects the receivers that keep the authentication user cache fresh
+        from apps.users import authentication  # noqa: F401
+        from apps.users.services import PasswordHashingPool
+
+        # Before gunicorn's preloaded master forks, so that every worker
+        # counts pending hashes against the same limit
+        if settings.PASSWORD_HASHING_POOL:
+            PasswordHashingPool.share_admission()
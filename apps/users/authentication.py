@@ -0,0 +1,109 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user fields the API reads on every request (CLAIMS:
+email for PhoneNumberSerializer and WalletSerializer, is_admin for
+IsAdminUser, role), so StatelessJWTAuthentication builds request.user from
+the token without a query. That user is a `User` loaded with only id and the
+claims; the ORM accepts it anywhere a user is expected, and reading any other
+field loads it from the database. A change to a claimed field reaches
+request.user when the user's next access token is issued.
+
+Tokens without the claims (issued before them) fall back to `user_cache`: a
+bounded, per-process LRU of User rows that drops entries after a TTL and on
+save or delete in this process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication, exceptions, tokens
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.users import models
+
+CLAIMS = ('email', 'is_admin', 'role')
+
+
+class ClaimsRefreshToken(tokens.RefreshToken):
+    """Refresh token whose claims, and so its access tokens', include CLAIMS."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class UserCache:
+    """At most `maxsize` users, each served for `ttl` seconds after it was loaded."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        """The user with `user_id`; raises User.DoesNotExist."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                return entry[1]
+
+        user = models.User.objects.get(id=user_id)
+        with self.lock:
+            self.entries[user_id] = (now + self.ttl, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return user
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+
+
+@receiver([post_save, post_delete], sender=models.User)
+def discard_cached_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+
+class StatelessJWTAuthentication(authentication.JWTAuthentication):
+    # `id` and CLAIMS in the order from_db expects them
+    token_fields = [
+        field.attname for field in models.User._meta.concrete_fields
+        if field.attname == 'id' or field.attname in CLAIMS
+    ]
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise exceptions.InvalidToken(_('Token contained no recognizable user identification'))
+
+        if all(claim in validated_token for claim in CLAIMS):
+            claims = {'id': user_id, **{claim: validated_token[claim] for claim in CLAIMS}}
+            return models.User.from_db(
+                DEFAULT_DB_ALIAS, self.token_fields, [claims[field] for field in self.token_fields]
+            )
+
+        try:
+            return user_cache.get(user_id)
+        except models.User.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
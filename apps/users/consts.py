@@ -48,6 +48,11 @@ class AuthErrorConsts:
         code = 1007
         message = 'Password is required.'
 
+    @status_decorator
+    class AuthenticationBusy:
+        code = 1008
+        message = 'Too many sign-ins in progress, please retry shortly.'
+
 
 class LogoutErrorConsts:
     @status_decorator
@@ -0,0 +1,45 @@
+"""
+Password hashers, and the functions PasswordHashingPool runs in its
+processes. Those import this module before Django is set up, so it must not
+import models.
+"""
+import os
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Settings the pool processes must see as the web worker does
+HASHING_SETTINGS = ('PASSWORD_HASHERS', 'PASSWORD_HASH_ITERATIONS')
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    pbkdf2_sha256 at the PASSWORD_HASH_ITERATIONS cost profile. Hashes stored
+    at any other iteration count still verify, and are rehashed at this one
+    on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+def init_hashing_process(overrides, nice):
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    os.nice(nice)
+
+
+def hash_password(password):
+    return hashers.make_password(password)
+
+
+def verify_password(password, encoded):
+    """(matches, the password rehashed at the current cost profile or None)."""
+    rehashed = []
+    matches = hashers.check_password(
+        password, encoded, setter=lambda raw: rehashed.append(hashers.make_password(raw))
+    )
+    return matches, (rehashed[0] if rehashed else None)
@@ -1,11 +1,10 @@
-from django.contrib.auth.hashers import make_password, check_password
-
 from rest_framework import serializers, exceptions
 from rest_framework_simplejwt.tokens import RefreshToken
 from phonenumber_field.serializerfields import PhoneNumberField
 
-from apps.users import models, consts
-from apps.transaction import models as transaction_models
+from apps.users import models, consts, services
+from apps.users.authentication import ClaimsRefreshToken
+from apps.transaction import models as transaction_models, serializers as transaction_serializers
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -53,12 +52,12 @@ class RegisterSerializer(serializers.Serializer):
         user = models.User.objects.create(
             email=email,
             username=email,
-            password=make_password(password),
+            password=services.PasswordService.make_password(password),
             email_verified=True  # TODO: Add Verify Email Endpoint later
         )
 
         transaction_models.Wallet.objects.create(user=user)
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
 
         return {
             'access_token': str(refresh.access_token),
@@ -88,7 +87,7 @@ class LoginSerializer(serializers.Serializer):
                 consts.AuthErrorConsts.AccountNotFound().get_status()
             )
 
-        if not user.password or not check_password(password, user.password):
+        if not user.password or not services.PasswordService.check_password(user, password):
             raise serializers.ValidationError(
                 consts.AuthErrorConsts.InvalidCredentials().get_status()
             )
@@ -97,7 +96,7 @@ class LoginSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         user = validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
 
         return {
             'access_token': str(refresh.access_token),
@@ -135,6 +134,11 @@ class LogoutSerializer(serializers.Serializer):
 class PhoneNumberSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email')
     phone_number = PhoneNumberField(required=True)
+    balance = transaction_serializers.PhoneBalanceField(
+        max_digits=12,
+        decimal_places=2,
+        read_only=True
+    )
 
     class Meta:
         model = models.PhoneNumber
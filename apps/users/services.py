@@ -0,0 +1,184 @@
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+
+from apps.core.exceptions import ServiceBusy
+from apps.users import models, consts, hashers
+
+logger = logging.getLogger(__name__)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class HashingAdmission:
+    """
+    `size` slots shared by every process forked after it was created, each
+    holding the pid of a process with a hash queued or running. A slot whose
+    process died (a worker killed mid-hash) counts as free.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.holders = multiprocessing.Array('q', max(size, 1), lock=False)
+        self.lock = multiprocessing.Lock()
+
+    def enter(self):
+        """Claim a slot and return its index, or None when all are taken."""
+        if not self.lock.acquire(timeout=1):
+            return None
+        try:
+            for index in range(self.size):
+                holder = self.holders[index]
+                if not holder or not _is_alive(holder):
+                    self.holders[index] = os.getpid()
+                    return index
+            return None
+        finally:
+            self.lock.release()
+
+    def leave(self, index):
+        self.holders[index] = 0
+
+    def pending(self):
+        return sum(1 for holder in self.holders[:self.size] if holder)
+
+
+class PasswordHashingPool:
+    """
+    Process pool for PBKDF2 work (settings.PASSWORD_HASHING_POOL).
+
+    Each web worker gets PASSWORD_HASHING_WORKERS spawned processes at
+    PASSWORD_HASHING_NICE, so a login storm costs the host a bounded, low
+    priority share of CPU and the workers serving sales keep theirs; a web
+    worker waiting on a hash is idle, not burning a core.
+
+    Admission control is host-wide: UsersConfig.ready creates the
+    HashingAdmission before gunicorn's preloaded master forks, so with
+    PASSWORD_HASHING_MAX_PENDING hashes queued or running in any of the
+    workers, further ones raise ServiceBusy instead of queueing; a hash not
+    done within PASSWORD_HASHING_TIMEOUT does too. `stats()` reports the
+    host's queue depth and this worker's counters.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    _admission = None
+
+    def __init__(self, workers, admission, timeout, nice):
+        self.workers = workers
+        self.admission = admission
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.counters = {'completed': 0, 'rejected': 0, 'timed_out': 0}
+        # Spawned, not forked: the web worker has threads and open connections
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=hashers.init_hashing_process,
+            initargs=({name: getattr(settings, name) for name in hashers.HASHING_SETTINGS}, nice),
+        )
+
+    @classmethod
+    def share_admission(cls):
+        """Create the admission slots that the processes forked from this one will share."""
+        cls._admission = HashingAdmission(settings.PASSWORD_HASHING_MAX_PENDING)
+
+    @classmethod
+    def get(cls):
+        """The pool of this process, started on first use (and again after a fork)."""
+        with cls._instance_lock:
+            if cls._admission is None or cls._admission.size != settings.PASSWORD_HASHING_MAX_PENDING:
+                cls.share_admission()
+            instance = cls._instance
+            if instance is None or instance.pid != os.getpid():
+                instance = cls._instance = cls(
+                    workers=settings.PASSWORD_HASHING_WORKERS,
+                    admission=cls._admission,
+                    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+                    nice=settings.PASSWORD_HASHING_NICE,
+                )
+            return instance
+
+    @classmethod
+    def stop(cls):
+        """Shut the pool down; the next `get` starts a new one with the current settings."""
+        with cls._instance_lock:
+            instance, cls._instance = cls._instance, None
+        if instance is not None and instance.pid == os.getpid():
+            instance.executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, fn, *args):
+        slot = self.admission.enter()
+        if slot is None:
+            with self.lock:
+                self.counters['rejected'] += 1
+            logger.warning(f'Password hashing queue full ({self.admission.size} pending), rejecting')
+            raise ServiceBusy(consts.AuthErrorConsts.AuthenticationBusy().get_status(), wait=1)
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.admission.leave(slot)
+            raise
+        # The slot is held until the hash is done, even past the timeout
+        future.add_done_callback(functools.partial(self._done, slot))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            with self.lock:
+                self.counters['timed_out'] += 1
+            raise ServiceBusy(consts.AuthErrorConsts.AuthenticationBusy().get_status(), wait=1)
+
+    def _done(self, slot, future):
+        self.admission.leave(slot)
+        if not future.cancelled():
+            with self.lock:
+                self.counters['completed'] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'pending': self.admission.pending(),
+                'max_pending': self.admission.size,
+                **self.counters,
+            }
+
+
+class PasswordService:
+    @staticmethod
+    def _run(fn, *args):
+        if settings.PASSWORD_HASHING_POOL:
+            return PasswordHashingPool.get().run(fn, *args)
+        return fn(*args)
+
+    @staticmethod
+    def make_password(password):
+        return PasswordService._run(hashers.hash_password, password)
+
+    @staticmethod
+    def check_password(user, password):
+        """
+        Verify `password` against the user's hash. A correct password stored
+        at an outdated cost profile (or hasher) is saved rehashed.
+        """
+        matches, rehashed = PasswordService._run(hashers.verify_password, password, user.password)
+        if rehashed is not None:
+            models.User.objects.filter(pk=user.pk, password=user.password).update(password=rehashed)
+            user.password = rehashed
+        return matches
@@ -0,0 +1,170 @@
+import multiprocessing
+import threading
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.users.authentication import StatelessJWTAuthentication, user_cache
+from apps.users.services import PasswordHashingPool
+from apps.users import models, consts
+from apps.transaction import models as transaction_models, services as transaction_services
+
+
+class StatelessJWTAuthTestCase(TestCase):
+    """
+    - Access tokens carry email, is_admin and role; the stateless
+      authenticator builds request.user from them without a query
+    - That user works wherever services and permissions take a user
+    - Tokens without the claims are served from the TTL user cache
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        response = self.client.post(
+            '/api/v1/users/register/', {'email': 'seller@test.com', 'password': 'seller123'}, format='json'
+        )
+        self.access_token = response.data['access_token']
+        self.seller = models.User.objects.get(email='seller@test.com')
+        phone_user = models.User.objects.create(
+            username='phone@test.com',
+            email='phone@test.com',
+            password='phone123'
+        )
+        self.phone = models.PhoneNumber.objects.create(
+            phone_number='+989123456700',
+            user=phone_user,
+            balance=Decimal('0')
+        )
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = StatelessJWTAuthentication().authenticate(request)
+        return user
+
+    def test_user_from_claims(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.access_token)
+            self.assertEqual(
+                (user.id, user.email, user.is_admin, user.role),
+                (self.seller.id, 'seller@test.com', False, consts.UserRole.SELLER)
+            )
+        self.assertEqual(user.username, 'seller@test.com')
+
+    def test_token_user_in_services_and_views(self):
+        user = self.authenticate(self.access_token)
+        transaction_models.Wallet.objects.filter(user=user).update(balance=Decimal('100'))
+        sale = transaction_services.ChargeService.sell_charge(user, str(self.phone.phone_number), Decimal('10'))
+        self.assertEqual(sale.from_wallet.user_id, self.seller.id)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/v1/transactions/wallet/')
+        self.assertEqual(response.data, {'user_email': 'seller@test.com', 'balance': '90.00'})
+        self.assertEqual(client.get('/api/v1/transactions/queue/').status_code, 403)
+
+    def test_tokens_without_claims_use_user_cache(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        token = str(RefreshToken.for_user(self.seller).access_token)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).id, self.seller.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(token).email, 'seller@test.com')
+
+        self.seller.email = 'renamed@test.com'
+        self.seller.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).email, 'renamed@test.com')
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTestCase(TestCase):
+    """
+    - Logins rehash passwords stored at another cost profile
+    - With the pool on, hashing runs in its processes and the queue is
+      bounded: over PASSWORD_HASHING_MAX_PENDING, requests get a 503
+    - The bound is shared by forked workers: hashes pending in one make
+      another reject
+    """
+
+    def setUp(self):
+        PasswordHashingPool.stop()
+        self.addCleanup(PasswordHashingPool.stop)
+        self.client = APIClient()
+
+    def register_and_login(self):
+        credentials = {'email': 'seller@test.com', 'password': 'seller123'}
+        register = self.client.post('/api/v1/users/register/', credentials, format='json')
+        self.assertEqual(register.status_code, 201)
+        return self.client.post('/api/v1/users/login/', credentials, format='json')
+
+    def iterations(self):
+        return int(models.User.objects.get(email='seller@test.com').password.split('$')[1])
+
+    def test_rehash_to_cost_profile(self):
+        self.assertEqual(self.register_and_login().status_code, 200)
+        self.assertEqual(self.iterations(), 1000)
+
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            login = self.client.post(
+                '/api/v1/users/login/', {'email': 'seller@test.com', 'password': 'seller123'}, format='json'
+            )
+        self.assertEqual(login.status_code, 200)
+        self.assertEqual(self.iterations(), 2000)
+
+        wrong = self.client.post(
+            '/api/v1/users/login/', {'email': 'seller@test.com', 'password': 'wrong-password'}, format='json'
+        )
+        self.assertEqual(wrong.status_code, 400)
+
+    @override_settings(PASSWORD_HASHING_POOL=True)
+    def test_pool(self):
+        self.assertEqual(self.register_and_login().status_code, 200)
+        stats = PasswordHashingPool.get().stats()
+        self.assertEqual((stats['pending'], stats['completed'], stats['rejected']), (0, 2, 0))
+
+    @override_settings(PASSWORD_HASHING_POOL=True, PASSWORD_HASHING_MAX_PENDING=0)
+    def test_admission_control(self):
+        response = self.client.post(
+            '/api/v1/users/register/', {'email': 'seller@test.com', 'password': 'seller123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(str(response.data['code']), '1008')
+        self.assertEqual(PasswordHashingPool.get().stats()['rejected'], 1)
+        self.assertFalse(models.User.objects.filter(email='seller@test.com').exists())
+
+    @override_settings(PASSWORD_HASHING_POOL=True, PASSWORD_HASHING_MAX_PENDING=2)
+    def test_admission_shared_by_forked_workers(self):
+        import sys
+        import time
+        from apps.core.exceptions import ServiceBusy
+        from apps.users.services import PasswordService
+
+        pool = PasswordHashingPool.get()
+        hashes = [threading.Thread(target=pool.run, args=(time.sleep, 1)) for _ in range(2)]
+        for thread in hashes:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while pool.stats()['pending'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.stats()['pending'], 2)
+
+        def other_worker():
+            try:
+                PasswordService.make_password('seller123')
+            except ServiceBusy:
+                sys.exit(0)
+            sys.exit(1)
+
+        worker = multiprocessing.get_context('fork').Process(target=other_worker)
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        for thread in hashes:
+            thread.join()
+        self.assertEqual(self.register_and_login().status_code, 200)
+        stats = pool.stats()
+        self.assertEqual((stats['pending'], stats['completed'], stats['rejected']), (0, 4, 0))
@@ -1,23 +1,33 @@
+from django.conf import settings
 from django.urls import path
 
 from apps.users import views
 
 app_name = 'users'
 
+if settings.ASYNC_VIEWS:
+    register_view = views.AsyncRegisterView
+    login_view = views.AsyncLoginView
+    logout_view = views.AsyncLogoutView
+else:
+    register_view = views.RegisterView
+    login_view = views.LoginView
+    logout_view = views.LogoutView
+
 urlpatterns = [
     path(
         'register/',
-        views.RegisterView.as_view(),
+        register_view.as_view(),
         name='register'
     ),
     path(
         'login/',
-        views.LoginView.as_view(),
+        login_view.as_view(),
         name='login'
     ),
     path(
         'logout/',
-        views.LogoutView.as_view(),
+        logout_view.as_view(),
         name='logout'
     ),
     path('phone-number/',
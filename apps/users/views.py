@@ -1,3 +1,5 @@
+from adrf import views as async_views
+from asgiref.sync import sync_to_async
 from rest_framework import status, generics, permissions, response
 
 from apps.users import serializers, models
@@ -55,6 +57,56 @@ class LogoutView(generics.CreateAPIView):
         )
 
 
+class AsyncRegisterView(async_views.APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [throttles.RegistrationRateThrottle]
+
+    async def post(self, request):
+        serializer = serializers.RegisterSerializer(data=request.data)
+        # Validation queries the database and saving hashes the password, so
+        # both run off the event loop
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        result = await sync_to_async(serializer.save)()
+        return response.Response(
+            {
+                'access_token': result.get('access_token'),
+                'refresh_token': result.get('refresh_token'),
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class AsyncLoginView(async_views.APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [throttles.LoginRateThrottle]
+
+    async def post(self, request):
+        serializer = serializers.LoginSerializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        result = await sync_to_async(serializer.save)()
+        return response.Response(
+            {
+                'access_token': result.get('access_token'),
+                'refresh_token': result.get('refresh_token'),
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class AsyncLogoutView(async_views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttles.UserProfileThrottle]
+
+    async def post(self, request):
+        serializer = serializers.LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.save)()
+
+        return response.Response(
+            status=status.HTTP_204_NO_CONTENT
+        )
+
+
 class PhoneNumberListCreateView(generics.ListCreateAPIView):
     serializer_class = serializers.PhoneNumberSerializer
     permission_classes = [permissions.IsAuthenticated]
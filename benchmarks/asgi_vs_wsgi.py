@@ -0,0 +1,188 @@
+"""
+Requests per second per core of the sync (WSGI) and async (ASGI) deployments.
+
+Each profile of gunicorn.conf.py is started in turn, pinned to the same CPU
+cores, and driven with concurrent keep-alive clients running on the remaining
+cores. Throughput is divided by the number of server cores so the two setups
+compare on equal hardware:
+
+    python benchmarks/asgi_vs_wsgi.py --cores 2 --concurrency 64 --duration 20
+
+The server uses the database from the environment (.env). Every client
+registers its own throwaway user so the per-user throttles are not what gets
+measured. Linux only (CPU pinning uses sched_setaffinity).
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'wsgi': lambda cores: {
+        'GUNICORN_PROFILE': 'wsgi',
+        'GUNICORN_WORKERS': str(cores * 2 + 1),
+        'ASYNC_VIEWS': 'False',
+    },
+    'asgi': lambda cores: {
+        'GUNICORN_PROFILE': 'asgi',
+        'GUNICORN_WORKERS': str(cores),
+        'ASYNC_VIEWS': 'True',
+        'DB_CONN_MAX_AGE': '0',
+    },
+}
+
+
+def start_server(profile, port, server_cores):
+    env = {
+        **os.environ,
+        **PROFILES[profile](len(server_cores)),
+        'PORT': str(port),
+        'GUNICORN_LOG_LEVEL': 'warning',
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null'],
+        cwd=BASE_DIR,
+        env=env,
+        preexec_fn=lambda: os.sched_setaffinity(0, server_cores),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f'{profile} server did not come up on port {port}')
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def request(conn, method, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token is not None:
+        headers['Authorization'] = f'Bearer {token}'
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def register(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    status, body = request(conn, 'POST', '/api/v1/users/register/', {
+        'email': f'bench-{uuid.uuid4().hex}@example.com',
+        'password': uuid.uuid4().hex,
+    })
+    conn.close()
+    if status != 201:
+        raise RuntimeError(f'registration failed with {status}: {body[:200]!r}')
+    return json.loads(body)['access_token']
+
+
+def client_process(port, path, threads, duration, client_cores):
+    """Run `threads` keep-alive clients for `duration` seconds; return (ok, failed)."""
+    os.sched_setaffinity(0, client_cores)
+    tokens = [register(port) for _ in range(threads)]
+    counts = [[0, 0] for _ in range(threads)]
+    deadline = time.monotonic() + duration
+
+    def run(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < deadline:
+            try:
+                status, _ = request(conn, 'GET', path, token=tokens[index])
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                status = None
+            counts[index][0 if status == 200 else 1] += 1
+        conn.close()
+
+    workers = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(ok for ok, _ in counts), sum(failed for _, failed in counts)
+
+
+def run_profile(profile, args, server_cores, client_cores):
+    server = start_server(profile, args.port, server_cores)
+    try:
+        processes = args.client_processes
+        threads = max(1, args.concurrency // processes)
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            started = time.monotonic()
+            results = pool.starmap(
+                client_process,
+                [(args.port, args.path, threads, args.duration, client_cores)] * processes
+            )
+            elapsed = time.monotonic() - started
+    finally:
+        stop_server(server)
+
+    ok = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    # Clients register before their timed window starts, so count over that
+    # window rather than the wall time of the pool
+    rps = ok / args.duration
+    return {
+        'profile': profile,
+        'requests': ok,
+        'failed': failed,
+        'wall_seconds': round(elapsed, 2),
+        'rps': round(rps, 1),
+        'rps_per_core': round(rps / len(server_cores), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, default=1, help='CPU cores the server may use')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent keep-alive clients')
+    parser.add_argument('--client-processes', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=15, help='Seconds each profile is loaded')
+    parser.add_argument('--path', default='/api/v1/transactions/wallet/', help='GET endpoint to load')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    available = sorted(os.sched_getaffinity(0))
+    if len(available) < args.cores:
+        parser.error(f'--cores is more than the {len(available)} cores available')
+    server_cores = set(available[:args.cores])
+    client_cores = set(available[args.cores:])
+    if not client_cores:
+        print('No core left for the clients; they share the server cores and skew the numbers', file=sys.stderr)
+        client_cores = server_cores
+
+    results = [run_profile(profile, args, server_cores, client_cores) for profile in args.profiles]
+    print(f"{'profile':<8} {'requests':>10} {'failed':>8} {'req/s':>10} {'req/s/core':>11}")
+    for result in results:
+        print(
+            f"{result['profile']:<8} {result['requests']:>10} {result['failed']:>8} "
+            f"{result['rps']:>10} {result['rps_per_core']:>11}"
+        )
+
+
+if __name__ == '__main__':
+    main()
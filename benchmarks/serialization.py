@@ -0,0 +1,101 @@
+"""
+Per-object cost of rendering transaction and wallet payloads.
+
+Times the generic DRF serializers against the precompiled fast path
+(PRECOMPILED_SERIALIZERS) and the stdlib JSONRenderer against ORJSONRenderer
+(FAST_JSON) on an in-memory history page, and checks both pairs produce the
+same bytes. Needs no database or server:
+
+    SECRET_KEY=x python benchmarks/serialization.py --objects 100 --repeat 200
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.core.renderers import ORJSONRenderer  # noqa: E402
+from apps.transaction import models, serializers  # noqa: E402
+from apps.users import models as users_models  # noqa: E402
+
+
+def history_page(size):
+    """A page of sales and credit requests shaped like the history endpoint's."""
+    created = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    phone = users_models.PhoneNumber(id=1, phone_number='+989123456700')
+    page = []
+    for index in range(size):
+        if index % 2:
+            transaction = models.Transaction(
+                id=index, amount=Decimal('12.5'), status=models.TransactionStatus.APPROVED,
+                from_type=models.SourceType.WALLET, from_wallet_id=1,
+                to_type=models.DestType.PHONE, to_phone=phone,
+            )
+        else:
+            transaction = models.Transaction(
+                id=index, amount=Decimal('1500'), status=models.TransactionStatus.APPROVED,
+                from_type=models.SourceType.USER, from_user_id=1,
+                to_type=models.DestType.WALLET, to_wallet_id=1, updated_by_id=2,
+                updated_at=created + datetime.timedelta(minutes=index),
+            )
+        transaction.created_at = created + datetime.timedelta(seconds=index)
+        page.append(transaction)
+    return page
+
+
+def render(renderer, page, wallet):
+    return (
+        renderer.render(serializers.TransactionSerializer(page, many=True).data, 'application/json', {}),
+        renderer.render(
+            serializers.WalletSerializer(wallet, context={'balance': Decimal('1234.5')}).data,
+            'application/json', {}
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=100, help='Transactions per page')
+    parser.add_argument('--repeat', type=int, default=200, help='Pages rendered per timing')
+    args = parser.parse_args()
+
+    page = history_page(args.objects)
+    wallet = models.Wallet(user=users_models.User(email='seller@test.com'))
+    setups = [
+        ('generic + json', False, JSONRenderer()),
+        ('generic + orjson', False, ORJSONRenderer()),
+        ('precompiled + json', True, JSONRenderer()),
+        ('precompiled + orjson', True, ORJSONRenderer()),
+    ]
+
+    results = []
+    for name, precompiled, renderer in setups:
+        with override_settings(PRECOMPILED_SERIALIZERS=precompiled):
+            output = render(renderer, page, wallet)
+            seconds = min(timeit.repeat(lambda: render(renderer, page, wallet), number=args.repeat, repeat=3))
+        results.append((name, output, seconds / args.repeat / (args.objects + 1) * 1e6))
+
+    baseline = results[0]
+    for name, output, _ in results[1:]:
+        if output != baseline[1]:
+            raise SystemExit(f'{name} output differs from {baseline[0]}')
+
+    print(f"{'setup':<22} {'us/object':>10} {'speedup':>8}")
+    for name, _, per_object in results:
+        print(f'{name:<22} {per_object:>10.2f} {baseline[2] / per_object:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
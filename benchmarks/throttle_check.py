@@ -0,0 +1,75 @@
+"""
+Per-request cost of the throttle check at high rates.
+
+Runs DRF's timestamp-list UserRateThrottle and the token-bucket
+TransactionCreateThrottle against the same cache for one busy user that has
+already made --history requests inside the window, and reports microseconds
+per check and the size of the pickled cache entry:
+
+    SECRET_KEY=x python benchmarks/throttle_check.py --rate 50000/hour --history 20000
+
+Uses the configured default cache (local memory unless CACHES says
+otherwise), so the numbers include (un)pickling the entry.
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+import types
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from rest_framework import throttling  # noqa: E402
+
+from apps.throttling import throttles  # noqa: E402
+
+
+def throttle_class(base, rate):
+    return type(base.__name__, (base,), {'scope': 'benchmark', 'THROTTLE_RATES': {'benchmark': rate}})
+
+
+def new_request(user):
+    return types.SimpleNamespace(user=user, META={'REMOTE_ADDR': '127.0.0.1'})
+
+
+def measure(throttle_class, user, history, checks):
+    """Make `history` requests, then time `checks` more; return (us/check, entry bytes)."""
+    cache.clear()
+    for _ in range(history):
+        throttle_class().allow_request(new_request(user), None)
+
+    started = time.perf_counter()
+    for _ in range(checks):
+        throttle_class().allow_request(new_request(user), None)
+    elapsed = time.perf_counter() - started
+
+    throttle = throttle_class()
+    entry = cache.get(throttle.get_cache_key(new_request(user), None))
+    return elapsed / checks * 1e6, len(pickle.dumps(entry))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', default='50000/hour')
+    parser.add_argument('--history', type=int, default=20000, help='Requests already made in the window')
+    parser.add_argument('--checks', type=int, default=2000, help='Timed throttle checks')
+    args = parser.parse_args()
+
+    user = types.SimpleNamespace(pk=1, is_authenticated=True)
+
+    print(f"{'throttle':<28} {'us/check':>10} {'entry bytes':>12}")
+    for base in (throttling.UserRateThrottle, throttles.TransactionCreateThrottle):
+        per_check, size = measure(throttle_class(base, args.rate), user, args.history, args.checks)
+        print(f'{base.__name__:<28} {per_check:>10.1f} {size:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from .base import *
 from .settings_database import *
 from .settings_rest import *
+from .settings_transaction import *
 
 # Load environment-specific settings
 environment = os.environ.get('DJANGO_ENV', 'local')
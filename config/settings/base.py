@@ -24,6 +24,7 @@ INSTALLED_APPS = [
 
     # Third-party apps
     'rest_framework',
+    'adrf',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
@@ -89,6 +90,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. PASSWORD_HASH_ITERATIONS is the PBKDF2 cost profile:
+# passwords stored at another cost are rehashed to it at their next login
+PASSWORD_HASHERS = [
+    'apps.users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = env.int('PASSWORD_HASH_ITERATIONS', default=1_000_000)
+
+# Hash and verify passwords in a pool of PASSWORD_HASHING_WORKERS niced
+# processes per web worker instead of on the request thread. Beyond
+# PASSWORD_HASHING_MAX_PENDING queued logins/registrations across all the
+# workers of the host (forked from the preloaded master), a worker answers
+# 503 (Retry-After) at once rather than queueing more CPU work
+PASSWORD_HASHING_POOL = env.bool('PASSWORD_HASHING_POOL', default=False)
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=1)
+PASSWORD_HASHING_MAX_PENDING = env.int('PASSWORD_HASHING_MAX_PENDING', default=4)
+PASSWORD_HASHING_TIMEOUT = env.float('PASSWORD_HASHING_TIMEOUT', default=10)
+PASSWORD_HASHING_NICE = env.int('PASSWORD_HASHING_NICE', default=10)
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
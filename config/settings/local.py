@@ -1,3 +1,7 @@
+import environ
+
+env = environ.Env()
+
 DEBUG = True
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]', "0.0.0.0"]
@@ -7,4 +11,19 @@ SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 
 # CORS - Allow all origins in local development
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Without Redis, keep the cache in memory shared by the gunicorn workers of
+# this host (created by the preloaded master) instead of one LocMem per worker
+if env.bool('SHARED_MEMORY_CACHE', default=False):
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.core.cache.SharedMemoryCache',
+            'LOCATION': 'charge_flow',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': env.int('SHARED_MEMORY_CACHE_ENTRIES', default=65536),
+                'SLOT_SIZE': 512,
+            },
+        }
+    }
@@ -15,6 +15,8 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD', default='postgres'),
         'HOST': env('DB_HOST', default='localhost'),
         'PORT': env('DB_PORT', default='5432'),
-        'CONN_MAX_AGE': 600,
+        # Set to 0 under ASGI: async views reach the database from per-request
+        # threads, so persistent connections would pile up instead of being reused
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=600),
     }
 }
@@ -33,6 +33,46 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'apps.core.exceptions.custom_exception_handler',
 }
 
+# Cache alias holding the token buckets of apps.throttling; it must be shared
+# by every worker (Redis, or SharedMemoryCache on a single host) for
+# THROTTLE_RATES to hold per client rather than per worker process
+THROTTLE_CACHE = env('THROTTLE_CACHE', default='default')
+
+# Render and parse JSON with orjson (same wire format as the stdlib classes)
+FAST_JSON = env.bool('FAST_JSON', default=False)
+if FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'apps.core.renderers.ORJSONRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = (
+        'apps.core.parsers.ORJSONParser',
+        *REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'][1:],
+    )
+
+# Build TransactionSerializer and WalletSerializer output by hand instead of
+# through DRF's per-field machinery (same representation)
+PRECOMPILED_SERIALIZERS = env.bool('PRECOMPILED_SERIALIZERS', default=False)
+
+# Serve the wallet, sell-charge, credit-request and auth endpoints with their
+# async views; pair with the ASGI profile of gunicorn.conf.py
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# Raise instead of logging a warning when a view handler runs more SQL queries
+# than its @query_budget allows
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)
+
+# Build request.user from the access token's claims (id, email, is_admin,
+# role) instead of loading the users row on every request. Claim changes apply
+# from the next token (ACCESS_TOKEN_LIFETIME at most); tokens without claims
+# are served from a per-process user cache of this size and TTL
+STATELESS_JWT_AUTH = env.bool('STATELESS_JWT_AUTH', default=False)
+if STATELESS_JWT_AUTH:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = (
+        'apps.users.authentication.StatelessJWTAuthentication',
+    )
+JWT_USER_CACHE_SIZE = env.int('JWT_USER_CACHE_SIZE', default=10000)
+JWT_USER_CACHE_TTL = env.int('JWT_USER_CACHE_TTL', default=60)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
@@ -71,6 +111,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -0,0 +1,66 @@
+"""
+Transaction engine settings.
+"""
+import os
+
+import environ
+
+from .base import BASE_DIR
+
+env = environ.Env()
+
+# Run each sale as one statement of data-modifying CTEs (in-place mode,
+# unsharded wallets) instead of separate lookups, updates and insert
+TRANSACTION_SINGLE_STATEMENT_SALES = env.bool('TRANSACTION_SINGLE_STATEMENT_SALES', default=True)
+
+# Group commit for single sales: sales arriving within the window (or until the
+# batch is full) are settled together in one database transaction. Only sales
+# of one process are merged, so it needs workers serving concurrent requests
+# (GUNICORN_PROFILE=asgi, or gthread with GUNICORN_THREADS > 1); gunicorn.conf.py
+# turns it off for single-threaded sync workers
+TRANSACTION_SALE_COALESCING = env.bool('TRANSACTION_SALE_COALESCING', default=False)
+TRANSACTION_SALE_COALESCE_WINDOW_MS = env.float('TRANSACTION_SALE_COALESCE_WINDOW_MS', default=2)
+TRANSACTION_SALE_COALESCE_MAX_BATCH = env.int('TRANSACTION_SALE_COALESCE_MAX_BATCH', default=64)
+
+# Ledger mode: balance movements become immutable LedgerEntry rows and balances
+# are read as the latest BalanceSnapshot plus newer entries
+TRANSACTION_LEDGER_MODE = env.bool('TRANSACTION_LEDGER_MODE', default=False)
+
+# Seconds an entry must age before compaction rolls it into a snapshot, so that
+# entries of still-running transactions are never skipped
+TRANSACTION_LEDGER_COMPACTION_LAG = env.int('TRANSACTION_LEDGER_COMPACTION_LAG', default=60)
+
+# Idempotency-Key support: how long outcomes are replayed, how long a duplicate
+# waits for the original request, and after how long a claim that no running
+# request holds (e.g. killed worker, whose transaction rolled back) stops
+# blocking its key
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60)
+IDEMPOTENCY_WAIT_TIMEOUT = env.float('IDEMPOTENCY_WAIT_TIMEOUT', default=10)
+IDEMPOTENCY_LOCK_TIMEOUT = env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=150)
+
+# Monthly partitions of the transaction table that `manage_transaction_partitions`
+# keeps created ahead of time
+TRANSACTION_PARTITION_MONTHS_AHEAD = env.int('TRANSACTION_PARTITION_MONTHS_AHEAD', default=3)
+
+# Archival of settled transactions: where the gzipped NDJSON files go and how
+# old a settled transaction must be to leave the hot table
+TRANSACTION_ARCHIVE_DIR = env('TRANSACTION_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive'))
+TRANSACTION_ARCHIVE_RETENTION_DAYS = env.int('TRANSACTION_ARCHIVE_RETENTION_DAYS', default=365)
+
+# Balance reconciliation: where the discrepancy reports go, and how many seconds
+# an incremental run's window overlaps the previous run (longer than any
+# transaction runs, so one that committed after that run started is not missed)
+TRANSACTION_RECONCILE_REPORT_DIR = env(
+    'TRANSACTION_RECONCILE_REPORT_DIR', default=os.path.join(BASE_DIR, 'reconciliation')
+)
+TRANSACTION_RECONCILE_OVERLAP = env.int('TRANSACTION_RECONCILE_OVERLAP', default=300)
+
+# Seconds an admin keeps the pending credit requests the review queue handed out
+CREDIT_QUEUE_LEASE_SECONDS = env.int('CREDIT_QUEUE_LEASE_SECONDS', default=300)
+
+# Serve wallet balance polls from the Django cache, kept current by the writes
+# themselves. Needs a cache shared by all workers (Redis in production, or
+# SHARED_MEMORY_CACHE on a single host): with per-process caches a worker
+# would keep serving balances another one changed
+WALLET_BALANCE_CACHE = env.bool('WALLET_BALANCE_CACHE', default=False)
+WALLET_BALANCE_CACHE_TIMEOUT = env.int('WALLET_BALANCE_CACHE_TIMEOUT', default=300)
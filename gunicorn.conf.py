@@ -4,8 +4,30 @@ import os
 bind = f"0.0.0.0:{os.getenv('PORT', '8006')}"
 backlog = 2048
 
-workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = 'sync'
+# GUNICORN_PROFILE=wsgi (default): sync workers, a few per core since each
+# one blocks while Postgres answers.
+# GUNICORN_PROFILE=asgi: one uvicorn worker per core running the async views
+# (ASYNC_VIEWS=True, DB_CONN_MAX_AGE=0); a worker keeps serving other requests
+# while one waits on the database.
+profile = os.getenv('GUNICORN_PROFILE', 'wsgi')
+
+if profile == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+else:
+    wsgi_app = 'config.wsgi:application'
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+    # Sync workers are killed after `timeout` even while streaming; run exports
+    # of large ranges on gthread workers (or use `manage.py export_transactions`)
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Sale coalescing only merges sales that one process serves at the same time;
+# a single-threaded sync worker never has two, so it would only add a thread
+# hop to every sale. Read by the settings, which the app loads after this file
+if worker_class == 'sync' and threads == 1:
+    os.environ['TRANSACTION_SALE_COALESCING'] = 'False'
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50